@@ -0,0 +1,87 @@
+"""
+分塊傳輸基準：在本機 TCP 連線上用 send_chunks 傳一個 128 MB 的檔案給 recv_chunks，
+比較改版前的作法 (每塊 f.read + sha256 + 兩次 sendall) 與目前的作法
+(區塊 hash 依檔案快取，資料走 _sendfile 的 zero-copy 路徑)。
+目前的作法分成第一次傳送 (需讀檔計算 hash) 與之後的傳送 (hash 已快取) 兩種情況。
+每種情況列出傳輸速度與送出端執行緒的 CPU 時間，並確認收到的檔案 sha256 相同。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_chunked_transfer
+"""
+import hashlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from common import util
+from common.util import send_chunks, recv_chunks, file_sha256, CHUNK_HEADER, TRANSFER_CHUNK_SIZE
+
+FILE_SIZE = 128 * 1024 * 1024
+ROUNDS = 3
+
+def legacy_send_chunks(sock, file_path, offset=0, chunk_size=TRANSFER_CHUNK_SIZE):
+    """改版前的 send_chunks (v1 連線)"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            data = f.read(chunk_size)
+            if not data: break
+            sock.sendall(CHUNK_HEADER.pack(offset, len(data), hashlib.sha256(data).digest()))
+            sock.sendall(data)
+            offset += len(data)
+    return True
+
+def connected_pair():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        client = socket.create_connection(listener.getsockname())
+        server, _ = listener.accept()
+    return server, client
+
+def run_case(label, send, src, expected_sha, clear_cache=False):
+    best = None
+    for _ in range(ROUNDS):
+        if clear_cache: util._chunk_digest_cache.clear()
+        server, client = connected_pair()
+        cpu = {}
+
+        def sender():
+            start = time.thread_time()
+            send(server, src)
+            cpu['sender'] = time.thread_time() - start
+
+        part = src + ".part"
+        if os.path.exists(part): os.remove(part)
+        t = threading.Thread(target=sender)
+        start = time.perf_counter()
+        t.start()
+        ok = recv_chunks(client, part, 0, FILE_SIZE, expected_sha)
+        elapsed = time.perf_counter() - start
+        t.join()
+        server.close()
+        client.close()
+        os.remove(part)
+        if not ok: raise RuntimeError(f"{label}: 收到的檔案不完整")
+        if best is None or elapsed < best[0]: best = (elapsed, cpu['sender'])
+    elapsed, sender_cpu = best
+    print(f"{label:<26} {FILE_SIZE / elapsed / 2**20:>8,.0f} MB/s  sender cpu {sender_cpu * 1000:>7.1f} ms")
+
+def main():
+    fd, src = tempfile.mkstemp(suffix=".zip")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+    try:
+        expected_sha = file_sha256(src)
+        print(f"--- {FILE_SIZE // 2**20} MB, {TRANSFER_CHUNK_SIZE // 1024} KB chunks, best of {ROUNDS} ---")
+        run_case("read + sendall (before)", legacy_send_chunks, src, expected_sha)
+        run_case("sendfile, cold hashes", send_chunks, src, expected_sha, clear_cache=True)
+        run_case("sendfile, cached hashes", send_chunks, src, expected_sha)
+    finally:
+        os.remove(src)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+資料庫連線基準：比較每次請求重新 sqlite3.connect 與執行緒連線快取
+(WAL + prepared statement 重用) 下 login + list_games 的吞吐量。
+於暫存目錄複製一份 game_store.db 進行測試，不會修改正式資料庫。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_db
+"""
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from server import db_manager
+
+N_ROUNDS = 5000
+
+def login_and_list(get_connection):
+    """模擬一次 auth_login (verify_user) + list_games 的 DB 存取"""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT password FROM players WHERE username=?", ("bench_user",))
+    row = c.fetchone()
+    conn.close()
+    assert row and row[0] == "pw"
+
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT game_id, name, version, description, min_players, max_players FROM games WHERE status='active'")
+    c.fetchall()
+    conn.close()
+
+def run_case(label, get_connection):
+    login_and_list(get_connection)  # warm up
+    start = time.perf_counter()
+    for _ in range(N_ROUNDS):
+        login_and_list(get_connection)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {N_ROUNDS / elapsed:>10,.0f} login+list_games/sec")
+    return N_ROUNDS / elapsed
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp_dir, 'game_store.db')
+        shutil.copy(db_manager.DB_PATH, db_path)
+        db_manager.DB_PATH = db_path
+        db_manager.init_db()
+        db_manager.register_user('player', 'bench_user', 'pw')
+
+        before = run_case("sqlite3.connect per request", lambda: sqlite3.connect(db_path))
+        after = run_case("thread-local pooled connection", db_manager.get_connection)
+        print(f"speedup: x{after / before:.1f}")
+    finally:
+        db_manager.close_connection()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
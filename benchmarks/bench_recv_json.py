@@ -0,0 +1,53 @@
+"""
+recv_json 微基準：比較逐字元讀取 (一般 socket) 與 BufferedSocket 的每秒訊息數。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_recv_json
+"""
+import socket
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from common.util import send_json, recv_json, BufferedSocket
+
+def make_list_games_reply(n_games):
+    games = [{"id": i, "name": f"Game_{i}", "version": "1.0.0",
+              "info": "Short description here.", "min": 1, "max": 4} for i in range(n_games)]
+    return {"status": "ok", "games": games}
+
+def run_case(label, n_msgs, payload, wrap):
+    a, b = socket.socketpair()
+    reader = BufferedSocket(b) if wrap else b
+
+    def sender():
+        for _ in range(n_msgs):
+            send_json(a, payload)
+
+    t = threading.Thread(target=sender, daemon=True)
+    start = time.perf_counter()
+    t.start()
+    for _ in range(n_msgs):
+        if recv_json(reader) is None:
+            raise RuntimeError("connection closed early")
+    elapsed = time.perf_counter() - start
+    t.join()
+    a.close()
+    b.close()
+    print(f"{label:<28} {n_msgs:>6} msgs  {n_msgs / elapsed:>12,.0f} msgs/sec")
+    return n_msgs / elapsed
+
+def main():
+    cases = [
+        ("small (login reply)", {"status": "ok", "username": "player1"}, 20000, 2000),
+        ("list_games x 50", make_list_games_reply(50), 2000, 200),
+    ]
+    for name, payload, n_fast, n_slow in cases:
+        print(f"--- {name}: {len(str(payload))} chars ---")
+        slow = run_case("recv_json (recv(1))", n_slow, payload, wrap=False)
+        fast = run_case("recv_json (BufferedSocket)", n_fast, payload, wrap=True)
+        print(f"speedup: x{fast / slow:.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Tank 狀態廣播基準：比較每 tick json.dumps 整個 GameState (含牆壁) 與
+protocol.py 的二進位 keyframe/delta 編碼，在 8 台以上坦克時的每 tick 位元組數與編碼時間，
+以及 send rate 降到 20 Hz (client 插值) 時每秒的位元組數。
+同時用 StateDecoder 還原，確認 client 看到的狀態與 server 一致。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_tank_broadcast
+"""
+import json
+import os
+import random
+import sys
+import time
+
+TANK_DIR = os.path.join(os.path.dirname(__file__), '..', 'dev_client', 'games', 'Tank')
+sys.path.insert(0, TANK_DIR)
+
+import game_server
+from protocol import StateEncoder, StateDecoder, split_frames, DIRS, DIR_INPUTS, INPUT_SHOOT
+
+N_TICKS = 3000
+LOW_SEND_RATE = 20
+
+def legacy_frame(state):
+    """改版前 broadcast_state 每 tick 送出的內容"""
+    bullets = [{'id': bid, 'x': x, 'y': y, 'dx': dx, 'dy': dy, 'owner_id': owner}
+               for bid, x, y, dx, dy, owner in state.bullets.records()]
+    snapshot = {'players': state.players, 'bullets': bullets, 'walls': state.walls}
+    return (json.dumps({"type": "UPDATE", "data": snapshot}) + "\n").encode()
+
+def drive(state, rng):
+    """隨機移動與射擊 (約 7 成的坦克每 tick 都在移動)"""
+    for pid, p in list(state.players.items()):
+        mask = 0
+        if rng.random() < 0.7:
+            mask |= DIR_INPUTS[rng.choice(DIRS)]
+        if rng.random() < 0.05:
+            p['last_shot'] = 0
+            mask |= INPUT_SHOOT
+        if mask:
+            state.queue_input(pid, None, mask)
+
+def check_sync(decoder, buf, frame, state):
+    buf += frame
+    for kind, tick, body in split_frames(buf):
+        decoder.apply(kind, tick, body)
+    expected = {pid: {k: p[k] for k in ('x', 'y', 'dir', 'hp', 'score', 'ack')} for pid, p in state.players.items()}
+    if decoder.players != expected or len(decoder.bullets) != len(state.bullets):
+        raise RuntimeError(f"decoder out of sync at tick {state.tick}")
+
+def run_case(n_players):
+    rng = random.Random(n_players)
+    random.seed(n_players)
+    state = game_server.GameState()
+    for i in range(n_players):
+        state.add_player(f"tank{i:04d}")
+    decoder = StateDecoder()
+    buf = bytearray()
+    # 20 Hz 的串流用另一個 encoder，每 send_every 個 tick 編一次
+    send_every = game_server.send_interval(game_server.TICK_RATE, LOW_SEND_RATE)
+    low_encoder, low_decoder, low_buf = StateEncoder(), StateDecoder(), bytearray()
+    json_bytes = bin_bytes = low_bytes = 0
+    json_time = bin_time = 0.0
+
+    for _ in range(N_TICKS):
+        drive(state, rng)
+        state.update()
+        start = time.perf_counter()
+        old = legacy_frame(state)
+        json_time += time.perf_counter() - start
+        start = time.perf_counter()
+        new = state.encode_frame()
+        bin_time += time.perf_counter() - start
+        json_bytes += len(old)
+        bin_bytes += len(new)
+
+        check_sync(decoder, buf, new, state)
+
+        if state.tick % send_every == 0:
+            low = low_encoder.encode(state.tick, state.players, state.bullets.records())
+            low_bytes += len(low)
+            check_sync(low_decoder, low_buf, low, state)
+
+    print(f"--- {n_players} tanks, {len(state.bullets)} bullets in flight ---")
+    print(f"{'json (full state)':<20} {json_bytes / N_TICKS:>9,.0f} bytes/tick  {json_time / N_TICKS * 1e6:>7.1f} us/tick")
+    print(f"{'binary delta':<20} {bin_bytes / N_TICKS:>9,.0f} bytes/tick  {bin_time / N_TICKS * 1e6:>7.1f} us/tick")
+    print(f"bandwidth: x{json_bytes / bin_bytes:.1f}  encode cpu: x{json_time / bin_time:.1f}")
+    per_sec = game_server.TICK_RATE / N_TICKS
+    print(f"send rate {game_server.TICK_RATE} Hz: {bin_bytes * per_sec:>9,.0f} bytes/s | "
+          f"{LOW_SEND_RATE} Hz: {low_bytes * per_sec:>9,.0f} bytes/s (x{bin_bytes / low_bytes:.1f})")
+
+def main():
+    for n_players in (8, 16, 32):
+        run_case(n_players)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Tank 子彈模擬基準：32 台坦克、場上維持 500 顆子彈，跑 1,000 tick。
+比較改版前逐一掃描所有牆壁 / 玩家的 update、均勻格網 (BulletList) 與
+NumPy 向量化 (BulletArrays，需安裝 numpy)；全部使用相同亂數，
+最後確認結果 (位置、血量、分數、子彈) 完全一致。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_tank_collision
+"""
+import os
+import random
+import sys
+import time
+
+TANK_DIR = os.path.join(os.path.dirname(__file__), '..', 'dev_client', 'games', 'Tank')
+sys.path.insert(0, TANK_DIR)
+
+import bullets
+from game_server import GameState, PLAYER_SIZE, BULLET_SIZE, BULLET_SPEED, WIDTH, HEIGHT
+from protocol import DIRS, DIR_INPUTS
+
+N_TICKS = 1000
+N_TANKS = 32
+N_BULLETS = 500
+
+class LegacyGameState(GameState):
+    """改版前的線性掃描實作 (子彈是 dict 列表)"""
+    def __init__(self):
+        super().__init__()
+        self.bullets = []
+
+    def check_collision(self, rect):
+        rx, ry, rw, rh = rect['x'], rect['y'], rect['w'], rect['h']
+        for w in self.walls:
+            if (rx < w['x'] + w['w'] and rx + rw > w['x'] and
+                ry < w['y'] + w['h'] and ry + rh > w['y']):
+                return True
+        return False
+
+    def check_player_hit(self, bullet_rect, owner_id):
+        bx, by, bw, bh = bullet_rect['x'], bullet_rect['y'], bullet_rect['w'], bullet_rect['h']
+        hit_pid = None
+        for pid, p in self.players.items():
+            if pid == owner_id: continue
+            if (bx < p['x'] + PLAYER_SIZE and bx + bw > p['x'] and
+                by < p['y'] + PLAYER_SIZE and by + bh > p['y']):
+                p['hp'] -= 1
+                if p['hp'] <= 0:
+                    p['hp'] = 3
+                    new_x, new_y = self.get_safe_spawn_pos()
+                    p['x'] = new_x
+                    p['y'] = new_y
+                hit_pid = pid
+                break
+        return hit_pid
+
+    def update(self):
+        with self.lock:
+            # 輸入與 GameState.update 一樣每 tick 從佇列取一個套用，只比較子彈的部分
+            for pid, queue in self.inputs.items():
+                if queue:
+                    seq, mask = queue.popleft()
+                    self.apply_input(pid, mask, seq)
+            for b in self.bullets[:]:
+                b['x'] += b['dx']
+                b['y'] += b['dy']
+                b_rect = {'x': b['x'], 'y': b['y'], 'w': BULLET_SIZE, 'h': BULLET_SIZE}
+                if self.check_collision(b_rect) or \
+                   b['x'] < 0 or b['x'] > WIDTH or b['y'] < 0 or b['y'] > HEIGHT:
+                    self.bullets.remove(b)
+                    continue
+                hit_pid = self.check_player_hit(b_rect, b['owner_id'])
+                if hit_pid:
+                    self.bullets.remove(b)
+                    if b['owner_id'] in self.players:
+                        self.players[b['owner_id']]['score'] += 1
+
+def spawn_bullets(state, rng, pids):
+    """把場上子彈補到 N_BULLETS 顆 (從隨機坦克往隨機方向射出)"""
+    while len(state.bullets) < N_BULLETS:
+        p_id = rng.choice(pids)
+        p = state.players[p_id]
+        dx, dy = rng.choice(((0, -BULLET_SPEED), (0, BULLET_SPEED), (-BULLET_SPEED, 0), (BULLET_SPEED, 0)))
+        x = p['x'] + PLAYER_SIZE // 2 - BULLET_SIZE // 2
+        y = p['y'] + PLAYER_SIZE // 2 - BULLET_SIZE // 2
+        if isinstance(state.bullets, list):
+            state.bullets.append({'id': state.next_bullet_id, 'x': x, 'y': y, 'dx': dx, 'dy': dy, 'owner_id': p_id})
+        else:
+            state.bullets.add(state.next_bullet_id, x, y, dx, dy, p_id)
+        state.next_bullet_id = (state.next_bullet_id + 1) & 0xFFFF
+
+def bullet_records(state):
+    if isinstance(state.bullets, list):
+        return [(b['id'], b['x'], b['y']) for b in state.bullets]
+    return [rec[:3] for rec in state.bullets.records()]
+
+def run_case(label, cls, make_store=None):
+    random.seed(12345)  # get_safe_spawn_pos 使用全域 random
+    rng = random.Random(678)
+    state = cls()
+    if make_store:
+        state.bullets = make_store(state)
+    pids = [f"tank{i:04d}" for i in range(N_TANKS)]
+    for pid in pids:
+        state.add_player(pid)
+
+    update_time = 0.0
+    for _ in range(N_TICKS):
+        for pid in pids:
+            state.queue_input(pid, None, DIR_INPUTS[rng.choice(DIRS)])
+        spawn_bullets(state, rng, pids)
+        start = time.perf_counter()
+        state.update()
+        update_time += time.perf_counter() - start
+
+    print(f"{label:<22} {update_time / N_TICKS * 1e3:>8.3f} ms/tick (update)")
+    result = ({pid: (p['x'], p['y'], p['hp'], p['score']) for pid, p in state.players.items()},
+              bullet_records(state))
+    return update_time, result
+
+def main():
+    print(f"--- {N_TICKS} ticks, {N_TANKS} tanks, {N_BULLETS} bullets, {len(GameState().walls)} walls ---")
+    before, legacy_result = run_case("linear scan", LegacyGameState)
+    cases = [("uniform grid", lambda s: bullets.BulletList(s.wall_grid, WIDTH, HEIGHT, BULLET_SIZE, PLAYER_SIZE))]
+    if bullets.np is not None:
+        cases.append(("numpy arrays", lambda s: bullets.BulletArrays(s.walls, WIDTH, HEIGHT, BULLET_SIZE, PLAYER_SIZE)))
+    else:
+        print("(numpy 未安裝，略過 numpy arrays)")
+    for label, make_store in cases:
+        after, result = run_case(label, GameState, make_store)
+        if result != legacy_result:
+            raise RuntimeError(f"{label} 結果與線性掃描不一致")
+        print(f"{label} speedup: x{before / after:.1f} (results identical)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Tank 負載測試：在本機開 R 個房間 (每個房間一個 game_server.run_game_server 行程)，
+每房連上 N 個 tank_bot 機器人隨機移動、射擊，量測：
+    - server 實際 tick rate (由 frame 的 tick 編號推算) 與收到的 frame rate
+    - 每個 client 的下行頻寬
+    - 輸入送出到看見 server ack 的延遲 p50 / p95 / p99
+    - 每個 server 行程的 CPU 使用率
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_tank_load --rooms 2 --bots 16
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+# tank_bot 已把 Tank 遊戲資料夾加入 sys.path
+from benchmarks.tank_bot import TankBot, drive
+import game_server
+
+WARMUP = 1.0
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def serve(port, tick_rate, send_rate, pipe):
+    """子行程：執行 game server；每收到一次要求就回報本行程累計的 CPU 秒數"""
+    sys.stdout = open(os.devnull, 'w')
+    threading.Thread(target=game_server.run_game_server,
+                     args=('127.0.0.1', port, tick_rate, send_rate), daemon=True).start()
+    pipe.send('ready')
+    while pipe.recv() == 'cpu':
+        pipe.send(time.process_time())
+
+def percentile(values, p):
+    if not values: return float('nan')
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def connect(port, seed, timeout=5.0):
+    """server 剛啟動時 listen 可能還沒就緒，稍微重試"""
+    end = time.time() + timeout
+    while True:
+        try:
+            return TankBot('127.0.0.1', port, seed=seed).start()
+        except ConnectionRefusedError:
+            if time.time() > end: raise
+            time.sleep(0.05)
+
+def main():
+    parser = argparse.ArgumentParser(description='Tank load test')
+    parser.add_argument('--rooms', type=int, default=1)
+    parser.add_argument('--bots', type=int, default=8, help='每個房間的機器人數')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--tick-rate', type=int, default=game_server.TICK_RATE)
+    parser.add_argument('--send-rate', type=int, default=game_server.SEND_RATE)
+    args = parser.parse_args()
+
+    rooms = []
+    for _ in range(args.rooms):
+        port = free_port()
+        parent, child = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=serve, args=(port, args.tick_rate, args.send_rate, child), daemon=True)
+        proc.start()
+        parent.recv()
+        rooms.append({'port': port, 'proc': proc, 'pipe': parent})
+    for i, room in enumerate(rooms):
+        room['bots'] = [connect(room['port'], seed=i * 1000 + j) for j in range(args.bots)]
+    all_bots = [bot for room in rooms for bot in room['bots']]
+    print(f"--- {args.rooms} room(s) x {args.bots} bots, tick {args.tick_rate} Hz, "
+          f"send {args.send_rate} Hz, {args.duration:.0f}s ---")
+
+    drive(all_bots, WARMUP)
+    for bot in all_bots:
+        bot.reset_stats()
+    for room in rooms:
+        room['pipe'].send('cpu')
+        room['cpu'] = room['pipe'].recv()
+    start = time.perf_counter()
+    drive(all_bots, args.duration)
+    elapsed = time.perf_counter() - start
+    for room in rooms:
+        room['pipe'].send('cpu')
+        room['cpu'] = room['pipe'].recv() - room['cpu']
+
+    latencies = []
+    for i, room in enumerate(rooms):
+        bots = room['bots']
+        ticks = [(b.last[0] - b.first[0]) / (b.last[1] - b.first[1]) for b in bots
+                 if b.first and b.last[1] > b.first[1]]
+        frames = sum(b.frames for b in bots) / len(bots) / elapsed
+        kbps = sum(b.bytes for b in bots) / len(bots) / elapsed / 1024
+        dead = sum(not b.running for b in bots)
+        tick_rate = sum(ticks) / len(ticks) if ticks else 0.0
+        print(f"room {i}: tick {tick_rate:6.1f} Hz | frames {frames:5.1f}/s per client | "
+              f"{kbps:6.1f} KB/s per client | server cpu {room['cpu'] / elapsed * 100:5.1f}%"
+              + (f" | {dead} bots disconnected" if dead else ""))
+        for b in bots:
+            latencies.extend(b.latencies)
+
+    latencies.sort()
+    ms = [percentile(latencies, p) * 1000 for p in (50, 95, 99)]
+    print(f"input -> ack latency: p50 {ms[0]:.1f} ms | p95 {ms[1]:.1f} ms | p99 {ms[2]:.1f} ms "
+          f"({len(latencies)} samples)")
+
+    for bot in all_bots:
+        bot.close()
+    for room in rooms:
+        room['pipe'].send('stop')
+        room['proc'].join(timeout=5)
+
+if __name__ == '__main__':
+    main()
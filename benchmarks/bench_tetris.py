@@ -0,0 +1,148 @@
+"""
+Tetris 引擎基準：用 7-bag 連續落下 100,000 個方塊 (隨機旋轉、平移、hard drop，偶爾吃垃圾行)，
+比較改版前 list of lists 的 TetrisGame 與 tetris_engine.py 的 bitboard 版本。
+兩者使用相同種子與相同操作，最後確認盤面、分數、game over 次數完全一致
+(比對時關閉踢牆，規則才與改版前相同；另外列出開啟 SRS 踢牆時的速度)。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_tetris
+"""
+import os
+import random
+import sys
+import time
+
+TETRIS_DIR = os.path.join(os.path.dirname(__file__), '..', 'dev_client', 'games', 'Tetris')
+sys.path.insert(0, TETRIS_DIR)
+
+import tetris_engine
+from tetris_engine import SHAPES, GRID_WIDTH, GRID_HEIGHT
+
+N_PIECES = 100000
+GARBAGE_CHANCE = 0.05
+
+class LegacyTetrisGame:
+    """改版前 game_client.TetrisGame 的遊戲邏輯 (顏色以方塊編號 + 1 表示，垃圾行為 GARBAGE)"""
+    def __init__(self):
+        self.grid = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+        self.current_piece = None
+        self.current_x = 0
+        self.current_y = 0
+        self.current_color = None
+        self.bag = []
+        self.score = 0
+        self.game_over = False
+        self.rng = random.Random()
+
+    def init_rng(self, seed):
+        self.rng.seed(seed)
+        self.new_piece()
+
+    def get_7_bag_piece(self):
+        if not self.bag:
+            self.bag = list(range(len(SHAPES)))
+            self.rng.shuffle(self.bag)
+        shape_idx = self.bag.pop()
+        return SHAPES[shape_idx], shape_idx + 1
+
+    def new_piece(self):
+        self.current_piece, self.current_color = self.get_7_bag_piece()
+        self.current_x = GRID_WIDTH // 2 - len(self.current_piece[0]) // 2
+        self.current_y = 0
+        if self.check_collision(self.current_piece, self.current_x, self.current_y):
+            self.game_over = True
+
+    def check_collision(self, shape, offset_x, offset_y):
+        for cy, row in enumerate(shape):
+            for cx, cell in enumerate(row):
+                if cell:
+                    try:
+                        if (offset_x + cx < 0 or
+                            offset_x + cx >= GRID_WIDTH or
+                            offset_y + cy >= GRID_HEIGHT or
+                            (offset_y + cy >= 0 and self.grid[offset_y + cy][offset_x + cx])):
+                            return True
+                    except IndexError:
+                        return True
+        return False
+
+    def rotate_piece(self):
+        new_shape = [list(row) for row in zip(*self.current_piece[::-1])]
+        if not self.check_collision(new_shape, self.current_x, self.current_y):
+            self.current_piece = new_shape
+
+    def lock_piece(self):
+        for cy, row in enumerate(self.current_piece):
+            for cx, cell in enumerate(row):
+                if cell:
+                    if self.current_y + cy >= 0:
+                        self.grid[self.current_y + cy][self.current_x + cx] = self.current_color
+        cleared_lines = self.clear_lines()
+        self.new_piece()
+        return cleared_lines
+
+    def clear_lines(self):
+        lines_to_clear = []
+        for y, row in enumerate(self.grid):
+            if all(cell != 0 for cell in row):
+                lines_to_clear.append(y)
+        for y in lines_to_clear:
+            del self.grid[y]
+            self.grid.insert(0, [0 for _ in range(GRID_WIDTH)])
+            self.score += 100
+        return len(lines_to_clear)
+
+    def add_garbage(self, lines):
+        for _ in range(lines):
+            del self.grid[0]
+            garbage_row = [tetris_engine.GARBAGE if i != self.rng.randint(0, GRID_WIDTH-1) else 0 for i in range(GRID_WIDTH)]
+            self.grid.append(garbage_row)
+
+    # 與 bitboard 版相同的操作介面
+    def move(self, dx, dy=0):
+        if self.check_collision(self.current_piece, self.current_x + dx, self.current_y + dy):
+            return False
+        self.current_x += dx
+        self.current_y += dy
+        return True
+
+    def hard_drop(self):
+        while self.move(0, 1):
+            pass
+        return self.lock_piece()
+
+def run_case(label, make_game):
+    rng = random.Random(2024)  # 操作用的亂數，兩個引擎的呼叫順序相同
+    games = 0
+    game = make_game()
+    game.init_rng(games)
+    total_score = cleared_total = 0
+    start = time.perf_counter()
+    for _ in range(N_PIECES):
+        for _ in range(rng.randrange(4)):
+            game.rotate_piece()
+        step = 1 if rng.random() < 0.5 else -1
+        for _ in range(rng.randrange(GRID_WIDTH // 2 + 1)):
+            if not game.move(step): break
+        cleared_total += game.hard_drop()
+        if rng.random() < GARBAGE_CHANCE:
+            game.add_garbage(rng.randint(1, 2))
+        if game.game_over:
+            total_score += game.score
+            games += 1
+            game = make_game()
+            game.init_rng(games)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed:>7.2f} s  {N_PIECES / elapsed:>10,.0f} pieces/sec  ({games} games)")
+    return elapsed, (games, total_score + game.score, cleared_total, [list(row) for row in game.grid])
+
+def main():
+    print(f"--- {N_PIECES:,} pieces, 7-bag ---")
+    before, legacy_result = run_case("list of lists", LegacyTetrisGame)
+    after, result = run_case("bitboard", lambda: tetris_engine.TetrisGame(kicks=False))
+    if result != legacy_result:
+        raise RuntimeError("bitboard 引擎結果與改版前不一致")
+    print(f"speedup: x{before / after:.1f} (results identical)")
+    kicked, _ = run_case("bitboard + SRS kicks", tetris_engine.TetrisGame)
+    print(f"speedup with kicks: x{before / kicked:.1f}")
+
+if __name__ == '__main__':
+    main()
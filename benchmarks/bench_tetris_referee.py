@@ -0,0 +1,71 @@
+"""
+Tetris 裁判基準：以隨機操作的腳本模擬 200 位玩家 (client 端 TetrisGame，含顏色盤面，
+每 30 ms 下落一格、隨機按鍵與 hard drop、偶爾吃垃圾行，直到輸掉或滿 2 分鐘)，
+記下操作串流後用 tetris_referee.replay() 在 server 端重播，確認每一位玩家重播出的盤面、分數與 client 完全一致，
+並量測一個行程每秒能裁判多少操作，換算成單核可同時裁判的玩家數。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_tetris_referee
+"""
+import os
+import random
+import sys
+import time
+
+TETRIS_DIR = os.path.join(os.path.dirname(__file__), '..', 'dev_client', 'games', 'Tetris')
+sys.path.insert(0, TETRIS_DIR)
+
+from tetris_engine import TetrisGame
+from tetris_referee import ACTIONS, make_record, replay
+
+N_PLAYERS = 200
+MATCH_SECONDS = 120
+FALL_MS = 30            # 與 game_client 的 fall_speed 相同
+KEY_CODES = 'LLRRUUD'
+HARD_DROP_CHANCE = 0.05
+GARBAGE_CHANCE = 0.005
+
+def play_session(seed, rng):
+    """模擬一位玩家的一場對戰，回傳 (client 的 game, replay)"""
+    game = TetrisGame()
+    game.init_rng(seed)
+    events = []
+    t = 0
+    while t < MATCH_SECONDS * 1000 and not game.game_over:
+        t += FALL_MS
+        if rng.random() < GARBAGE_CHANCE:
+            lines = rng.randint(1, 2)
+            game.add_garbage(lines)
+            events.append((t, f"G{lines}"))
+        for _ in range(rng.randrange(3)):
+            code = rng.choice(KEY_CODES)
+            ACTIONS[code](game)
+            events.append((t, code))
+        code = 'H' if rng.random() < HARD_DROP_CHANCE else 'F'
+        ACTIONS[code](game)
+        events.append((t, code))
+    return game, make_record(seed, events), t / 1000
+
+def main():
+    rng = random.Random(2024)
+    sessions = [play_session(seed, rng) for seed in range(N_PLAYERS)]
+    n_events = sum(record["events"].count(",") + 1 for _, record, _ in sessions)
+    size = sum(len(record["events"]) for _, record, _ in sessions)
+    played = sum(seconds for _, _, seconds in sessions)
+    print(f"--- {N_PLAYERS} players, up to {MATCH_SECONDS}s each (avg {played / N_PLAYERS:.0f}s before topping out), "
+          f"{n_events:,} inputs, replays {size / N_PLAYERS / 1024:.1f} KB per player ---")
+
+    start = time.perf_counter()
+    refs = [replay(record) for _, record, _ in sessions]
+    elapsed = time.perf_counter() - start
+
+    for (game, _, _), ref in zip(sessions, refs):
+        if (ref.game.rows, ref.game.score, ref.game.game_over) != (game.rows, game.score, game.game_over):
+            raise RuntimeError(f"replay of seed {ref.seed} diverged from the client")
+    print(f"replay: {elapsed:.2f} s  {n_events / elapsed:>10,.0f} inputs/sec  "
+          f"(all boards identical)")
+    # 即時對戰中一位玩家每秒約 1000 / FALL_MS 次下落加上按鍵
+    per_second = n_events / played
+    print(f"live load: ~{per_second:.0f} inputs/sec per player -> "
+          f"~{n_events / elapsed / per_second:,.0f} concurrent players per core")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Tetris relay 壓力測試：在子行程用一個 relay_core.RelayServer 開 R 個 TetrisRoom (每房一個 port，
+全部在同一條執行緒，房間輪流使用 SEEDS 個種子)，每房連上 P 個無頭玩家。每位玩家事先用貪婪擺放的 bot
+以該房種子玩 N 個方塊，記下操作 (IN:t:code) 與鎖定後回報的 ATTACK，測試時以最快速度送出，每次 sendall 合併 B 行
+(模擬 TCP 把多則訊息黏在一起)。server 要重播每個操作、依裁判算出的攻擊送 GARBAGE；
+每位玩家都要收到同房其他人的每一則 GARBAGE：核對則數與行數總和沒有遺失，並量測吞吐量與 server CPU。
+--legacy 時 server 不驗證 (--no-validate)，玩家只送 ATTACK，量測舊的直接轉發路徑。
+執行方式 (於 Game_Store/ 下): python -m benchmarks.bench_tetris_relay --players 4 --pieces 3000
+                              python -m benchmarks.bench_tetris_relay --rooms 200 --players 2 --pieces 300
+                              python -m benchmarks.bench_tetris_relay --players 4 --pieces 3000 --legacy
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+TETRIS_DIR = os.path.join(os.path.dirname(__file__), '..', 'dev_client', 'games', 'Tetris')
+sys.path.insert(0, TETRIS_DIR)
+
+import game_server
+from common.relay import RelayServer
+from tetris_engine import ROTATIONS, GRID_WIDTH, GRID_HEIGHT, FULL_ROW
+from tetris_referee import Referee
+
+BASE_SEED = 2024
+SEEDS = 8       # 房間輪流使用的種子數 (同一個種子的 bot 腳本只產生一次)
+FRAME_MS = 16
+
+def serve(n_rooms, legacy, pipe):
+    """子行程：所有房間共用一個 RelayServer；每收到一次要求就回報本行程的 CPU 秒數與執行緒數"""
+    sys.stdout = open(os.devnull, 'w')  # server 每則攻擊都會印 log
+    server = RelayServer()
+    ports = []
+    for r in range(n_rooms):
+        sock = server.listen('127.0.0.1', 0, game_server.TetrisRoom(BASE_SEED + r % SEEDS, validate=not legacy))
+        ports.append(sock.getsockname()[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pipe.send(ports)
+    while pipe.recv() == 'cpu':
+        pipe.send((time.process_time(), threading.active_count() - 1))
+
+def evaluate(rows, rot, x, rng):
+    """方塊放在第 x 欄直接落下後的盤面分數 (越高越好)；放不下回傳 None"""
+    masks = rot.at[x]
+    if any(rows[i] & mask for i, mask in enumerate(masks)): return None
+    y = 0
+    while y + rot.height < GRID_HEIGHT and not any(rows[y + 1 + i] & mask for i, mask in enumerate(masks)):
+        y += 1
+    board = rows[:]
+    for i, mask in enumerate(masks):
+        board[y + i] |= mask
+    cleared = board.count(FULL_ROW)
+    board = [row for row in board if row != FULL_ROW]
+    heights, holes, covered = [], 0, 0
+    for col in range(GRID_WIDTH):
+        bit = 1 << col
+        top = next((i for i, row in enumerate(board) if row & bit), len(board))
+        heights.append(len(board) - top)
+        holes += sum(1 for row in board[top:] if not row & bit)
+    bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    # 盤面還低時留著單行不消，等多行一起消才有攻擊
+    line_score = {1: -1.0 if max(heights) < 8 else 1.0, 2: 3.0, 3: 6.0, 4: 12.0}.get(cleared, 0)
+    return line_score - 0.5 * sum(heights) / GRID_WIDTH - 4.0 * holes - 0.3 * bumpiness + rng.random() * 0.1
+
+def play_script(seed, n_pieces, rng):
+    """
+    bot 以 seed 玩 n_pieces 個方塊 (用 Referee 模擬，與 server 重播的結果相同)，
+    回傳 (送出的每一行, 每次攻擊的行數)
+    """
+    ref = Referee(seed)
+    game = ref.game
+    lines, attacks = [], []
+    t = 0
+
+    def press(code):
+        nonlocal t
+        t += FRAME_MS
+        lines.append(f"IN:{t}:{code}")
+        return ref.apply(t, code)
+
+    for _ in range(n_pieces):
+        if game.game_over: break
+        rotations = ROTATIONS[game.piece_id]
+        best = None
+        for turns in range(1 if game.piece_id == 3 else 4):
+            rot = rotations[(game.rotation + turns) % 4]
+            for x in range(GRID_WIDTH - rot.width + 1):
+                score = evaluate(game.rows, rot, x, rng)
+                if score is not None and (best is None or score > best[0]):
+                    best = (score, turns, x)
+        if best is None: break
+        _, turns, target = best
+        for _ in range(turns):
+            press('U')
+        while game.current_x != target:
+            x = game.current_x
+            press('L' if target < x else 'R')
+            if game.current_x == x: break  # 被擋住，就地落下
+        attack = press('H')
+        if attack:
+            attacks.append(attack)
+            lines.append(f"ATTACK:{attack}")    # 與 game_client 一樣，鎖定後回報攻擊
+    return lines, attacks
+
+class Player:
+    def __init__(self, port, expected):
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.expected = expected    # 應收到的 GARBAGE 則數
+        self.received = 0
+        self.lines = 0
+        self.done = threading.Event()
+        self.seeded = threading.Event()
+        self.finished_at = None
+        threading.Thread(target=self._recv, daemon=True).start()
+
+    def _recv(self):
+        buffer = b""
+        while True:
+            data = self.sock.recv(65536)
+            if not data: break
+            *messages, buffer = (buffer + data).split(b"\n")
+            for msg in messages:
+                if msg.startswith(b"GARBAGE:"):
+                    self.received += 1
+                    self.lines += int(msg[8:])
+                elif msg.startswith(b"SEED:"):
+                    self.seeded.set()
+            if self.received >= self.expected:
+                self.finished_at = time.perf_counter()
+                break
+        self.done.set()
+
+def main():
+    parser = argparse.ArgumentParser(description='Tetris relay blast test')
+    parser.add_argument('--rooms', type=int, default=1)
+    parser.add_argument('--players', type=int, default=4, help='每個房間的玩家數')
+    parser.add_argument('--pieces', type=int, default=3000, help='每位玩家放下的方塊數')
+    parser.add_argument('--batch', type=int, default=20, help='每次 sendall 合併的行數')
+    parser.add_argument('--legacy', action='store_true', help='server 不驗證，玩家只送 ATTACK')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = {}
+    for r in range(min(args.rooms, SEEDS)):
+        for i in range(args.players):
+            cache[r, i] = play_script(BASE_SEED + r, args.pieces, random.Random(r * 1000 + i))
+    scripts = [[cache[r % SEEDS, i] for i in range(args.players)] for r in range(args.rooms)]
+    if args.legacy:
+        scripts = [[([f"ATTACK:{n}" for n in attacks], attacks) for _, attacks in room] for room in scripts]
+    print(f"bot scripts ready in {time.perf_counter() - start:.1f} s")
+
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=serve, args=(args.rooms, args.legacy, child), daemon=True)
+    proc.start()
+    ports = parent.recv()
+
+    rooms = []
+    for port, room_scripts in zip(ports, scripts):
+        counts = [len(attacks) for _, attacks in room_scripts]
+        rooms.append((room_scripts, [Player(port, sum(counts) - n) for n in counts]))
+    players = [p for _, room in rooms for p in room]
+    for p in players:
+        p.seeded.wait(5)
+
+    def blast(player, script):
+        for i in range(0, len(script), args.batch):
+            player.sock.sendall("".join(line + "\n" for line in script[i:i + args.batch]).encode())
+
+    sent = sum(len(lines) for room in scripts for lines, _ in room)
+    garbage = sum(p.expected for p in players)
+    print(f"--- {args.rooms} room(s) x {args.players} players x {args.pieces:,} pieces, "
+          f"{'legacy ATTACK relay' if args.legacy else 'validated inputs'}, {args.batch} lines per packet ---")
+    parent.send('cpu')
+    cpu_start, _ = parent.recv()
+    start = time.perf_counter()
+    senders = [threading.Thread(target=blast, args=(p, lines))
+               for room_scripts, room in rooms for p, (lines, _) in zip(room, room_scripts)]
+    for t in senders: t.start()
+    for t in senders: t.join()
+    for p in players:
+        p.done.wait(60)
+    elapsed = max(p.finished_at or time.perf_counter() for p in players) - start
+    parent.send('cpu')
+    cpu_end, threads = parent.recv()
+
+    lost = 0
+    for r, (room_scripts, room) in enumerate(rooms):
+        total = sum(sum(attacks) for _, attacks in room_scripts)
+        for i, p in enumerate(room):
+            want_lines = total - sum(room_scripts[i][1])
+            if p.received != p.expected or p.lines != want_lines:
+                lost += 1
+                print(f"room {r} player {i}: received {p.received}/{p.expected} messages, "
+                      f"{p.lines}/{want_lines} lines")
+    print(f"{elapsed:.2f} s | {sent / elapsed:,.0f} lines/sec in | "
+          f"{garbage / elapsed:,.0f} garbage messages/sec out | "
+          f"server cpu {(cpu_end - cpu_start) / elapsed * 100:.0f}%, {threads} thread(s) "
+          f"for {len(players)} connections")
+    print("all garbage delivered" if not lost else f"{lost} players missed garbage")
+    for p in players:
+        p.sock.close()
+    parent.send('stop')
+    proc.join(timeout=5)
+
+if __name__ == '__main__':
+    main()
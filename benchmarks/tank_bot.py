@@ -0,0 +1,144 @@
+"""
+Tank 無頭機器人 (不需要 pygame)：說 Tank 協定 (INIT + 二進位 frame，輸入為序號 + bitmask)，
+以隨機但持續一段時間的方向移動並射擊。負載測試 (bench_tank_load.py) 使用，也可以單獨對一台
+正在執行的 game_server 掛機器人：
+    python -m benchmarks.tank_bot --port 9000 --bots 4
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+TANK_DIR = os.path.join(os.path.dirname(__file__), '..', 'dev_client', 'games', 'Tank')
+sys.path.insert(0, TANK_DIR)
+
+from protocol import (StateDecoder, split_frames, encode_input, SEQ_MASK,
+                      INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_SHOOT)
+
+INPUT_RATE = 60            # 每秒送出的輸入數 (與 client 的 FPS 相同)
+HOLD_FRAMES = (10, 40)     # 每個方向持續的畫面數
+SHOOT_CHANCE = 0.05
+DIR_BITS = (0, INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT)
+
+class TankBot:
+    def __init__(self, host, port, seed=None):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rng = random.Random(seed)
+        self.decoder = StateDecoder()
+        self.my_id = None
+        self.running = True
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.mask = 0
+        self.hold = 0
+        self.sent = deque()  # [(seq, 送出時間)] 尚未被 ack
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.bytes = 0
+            self.frames = 0
+            self.latencies = []   # 輸入送出到看見 server ack 的秒數
+            self.first = None     # (tick, 時間)
+            self.last = None
+
+    def start(self):
+        threading.Thread(target=self._recv, daemon=True).start()
+        return self
+
+    def _recv(self):
+        buf = bytearray()
+        got_init = False
+        while self.running:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                break
+            if not data: break
+            now = time.perf_counter()
+            buf += data
+            if not got_init:
+                end = buf.find(b"\n")
+                if end < 0: continue
+                self.my_id = json.loads(buf[:end])['id']
+                del buf[:end + 1]
+                got_init = True
+            with self.lock:
+                self.bytes += len(data)
+                for kind, tick, body in split_frames(buf):
+                    if not self.decoder.apply(kind, tick, body): continue
+                    self.frames += 1
+                    if self.first is None: self.first = (tick, now)
+                    self.last = (tick, now)
+                    me = self.decoder.players.get(self.my_id)
+                    if me is not None: self._ack(me['ack'], now)
+        self.running = False
+
+    def _ack(self, ack, now):
+        sent = self.sent
+        while sent and ((ack - sent[0][0]) & SEQ_MASK) < 0x8000:
+            self.latencies.append(now - sent.popleft()[1])
+
+    def step(self):
+        """送出一個畫面的輸入 (由外部以 INPUT_RATE 呼叫)"""
+        if not self.running or self.my_id is None: return
+        if self.hold <= 0:
+            self.mask = self.rng.choice(DIR_BITS)
+            self.hold = self.rng.randint(*HOLD_FRAMES)
+        self.hold -= 1
+        mask = self.mask
+        if self.rng.random() < SHOOT_CHANCE: mask |= INPUT_SHOOT
+        if not mask: return
+        with self.lock:
+            self.seq = (self.seq + 1) & SEQ_MASK
+            self.sent.append((self.seq, time.perf_counter()))
+            seq = self.seq
+        try:
+            self.sock.sendall(encode_input(seq, mask))
+        except OSError:
+            self.running = False
+
+    def close(self):
+        self.running = False
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+        self.sock.close()
+
+def drive(bots, duration):
+    """以 INPUT_RATE 驅動所有機器人 duration 秒"""
+    dt = 1.0 / INPUT_RATE
+    next_t = time.perf_counter()
+    end = next_t + duration
+    while next_t < end:
+        for bot in bots:
+            bot.step()
+        next_t += dt
+        delay = next_t - time.perf_counter()
+        if delay > 0: time.sleep(delay)
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless Tank bots')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--bots', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=60.0)
+    args = parser.parse_args()
+
+    bots = [TankBot(args.host, args.port, seed=i).start() for i in range(args.bots)]
+    print(f"[TankBot] {len(bots)} bots connected to {args.host}:{args.port}")
+    try:
+        drive(bots, args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for bot in bots:
+            bot.close()
+
+if __name__ == '__main__':
+    main()
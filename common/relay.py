@@ -0,0 +1,250 @@
+"""
+selectors 單執行緒 relay 核心，給只轉發短訊息的遊戲 server 使用。
+
+一個 RelayServer (一個 selector、一個執行緒) 可以同時監聽好幾個 port，每個 port 掛一個房間的
+handler，所以上百個小房間可以放在同一個行程裡，不需要每位玩家一條執行緒。handler 需提供：
+    on_connect(conn)          新玩家連入
+    on_message(conn, msg)     收到一則完整訊息 (str，已去掉分隔符號)
+    on_disconnect(conn)       連線結束 (對方關閉、送收錯誤、或呼叫了 conn.close())
+三個方法都在 selector 的執行緒內依序呼叫，handler 的狀態不需要上鎖。
+
+收訊息用 LineReader 切出以分隔符號結尾的完整訊息 (分隔符號依 port 設定，例如 "\\n" 或 "<EOF>")。
+conn.send(msg) 不會阻塞：訊息放進該連線的 ClientWriter 佇列，每輪事件處理完後每個連線只呼叫一次 send
+(同一批收到的多則訊息合併送出)，送不完的部分等 socket 可寫再送；
+佇列超過 MAX_PENDING (client 收太慢) 就斷線。
+
+遊戲資料夾會整包上傳，上傳後不能 import common：developer_client 打包時把這個檔案以 relay_core.py
+的名稱放進遊戲 (遊戲資料夾內不放副本)；在開發目錄直接執行時，遊戲的 game_server.py 改從 common.relay import。
+"""
+import selectors
+import socket
+from collections import deque
+
+RECV_SIZE = 65536
+MAX_MESSAGE = 64 * 1024     # 單則訊息上限 (沒有分隔符號的資料不能無限累積)
+MAX_PENDING = 1 << 20       # 每個連線送出佇列的上限
+
+class LineReader:
+    """
+    把收到的位元組切成以分隔符號結尾的訊息。TCP 是位元組串流，一次 recv 可能含有好幾則訊息
+    (例如 "ATTACK:2\\nATTACK:1\\n")，也可能只有半則，不完整的部分留在 buffer 等下一次。
+    """
+    def __init__(self, delimiter=b"\n", max_message=MAX_MESSAGE):
+        self.delimiter = delimiter
+        self.max_message = max_message
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """加入這次 recv 的資料，回傳湊齊的訊息 list (bytes，可能是空的)；訊息過長丟出 ValueError"""
+        buf = self.buffer
+        start = max(0, len(buf) - len(self.delimiter) + 1)  # 分隔符號可能跨兩次 recv
+        buf += data
+        end = buf.rfind(self.delimiter, start)
+        if end < 0:
+            if len(buf) > self.max_message:
+                raise ValueError("message too long")
+            return []
+        messages = bytes(buf[:end]).split(self.delimiter)
+        del buf[:end + len(self.delimiter)]
+        return messages
+
+class ClientWriter:
+    """
+    一個連線的送出佇列：send 只把訊息放進佇列，flush 時佇列中的訊息合併成一次 send。
+    訊息不可丟棄 (例如垃圾行)，累積超過 MAX_PENDING 時 send 回傳 False，由呼叫端斷線。
+    """
+    def __init__(self):
+        self.pending = deque()
+        self.pending_bytes = 0
+
+    def send(self, data):
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        return self.pending_bytes <= MAX_PENDING
+
+    def flush(self, sock):
+        """
+        以非阻塞 socket 送出佇列中的資料，回傳是否已全部送完 (沒送完的部分留在佇列)；
+        socket 暫時送不出去時丟出 BlockingIOError，其他錯誤丟出 OSError
+        """
+        pending = self.pending
+        if not pending: return True
+        data = pending[0] if len(pending) == 1 else b"".join(pending)
+        sent = sock.send(data)
+        pending.clear()
+        if sent < len(data):
+            pending.append(data[sent:])
+        self.pending_bytes = len(data) - sent
+        return not pending
+
+class Connection:
+    """一位玩家的連線"""
+    def __init__(self, server, sock, addr, handler, delimiter):
+        self.server = server
+        self.sock = sock
+        self.addr = addr
+        self.handler = handler
+        self.delimiter = delimiter  # bytes
+        self.reader = LineReader(delimiter)
+        self.writer = ClientWriter()
+        self.closed = False
+        self.closing = False        # close(flush=True) 後等 buffer 送完才關
+        self.writing = False        # 是否在等 socket 可寫
+
+    def send(self, msg):
+        """送出一則訊息 (str 或 bytes)，自動加上分隔符號"""
+        if self.closed or self.closing: return
+        if not self.writer.pending:
+            self.server.dirty.append(self)
+        if not self.writer.send((msg if isinstance(msg, bytes) else msg.encode()) + self.delimiter):
+            print(f"[Relay] {self.addr} is not reading, disconnecting.")
+            self.server._drop(self)
+
+    def close(self, flush=False):
+        """關閉連線；flush=True 時先送完已排入的訊息"""
+        if flush and self.writer.pending and not self.closed:
+            self.closing = True
+        else:
+            self.server._drop(self)
+
+class RelayServer:
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.listeners = []
+        self.connections = set()
+        self.dropped = []   # 已關閉、還沒通知 handler 的連線
+        self.dirty = []     # 這一輪有新訊息要送的連線
+        self.running = False
+
+    def listen(self, host, port, handler, delimiter="\n", backlog=16):
+        """開一個 port，連進來的玩家都交給 handler"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(backlog)
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, (handler, delimiter.encode()))
+        self.listeners.append(sock)
+        return sock
+
+    def serve_forever(self, poll_interval=0.5):
+        self.running = True
+        while self.running:
+            self.poll(poll_interval)
+
+    def stop(self):
+        """讓 serve_forever 在這一輪結束後返回 (可在 handler 內呼叫)"""
+        self.running = False
+
+    def poll(self, timeout=None):
+        """處理一輪 I/O 事件"""
+        for key, mask in self.selector.select(timeout):
+            conn = key.data
+            if isinstance(conn, Connection):
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(conn)
+                if mask & selectors.EVENT_READ and not conn.closed:
+                    self._read(conn)
+            else:
+                self._accept(key.fileobj, *conn)
+            self._notify_dropped()
+        self._flush_dirty()
+        self._notify_dropped()  # close(flush=True) 的連線可能剛送完
+
+    def close(self):
+        self._flush_dirty()
+        for conn in list(self.connections):
+            self._drop(conn)
+        self._notify_dropped()
+        for sock in self.listeners:
+            self.selector.unregister(sock)
+            sock.close()
+        self.listeners = []
+        self.selector.close()
+
+    def _accept(self, listener, handler, delimiter):
+        while True:
+            try:
+                sock, addr = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(self, sock, addr, handler, delimiter)
+            self.connections.add(conn)
+            self.selector.register(sock, selectors.EVENT_READ, conn)
+            self._dispatch(conn, handler.on_connect, conn)
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+        try:
+            messages = conn.reader.feed(data)
+        except ValueError:
+            print(f"[Relay] {conn.addr} sent an oversized message, disconnecting.")
+            self._drop(conn)
+            return
+        for msg in messages:
+            if conn.closed: break
+            try:
+                text = msg.decode()
+            except UnicodeDecodeError:
+                self._drop(conn)
+                break
+            self._dispatch(conn, conn.handler.on_message, conn, text)
+
+    def _flush_dirty(self):
+        dirty, self.dirty = self.dirty, []
+        for conn in dirty:
+            if conn.closed or not conn.writer.pending: continue
+            self._flush(conn)
+            if conn.writer.pending and not conn.closed and not conn.writing:
+                self._watch_write(conn, True)
+
+    def _flush(self, conn):
+        try:
+            done = conn.writer.flush(conn.sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._drop(conn)
+            return
+        if done:
+            if conn.writing:
+                self._watch_write(conn, False)
+            if conn.closing:
+                self._drop(conn)
+
+    def _watch_write(self, conn, enabled):
+        conn.writing = enabled
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if enabled else 0)
+        self.selector.modify(conn.sock, events, conn)
+
+    def _drop(self, conn):
+        # 先關閉，等這個事件處理完才呼叫 on_disconnect，handler 走訪玩家名單時不會被改動
+        if conn.closed: return
+        conn.closed = True
+        self.connections.discard(conn)
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+        self.dropped.append(conn)
+
+    def _notify_dropped(self):
+        while self.dropped:
+            conn = self.dropped.pop(0)
+            self._dispatch(conn, conn.handler.on_disconnect, conn)
+
+    def _dispatch(self, conn, callback, *args):
+        # 一個房間的錯誤只斷掉那位玩家，不影響同一行程的其他房間
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"[Relay] Error handling {conn.addr}: {e}")
+            self._drop(conn)
@@ -3,6 +3,12 @@ import json
 import struct
 import os
 import functools
+import hashlib
+
+try:
+    import msgpack  # 選用：有安裝才提供 msgpack 編碼
+except ImportError:
+    msgpack = None
 
 def safe_socket_op(func):
     """裝飾器：處理 Socket 連線與 JSON 解析錯誤"""
@@ -56,16 +62,164 @@ def compare_versions(ver1, ver2):
     elif p1 < p2: return -1
     else: return 0
 
+RECV_CHUNK_SIZE = 65536
+FILE_CHUNK_SIZE = 1024 * 1024  # 檔案傳輸的區塊 / 接收 buffer 大小
+
+# ================= 傳輸協定 =================
+# v1: json.dumps(data) + '\n' (舊版 Client 預設)
+# v2: 4-byte 長度 + 1-byte 種類 + payload，於 auth_login 時協商
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+FRAME_HEADER = struct.Struct('>IB')
+FRAME_JSON = 1
+FRAME_MSGPACK = 2
+FRAME_BINARY = 3
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+def supported_codecs():
+    """本端可解碼的 v2 payload 格式，依偏好排序"""
+    return ["msgpack", "json"] if msgpack else ["json"]
+
+def choose_protocol(req):
+    """Server 端：依 auth_login 請求挑選協定，回傳 (protocol, codec)"""
+    try:
+        requested = int(req.get("protocol", PROTOCOL_V1))
+    except (TypeError, ValueError):
+        requested = PROTOCOL_V1
+    if requested < PROTOCOL_V2:
+        return PROTOCOL_V1, "json"
+    offered = req.get("codecs") or ["json"]
+    codec = next((c for c in offered if c in supported_codecs()), "json")
+    return PROTOCOL_V2, codec
+
+def set_protocol(sock, protocol, codec="json"):
+    """切換連線的傳輸協定 (只支援 BufferedSocket 這類可設定屬性的物件)"""
+    sock.wire_protocol = protocol
+    sock.wire_codec = codec if protocol == PROTOCOL_V2 else "json"
+
+def encode_frame(ftype, payload):
+    return FRAME_HEADER.pack(len(payload), ftype) + payload
+
+def encode_message(data, protocol=PROTOCOL_V1, codec="json"):
+    """依協定把訊息編成要送出的 bytes"""
+    if protocol == PROTOCOL_V2:
+        if codec == "msgpack" and msgpack:
+            return encode_frame(FRAME_MSGPACK, msgpack.packb(data, use_bin_type=True))
+        return encode_frame(FRAME_JSON, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+    return (json.dumps(data) + '\n').encode('utf-8')
+
+def decode_frame(ftype, payload):
+    """把 v2 frame 的 payload 還原成訊息"""
+    if ftype == FRAME_JSON:
+        return json.loads(payload)
+    if ftype == FRAME_MSGPACK:
+        if not msgpack: raise ValueError("收到 msgpack frame 但未安裝 msgpack")
+        return msgpack.unpackb(payload, raw=False)
+    raise ValueError(f"預期訊息 frame，收到種類 {ftype}")
+
+class BufferedSocket:
+    """
+    包裝 socket 的緩衝讀取器：一次 recv 大區塊，從 bytearray 切出以換行分隔的 JSON。
+    其餘屬性 (sendall, close, settimeout...) 直接轉交給原本的 socket。
+    recv() 會先吐出緩衝區內剩餘的資料，因此 JSON header 後面接著的
+    檔案串流 (recv_file) 不會因為被預讀而遺失。
+    """
+    def __init__(self, sock, chunk_size=RECV_CHUNK_SIZE):
+        self.sock = sock
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.scan_pos = 0  # buffer[:scan_pos] 已確認沒有換行，避免重複掃描
+        self.wire_protocol = PROTOCOL_V1
+        self.wire_codec = "json"
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def fill(self):
+        """從 socket 讀一個區塊進緩衝區，連線關閉時回傳 False"""
+        data = self.sock.recv(self.chunk_size)
+        if not data: return False
+        self.buffer += data
+        return True
+
+    def read_line(self):
+        """讀取一行 (不含換行字元)，連線關閉時回傳 None"""
+        while True:
+            idx = self.buffer.find(b'\n', self.scan_pos)
+            if idx >= 0:
+                line = bytes(self.buffer[:idx])
+                # bytearray 從頭刪除只移動起點，不會重新複製剩餘資料
+                del self.buffer[:idx + 1]
+                self.scan_pos = 0
+                return line
+            self.scan_pos = len(self.buffer)
+            if not self.fill(): return None
+
+    def read_frame(self):
+        """讀取一個 v2 frame，回傳 (種類, payload)，連線關閉時回傳 None"""
+        header_size = FRAME_HEADER.size
+        while len(self.buffer) < header_size:
+            if not self.fill(): return None
+        size, ftype = FRAME_HEADER.unpack_from(self.buffer)
+        if size > MAX_FRAME_SIZE:
+            raise ValueError(f"frame 過大: {size} bytes")
+        end = header_size + size
+        while len(self.buffer) < end:
+            if not self.fill(): return None
+        payload = bytes(self.buffer[header_size:end])
+        del self.buffer[:end]
+        self.scan_pos = 0
+        return ftype, payload
+
+    def read_json(self):
+        """讀取一則訊息 (依目前協定)，連線關閉時回傳 None (timeout 等例外會往上拋)"""
+        if self.wire_protocol == PROTOCOL_V2:
+            frame = self.read_frame()
+            if frame is None: return None
+            return decode_frame(*frame)
+        line = self.read_line()
+        if line is None: return None
+        return json.loads(line)
+
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        """recv 的 zero-copy 版本，同樣先交出緩衝區內的資料"""
+        if self.buffer:
+            view = memoryview(buffer)
+            n = min(nbytes or len(view), len(self.buffer))
+            view[:n] = self.buffer[:n]
+            del self.buffer[:n]
+            self.scan_pos = 0
+            return n
+        return self.sock.recv_into(buffer, nbytes, flags)
+
+    def recv(self, bufsize, flags=0):
+        """先交出緩衝區內的資料，緩衝區空了才直接讀 socket"""
+        if self.buffer:
+            data = bytes(self.buffer[:bufsize])
+            del self.buffer[:bufsize]
+            self.scan_pos = 0
+            return data
+        return self.sock.recv(bufsize, flags)
+
 def send_json(sock, data):
-    """傳送 JSON"""
+    """傳送 JSON (v2 連線改送長度前綴 frame)"""
     try:
-        message = json.dumps(data) + '\n'
-        sock.sendall(message.encode('utf-8'))
+        protocol = getattr(sock, 'wire_protocol', PROTOCOL_V1)
+        sock.sendall(encode_message(data, protocol, getattr(sock, 'wire_codec', "json")))
     except Exception as e:
         print(f"[Send Error] {e}")
 
 def recv_json(sock):
-    """接收 JSON (改為逐字元讀取，避免誤讀 Binary 資料)"""
+    """
+    接收 JSON
+    BufferedSocket 走緩衝讀取；一般 socket 維持逐字元讀取，避免誤讀後面的 Binary 資料
+    """
+    if isinstance(sock, BufferedSocket):
+        try:
+            return sock.read_json()
+        except Exception as e:
+            print(f"[Recv Error] {e}")
+            return None
     buffer = b""
     try:
         while True:
@@ -78,37 +232,237 @@ def recv_json(sock):
         print(f"[Recv Error] {e}")
         return None
 
-def send_file(sock, file_path):
-    """傳送檔案 (先傳大小，再傳內容)"""
+def _sendfile(sock, f, offset, count, chunk_size):
+    """
+    盡量走 zero-copy：socket.sendfile 在支援的平台上使用 os.sendfile，
+    不支援時 (例如 Windows 或自訂連線物件) 退回大區塊讀檔 + sendall
+    """
+    if hasattr(sock, 'sendfile'):
+        sock.sendfile(f, offset, count)
+        return
+    f.seek(offset)
+    remaining = count
+    while remaining > 0:
+        bytes_read = f.read(min(chunk_size, remaining))
+        if not bytes_read: raise EOFError("檔案在傳送途中變短")
+        sock.sendall(bytes_read)
+        remaining -= len(bytes_read)
+
+def send_file(sock, file_path, chunk_size=FILE_CHUNK_SIZE):
+    """
+    傳送檔案
+    v1: 先傳 8-byte 大小，再傳內容；v2: 每塊內容一個 binary frame，最後以空 frame 結尾
+    """
     try:
         file_size = os.path.getsize(file_path)
-        sock.sendall(struct.pack('>Q', file_size))
         with open(file_path, 'rb') as f:
-            while True:
-                bytes_read = f.read(4096)
-                if not bytes_read: break
-                sock.sendall(bytes_read)
+            if getattr(sock, 'wire_protocol', PROTOCOL_V1) == PROTOCOL_V2:
+                offset = 0
+                while offset < file_size:
+                    count = min(chunk_size, file_size - offset)
+                    sock.sendall(FRAME_HEADER.pack(count, FRAME_BINARY))
+                    _sendfile(sock, f, offset, count, chunk_size)
+                    offset += count
+                sock.sendall(FRAME_HEADER.pack(0, FRAME_BINARY))
+                return True
+            sock.sendall(struct.pack('>Q', file_size))
+            if file_size:
+                _sendfile(sock, f, 0, file_size, chunk_size)
         return True
     except Exception as e:
         print(f"[Send File Error] {e}")
         return False
 
-def recv_file(sock, save_path):
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """計算檔案的 SHA-256 (hex)"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk: break
+            h.update(chunk)
+    return h.hexdigest()
+
+def build_file_manifest(folder):
+    """列出資料夾內每個檔案的 sha256: {相對路徑 (以 / 分隔): hex}，略過 __pycache__"""
+    manifest = {}
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        for file in files:
+            if file.endswith('.pyc'): continue
+            abs_file = os.path.join(root, file)
+            manifest[os.path.relpath(abs_file, folder).replace(os.sep, '/')] = file_sha256(abs_file)
+    return manifest
+
+def recv_exact(sock, size):
+    """讀滿 size bytes，連線中途關閉時回傳 None"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk: return None
+        data += chunk
+    return bytes(data)
+
+def _recv_into_file(sock, f, size, view):
+    """
+    從 socket 讀 size bytes 寫入檔案：recv_into 直接填進預先配置的 buffer，
+    buffer 滿了才寫檔，避免每個小封包都產生 bytes 物件與一次 write
+    回傳實際收到的 bytes 數 (連線中斷時會小於 size)
+    """
+    received = 0
+    filled = 0
+    capacity = len(view)
+    while received < size:
+        want = min(capacity - filled, size - received)
+        n = sock.recv_into(view[filled:filled + want], want)
+        if not n: break
+        filled += n
+        received += n
+        if filled == capacity:
+            f.write(view[:filled])
+            filled = 0
+    if filled:
+        f.write(view[:filled])
+    return received
+
+def recv_file(sock, save_path, chunk_size=FILE_CHUNK_SIZE):
     """接收檔案"""
     try:
-        raw_msglen = sock.recv(8)
+        view = memoryview(bytearray(chunk_size))
+        if getattr(sock, 'wire_protocol', PROTOCOL_V1) == PROTOCOL_V2:
+            return _recv_file_frames(sock, save_path, view)
+        raw_msglen = recv_exact(sock, 8)
         if not raw_msglen: return False
         file_size = struct.unpack('>Q', raw_msglen)[0]
-        
-        received_size = 0
+
         with open(save_path, 'wb') as f:
-            while received_size < file_size:
-                chunk_size = 4096 if (file_size - received_size) > 4096 else (file_size - received_size)
-                chunk = sock.recv(chunk_size)
-                if not chunk: break
-                f.write(chunk)
-                received_size += len(chunk)
+            received = _recv_into_file(sock, f, file_size, view)
+        if received < file_size:
+            print(f"[Recv File Error] 連線中斷 ({received}/{file_size} bytes)")
+            return False
+        return True
+    except Exception as e:
+        print(f"[Recv File Error] {e}")
+        return False
+
+def _recv_file_frames(sock, save_path, view):
+    """v2：接收 binary frame 直到空 frame；中途斷線回傳 False"""
+    with open(save_path, 'wb') as f:
+        while True:
+            header = recv_exact(sock, FRAME_HEADER.size)
+            if header is None: return False
+            size, ftype = FRAME_HEADER.unpack(header)
+            if ftype != FRAME_BINARY:
+                raise ValueError(f"檔案傳輸中收到非 binary frame ({ftype})")
+            if size == 0: return True
+            if _recv_into_file(sock, f, size, view) < size: return False
+
+# ================= 可續傳的分塊傳輸 =================
+# 每塊: [v2 binary frame header] + offset(8) + 長度(4) + sha256(32) + 資料
+# 接收端逐塊驗證後寫入 .part 檔，中斷時保留已驗證的部分，下次從 offset 續傳；
+# 全部收完再比對整檔 sha256
+CHUNK_HEADER = struct.Struct('>QI32s')
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+def resume_offset(part_path, chunk_size=TRANSFER_CHUNK_SIZE):
+    """已存在的 .part 檔可續傳的位置 (捨棄最後一個可能沒寫完的區塊)"""
+    if not os.path.exists(part_path): return 0
+    return (os.path.getsize(part_path) // chunk_size) * chunk_size
+
+CHUNK_DIGEST_CACHE_SIZE = 64
+_chunk_digest_cache = {}  # {(路徑, 大小, mtime, chunk_size): [每塊 sha256]}
+
+def chunk_digests(file_path, chunk_size=TRANSFER_CHUNK_SIZE):
+    """
+    檔案每個區塊的 sha256 (bytes)。bundle 上架後內容不會變，
+    大小與修改時間相同時重用上次的結果，之後的下載不必再讀檔計算
+    """
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns, chunk_size)
+    digests = _chunk_digest_cache.get(key)
+    if digests is not None: return digests
+    digests = []
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(file_path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n: break
+            digests.append(hashlib.sha256(view[:n]).digest())
+    if len(_chunk_digest_cache) >= CHUNK_DIGEST_CACHE_SIZE:
+        # lobby server 多執行緒同時下載，另一條執行緒可能剛好移除了同一筆
+        _chunk_digest_cache.pop(next(iter(_chunk_digest_cache), None), None)
+    _chunk_digest_cache[key] = digests
+    return digests
+
+def send_chunks(sock, file_path, offset=0, chunk_size=TRANSFER_CHUNK_SIZE):
+    """
+    從 offset 開始分塊傳送檔案，每塊附上位置與 sha256。
+    區塊 hash 事先算好 (見 chunk_digests)，資料本身仍走 _sendfile 的 zero-copy 路徑
+    """
+    try:
+        if offset % chunk_size:
+            raise ValueError(f"續傳位置 {offset} 未對齊區塊大小 {chunk_size}")
+        v2 = getattr(sock, 'wire_protocol', PROTOCOL_V1) == PROTOCOL_V2
+        digests = chunk_digests(file_path, chunk_size)
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            while offset < file_size:
+                length = min(chunk_size, file_size - offset)
+                header = CHUNK_HEADER.pack(offset, length, digests[offset // chunk_size])
+                if v2:
+                    header = FRAME_HEADER.pack(len(header) + length, FRAME_BINARY) + header
+                sock.sendall(header)
+                _sendfile(sock, f, offset, length, chunk_size)
+                offset += length
         return True
+    except Exception as e:
+        print(f"[Send File Error] {e}")
+        return False
+
+def _recv_exact_into(sock, view):
+    """把 view 填滿，連線中斷回傳 False"""
+    filled = 0
+    while filled < len(view):
+        n = sock.recv_into(view[filled:], len(view) - filled)
+        if not n: return False
+        filled += n
+    return True
+
+def recv_chunks(sock, part_path, offset, total_size, expected_sha256, chunk_size=TRANSFER_CHUNK_SIZE):
+    """
+    接收 send_chunks 送來的區塊並寫入 part_path (從 offset 續寫)。
+    回傳 True 代表整檔完整且 sha256 相符；False 時 part 檔保留到最後一個驗證過的區塊。
+    """
+    v2 = getattr(sock, 'wire_protocol', PROTOCOL_V1) == PROTOCOL_V2
+    buf = memoryview(bytearray(chunk_size))
+    try:
+        with open(part_path, 'r+b' if os.path.exists(part_path) else 'wb') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            while offset < total_size:
+                if v2:
+                    frame = recv_exact(sock, FRAME_HEADER.size)
+                    if frame is None: return False
+                    if FRAME_HEADER.unpack(frame)[1] != FRAME_BINARY:
+                        raise ValueError("分塊傳輸中收到非 binary frame")
+                header = recv_exact(sock, CHUNK_HEADER.size)
+                if header is None: return False
+                chunk_offset, length, digest = CHUNK_HEADER.unpack(header)
+                if chunk_offset != offset or length > chunk_size or length == 0:
+                    raise ValueError(f"區塊位置錯誤 (預期 {offset}，收到 {chunk_offset}/{length})")
+                data = buf[:length]
+                if not _recv_exact_into(sock, data): return False
+                if hashlib.sha256(data).digest() != digest:
+                    print(f"[Recv File Error] 區塊 sha256 不符 (offset {offset})")
+                    return False
+                f.write(data)
+                offset += length
     except Exception as e:
         print(f"[Recv File Error] {e}")
-        return False
\ No newline at end of file
+        return False
+    if file_sha256(part_path) != expected_sha256:
+        print("[Recv File Error] 整檔 sha256 不符，捨棄暫存檔")
+        os.remove(part_path)
+        return False
+    return True
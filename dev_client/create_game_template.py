@@ -28,25 +28,46 @@ def create_template():
         json.dump(config_data, f, indent=4)
 
     # 2. 建立 game_server.py 範本
-    server_code = '''import socket
-import argparse
-import time
-import threading
+    server_code = '''import argparse
+import os
+import sys
+
+try:
+    from relay_core import RelayServer
+except ImportError:
+    # 在開發目錄直接執行：relay_core.py 是上傳時才由 developer_client 從 common/relay.py 打包進來的
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+    from common.relay import RelayServer
+
+class GameRoom:
+    """遊戲邏輯：relay_core 在單一執行緒依序呼叫以下方法，訊息以換行分隔"""
+    def __init__(self):
+        self.players = []
+
+    def on_connect(self, conn):
+        print(f"[GameServer] Player connected: {conn.addr}")
+        self.players.append(conn)
+        conn.send("Welcome to {game_name}! Game is running.")
+
+    def on_message(self, conn, msg):
+        # 模擬遊戲邏輯：把訊息轉發給其他玩家
+        for player in self.players:
+            if player is not conn:
+                player.send(msg)
+
+    def on_disconnect(self, conn):
+        print(f"[GameServer] Player disconnected: {conn.addr}")
+        self.players.remove(conn)
 
 def run_game_server(host, port):
     print(f"[GameServer] Starting {game_name} on {host}:{port}...")
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((host, port))
-    server.listen(5)
+    server = RelayServer()
+    server.listen(host, port, GameRoom())
     
     print(f"[GameServer] Listening...")
     
-    # 模擬遊戲邏輯
     try:
-        while True:
-            client, addr = server.accept()
-            print(f"[GameServer] Player connected: {addr}")
-            client.sendall(b"Welcome to {game_name}! Game is running.\\n")
+        server.serve_forever()
     except KeyboardInterrupt:
         print("Server stopping...")
     finally:
@@ -82,7 +103,7 @@ def run_game_client(host, port):
         while True:
             msg = input("Enter command (or 'quit'): ")
             if msg == 'quit': break
-            s.sendall(msg.encode())
+            s.sendall((msg + "\\n").encode())
             
     except ConnectionRefusedError:
         print("Failed to connect to game server.")
@@ -102,6 +123,7 @@ if __name__ == "__main__":
 
     print(f"✅ Template created at {base_dir}/")
     print("Files: config.json, game_server.py, game_client.py")
+    print("relay_core.py (common/relay.py) is packed in automatically when uploading.")
 
 if __name__ == '__main__':
     create_template()
\ No newline at end of file
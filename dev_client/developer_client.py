@@ -7,7 +7,7 @@ import zipfile
 import shutil
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from common.util import send_json, recv_json, load_system_config, send_file
+from common.util import send_json, recv_json, load_system_config, BufferedSocket, set_protocol, supported_codecs, PROTOCOL_V1, PROTOCOL_V2, file_sha256, send_chunks, TRANSFER_CHUNK_SIZE
 
 # ================= 全域變數 =================
 config = load_system_config()
@@ -17,8 +17,14 @@ SERVER_PORT = config.get("DEV_PORT", 8889)
 client_socket = None
 curr_page = "Home"
 user_id = ""
+user_password = ""  # 上傳中斷時自動重新登入續傳用
+# 上傳中斷後自動重連續傳的次數
+MAX_UPLOAD_RETRIES = 3
 
 GAMES_DIR = os.path.join(os.path.dirname(__file__), 'games')
+# 遊戲 server 共用的 relay 核心只維護 common/relay.py 一份，上傳時以 relay_core.py 的名稱打包進遊戲
+RELAY_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common', 'relay.py')
+RELAY_MODULE = "relay_core.py"
 
 # ================= 輔助函式 =================
 def clear_screen():
@@ -33,14 +39,23 @@ def get_input(prompt):
 def connect_server():
     global client_socket
     try:
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client_socket = BufferedSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
         client_socket.connect((SERVER_IP, SERVER_PORT))
         return True
     except Exception as e:
         print(f"無法連線至 Dev Server ({SERVER_IP}:{SERVER_PORT}): {e}")
         return False
 
+def uses_relay_core(folder_path):
+    """遊戲資料夾最上層的 .py 是否 import relay_core"""
+    for name in os.listdir(folder_path):
+        if name.endswith('.py') and name != RELAY_MODULE:
+            with open(os.path.join(folder_path, name), 'r', encoding='utf-8', errors='ignore') as f:
+                if 'relay_core' in f.read(): return True
+    return False
+
 def zip_game_folder(folder_path, output_path):
+    with_relay = uses_relay_core(folder_path)
     with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
         for root, dirs, files in os.walk(folder_path):
             for file in files:
@@ -48,12 +63,34 @@ def zip_game_folder(folder_path, output_path):
                     continue
                 file_path = os.path.join(root, file)
                 arcname = os.path.relpath(file_path, folder_path)
+                if with_relay and arcname == RELAY_MODULE: continue  # 舊的副本一律以 common/relay.py 取代
                 zipf.write(file_path, arcname)
+        if with_relay:
+            zipf.write(RELAY_SOURCE, RELAY_MODULE)
+
+def login(u, p):
+    """送出登入並協商協定，回傳 Server 回應"""
+    global user_id, user_password
+    send_json(client_socket, {"cmd": "auth_login", "username": u, "password": p,
+                              "protocol": PROTOCOL_V2, "codecs": supported_codecs()})
+    resp = recv_json(client_socket)
+    if resp and resp.get("status") == "ok":
+        # 舊版 Server 不會回傳 protocol，維持 v1
+        set_protocol(client_socket, resp.get("protocol", PROTOCOL_V1), resp.get("codec", "json"))
+        user_id, user_password = u, p
+    return resp
+
+def reconnect():
+    """重新連線並以目前帳號登入"""
+    try: client_socket.close()
+    except Exception: pass
+    if not connect_server(): return False
+    resp = login(user_id, user_password)
+    return bool(resp and resp.get("status") == "ok")
 
 # ================= 登入頁面 =================
 
 def LoginPage():
-    global user_id
     while True:
         clear_screen()
         print("=== Developer Console (Login) ===")
@@ -67,10 +104,8 @@ def LoginPage():
         if choice == '1':
             u = get_input("帳號: ")
             p = get_input("密碼: ")
-            send_json(client_socket, {"cmd": "auth_login", "username": u, "password": p})
-            resp = recv_json(client_socket)
+            resp = login(u, p)
             if resp and resp.get("status") == "ok":
-                user_id = u
                 print(f"登入成功！")
                 time.sleep(1)
                 return 
@@ -170,16 +205,23 @@ def process_upload(folder_name, is_update=False, game_id=None):
         "cmd": "upload_game",
         "config": game_config,
         "is_update": is_update,
-        "game_id": game_id
+        "game_id": game_id,
+        "transfer": {"size": os.path.getsize(zip_filename), "sha256": file_sha256(zip_filename)}
     }
-    send_json(client_socket, req)
-    
-    if send_file(client_socket, zip_filename):
-        resp = recv_json(client_socket)
-        if resp and resp.get("status") == "ok":
-            print(f"上架/更新成功！ Game ID: {resp.get('game_id')}")
-        else:
-            print(f"失敗: {resp.get('reason')}")
+    resp = upload_chunks(req, zip_filename)
+    retries = 0
+    # 連線中斷或區塊驗證失敗時，重新連線並從 Server 已驗證的位置續傳
+    while (resp is None or resp.get("resumable")) and retries < MAX_UPLOAD_RETRIES:
+        retries += 1
+        print(f"上傳中斷，重新連線續傳中 ({retries}/{MAX_UPLOAD_RETRIES})...")
+        time.sleep(1)
+        if reconnect():
+            resp = upload_chunks(req, zip_filename)
+
+    if resp and resp.get("status") == "ok":
+        print(f"上架/更新成功！ Game ID: {resp.get('game_id')}")
+    elif resp:
+        print(f"失敗: {resp.get('reason')}")
     else:
         print("檔案傳輸失敗")
         
@@ -189,6 +231,18 @@ def process_upload(folder_name, is_update=False, game_id=None):
     global curr_page
     curr_page = "Home"
 
+def upload_chunks(req, zip_filename):
+    """送出上傳請求並從 Server 指定的 offset 分塊傳送，連線中斷時回傳 None"""
+    send_json(client_socket, req)
+    ready = recv_json(client_socket)
+    if not ready or ready.get("status") != "ready": return ready
+    offset = ready.get("offset", 0)
+    if offset:
+        print(f"從 {offset} bytes 處續傳...")
+    if not send_chunks(client_socket, zip_filename, offset, ready.get("chunk_size", TRANSFER_CHUNK_SIZE)):
+        return None
+    return recv_json(client_socket)
+
 def ListRemote():
     global curr_page
     clear_screen()
@@ -0,0 +1,195 @@
+"""
+子彈儲存與每 tick 的模擬
+
+BulletArrays：structure-of-arrays 的 NumPy 版本，位置積分、出界/撞牆與撞人判定都向量化，
+              死亡的子彈一次壓縮掉。需要 numpy，沒有安裝時自動改用 BulletList。
+BulletList  ：純 Python 的 dict 列表 + 格網 broad phase (spatial_grid.py)。
+
+兩者結果完全相同：子彈依發射順序處理，同一 tick 內先被打到重生的坦克，
+後面的子彈會以重生後的位置判定。
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from spatial_grid import DynamicGrid
+
+class BulletList:
+    def __init__(self, wall_grid, width, height, bullet_size, player_size):
+        self.items = []  # [{id, x, y, dx, dy, owner_id}]
+        self.wall_grid = wall_grid
+        self.player_grid = DynamicGrid()
+        self.width, self.height = width, height
+        self.size, self.player_size = bullet_size, player_size
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, bid, x, y, dx, dy, owner_id):
+        self.items.append({'id': bid, 'x': x, 'y': y, 'dx': dx, 'dy': dy, 'owner_id': owner_id})
+
+    def records(self):
+        """[(id, x, y, dx, dy, owner_id)]，給 protocol.StateEncoder 使用"""
+        return [(b['id'], b['x'], b['y'], b['dx'], b['dy'], b['owner_id']) for b in self.items]
+
+    def step(self, state):
+        """推進一個 tick；撞到玩家時呼叫 state.bullet_hit(hit_pid, owner_id)"""
+        players, size, ps = state.players, self.size, self.player_size
+        grid = self.player_grid
+        # 依 players 的順序重建玩家格網 (命中判定與逐一掃描時的先後相同)
+        grid.clear()
+        for pid, p in players.items():
+            grid.insert(pid, (p['x'], p['y'], p['x'] + ps, p['y'] + ps))
+        wall_hit = self.wall_grid.hit
+        player_hit = grid.first_hit
+        w, h = self.width, self.height
+
+        alive = []
+        for b in self.items:
+            b['x'] += b['dx']
+            b['y'] += b['dy']
+            x, y = b['x'], b['y']
+            # 子彈出界或撞牆
+            if x < 0 or x > w or y < 0 or y > h or wall_hit(x, y, x + size, y + size):
+                continue
+            # 子彈撞人
+            hit_pid = player_hit(x, y, x + size, y + size, exclude=b['owner_id'])
+            if hit_pid is not None:
+                if state.bullet_hit(hit_pid, b['owner_id']):
+                    p = players[hit_pid]
+                    grid.move(hit_pid, (p['x'], p['y'], p['x'] + ps, p['y'] + ps))
+                continue
+            alive.append(b)
+        self.items = alive
+
+class BulletArrays:
+    CAPACITY = 256
+
+    def __init__(self, walls, width, height, bullet_size, player_size):
+        self.width, self.height = width, height
+        self.size, self.player_size = bullet_size, player_size
+        self.n = 0
+        self._alloc(self.CAPACITY)
+        # 玩家 ID <-> 整數代碼 (owner 欄位用)；離開的玩家沒有子彈在場上後代碼會釋放給新玩家重用
+        self.codes = {}
+        self.names = []
+        self.free_codes = []
+        # 牆壁的 summed-area table：任一矩形是否碰到牆只需查 4 個值，與牆壁數量無關
+        occupied = np.zeros((height, width), dtype=np.int32)
+        for wall in walls:
+            occupied[max(wall['y'], 0):wall['y'] + wall['h'], max(wall['x'], 0):wall['x'] + wall['w']] = 1
+        self.wall_sat = np.zeros((height + 1, width + 1), dtype=np.int32)
+        self.wall_sat[1:, 1:] = occupied.cumsum(0).cumsum(1)
+
+    def _alloc(self, capacity):
+        old = getattr(self, 'x', None)
+        arrays = {name: np.zeros(capacity, dtype=np.int32) for name in ('ids', 'x', 'y', 'dx', 'dy', 'owner')}
+        if old is not None:
+            for name, arr in arrays.items():
+                arr[:self.n] = getattr(self, name)[:self.n]
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+
+    def _code(self, pid):
+        code = self.codes.get(pid)
+        if code is None:
+            if self.free_codes:
+                code = self.free_codes.pop()
+                self.names[code] = pid
+            else:
+                code = len(self.names)
+                self.names.append(pid)
+            self.codes[pid] = code
+        return code
+
+    def _release_codes(self, players):
+        """釋放已離開、且沒有子彈還在場上的玩家代碼 (否則長時間的房間會一直累積)"""
+        if len(self.codes) <= len(players): return
+        in_use = set(np.unique(self.owner[:self.n]).tolist())
+        for pid, code in list(self.codes.items()):
+            if pid not in players and code not in in_use:
+                del self.codes[pid]
+                self.names[code] = None
+                self.free_codes.append(code)
+
+    def __len__(self):
+        return self.n
+
+    def add(self, bid, x, y, dx, dy, owner_id):
+        if self.n == len(self.x):
+            self._alloc(len(self.x) * 2)
+        i = self.n
+        self.ids[i], self.x[i], self.y[i], self.dx[i], self.dy[i] = bid, x, y, dx, dy
+        self.owner[i] = self._code(owner_id)
+        self.n += 1
+
+    def records(self):
+        """[(id, x, y, dx, dy, owner_id)]，給 protocol.StateEncoder 使用"""
+        n, names = self.n, self.names
+        return list(zip(self.ids[:n].tolist(), self.x[:n].tolist(), self.y[:n].tolist(),
+                        self.dx[:n].tolist(), self.dy[:n].tolist(),
+                        [names[c] for c in self.owner[:n].tolist()]))
+
+    def _player_hits(self, x, y, owner, alive, px, py, pcodes):
+        """(子彈 x 玩家) 的重疊矩陣，排除自己的子彈與已死亡的子彈"""
+        size, ps = self.size, self.player_size
+        xs, ys = x[:, None], y[:, None]
+        return ((xs < px + ps) & (xs + size > px) & (ys < py + ps) & (ys + size > py)
+                & (owner[:, None] != pcodes) & alive[:, None])
+
+    def step(self, state):
+        """推進一個 tick；撞到玩家時呼叫 state.bullet_hit(hit_pid, owner_id)"""
+        n = self.n
+        if n == 0:
+            self._release_codes(state.players)
+            return
+        x, y, owner = self.x[:n], self.y[:n], self.owner[:n]
+        x += self.dx[:n]
+        y += self.dy[:n]
+        w, h, size = self.width, self.height, self.size
+
+        # 出界或撞牆
+        alive = (x >= 0) & (x <= w) & (y >= 0) & (y <= h)
+        x1, y1 = np.clip(x, 0, w), np.clip(y, 0, h)
+        x2, y2 = np.minimum(x1 + size, w), np.minimum(y1 + size, h)
+        sat = self.wall_sat
+        alive &= (sat[y2, x2] - sat[y1, x2] - sat[y2, x1] + sat[y1, x1]) == 0
+
+        # 撞人：先對 tick 開始時的位置一次算完，只有真的撞到的子彈才逐顆處理
+        players = state.players
+        if players:
+            pids = list(players)
+            px = np.array([players[pid]['x'] for pid in pids], dtype=np.int32)
+            py = np.array([players[pid]['y'] for pid in pids], dtype=np.int32)
+            pcodes = np.array([self._code(pid) for pid in pids], dtype=np.int32)
+            hits = self._player_hits(x, y, owner, alive, px, py, pcodes)
+            pending = np.flatnonzero(hits.any(axis=1)).tolist()
+            k = 0
+            while k < len(pending):
+                i = pending[k]
+                k += 1
+                j = int(np.argmax(hits[i]))  # players 順序中第一個被打到的
+                alive[i] = False
+                owner_id = self.names[owner[i]]
+                if state.bullet_hit(pids[j], owner_id):
+                    # 坦克重生換了位置，之後的子彈要用新位置重新判定
+                    px[j], py[j] = players[pids[j]]['x'], players[pids[j]]['y']
+                    rest = slice(i + 1, n)
+                    hits[rest] = self._player_hits(x[rest], y[rest], owner[rest], alive[rest], px, py, pcodes)
+                    pending = pending[:k] + (np.flatnonzero(hits[rest].any(axis=1)) + i + 1).tolist()
+
+        # 一次壓縮掉死亡的子彈
+        keep = np.flatnonzero(alive)
+        m = len(keep)
+        if m < n:
+            for arr in (self.ids, self.x, self.y, self.dx, self.dy, self.owner):
+                arr[:m] = arr[keep]
+            self.n = m
+        self._release_codes(state.players)
+
+def make_bullets(walls, wall_grid, width, height, bullet_size, player_size):
+    """有 numpy 時用向量化版本，否則用純 Python 版本"""
+    if np is not None:
+        return BulletArrays(walls, width, height, bullet_size, player_size)
+    return BulletList(wall_grid, width, height, bullet_size, player_size)
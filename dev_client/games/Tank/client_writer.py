@@ -0,0 +1,101 @@
+"""
+每個 client 一條送出執行緒 (latest-state-wins)
+
+廣播迴圈只把這個 tick 的 frame 放進 client 的信箱就返回，不會被慢的 client 卡住。
+信箱只保留最新一個 frame：上一個還沒送出就被覆蓋時，client 已漏掉一個 delta，
+之後改送 keyframe (needs_key) 讓它重新同步。一次 sendall 卡住超過 stall_timeout
+或連續掉太多 frame 的 client 直接斷線。
+
+讀取仍由各自的 handle_client 執行緒以阻塞 socket 處理，因此這裡沒有改用 selector；
+送出端改成獨立執行緒即可把廣播與慢速連線隔開。
+"""
+import socket
+import threading
+import time
+from collections import deque
+
+STALL_TIMEOUT = 5.0       # 單次 sendall 最長可卡住的秒數
+MAX_DROPPED_SECONDS = 3.0 # 連續掉 frame 超過這麼久就斷線
+DEFAULT_SEND_RATE = 20    # 與 game_server.SEND_RATE 相同
+
+class ClientWriter:
+    def __init__(self, conn, stall_timeout=STALL_TIMEOUT, send_rate=DEFAULT_SEND_RATE,
+                 max_dropped_seconds=MAX_DROPPED_SECONDS):
+        self.conn = conn
+        self.stall_timeout = stall_timeout
+        # 連續掉 frame 的上限依實際的送出頻率換算 (20 Hz 下為 60 個)
+        self.max_dropped = max(1, round(max_dropped_seconds * send_rate))
+        self.cond = threading.Condition()
+        self.reliable = deque()   # 不可丟棄的訊息 (INIT 等)，依序送出
+        self.latest = None        # 最新的狀態 frame
+        self.streaming = False    # start() 之前不收狀態 frame，確保 INIT 先送
+        self.needs_key = True     # 下一個狀態 frame 必須是 keyframe
+        self.dropped = 0          # 連續被覆蓋的 frame 數
+        self.sending_since = None
+        self.closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def start(self, init_data):
+        """送出連線初始訊息，之後才開始接收狀態 frame"""
+        with self.cond:
+            self.reliable.append(init_data)
+            self.streaming = True
+            self.cond.notify()
+
+    def send_reliable(self, data):
+        with self.cond:
+            self.reliable.append(data)
+            self.cond.notify()
+
+    def offer(self, frame, is_key):
+        """放入這個 tick 的 frame；上一個還沒送出時丟掉它 (只保留最新狀態)"""
+        with self.cond:
+            if self.closed or not self.streaming: return
+            if self.latest is not None:
+                self.dropped += 1
+                self.latest = None
+                if not is_key:
+                    # 已漏掉一個 delta，這個 delta 也無法套用，等下一個 keyframe
+                    self.needs_key = True
+                    return
+            if is_key:
+                self.needs_key = False
+            elif self.needs_key:
+                return
+            self.latest = frame
+            self.cond.notify()
+
+    def stalled(self, now=None):
+        """卡住太久或掉太多 frame，應該斷線"""
+        now = time.monotonic() if now is None else now
+        since = self.sending_since
+        return (since is not None and now - since > self.stall_timeout) or self.dropped > self.max_dropped
+
+    def close(self):
+        with self.cond:
+            if self.closed: return
+            self.closed = True
+            self.cond.notify()
+        # shutdown 讓卡在 sendall / recv 的執行緒都立即返回
+        try: self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.closed and not self.reliable and self.latest is None:
+                    self.cond.wait()
+                if self.closed: return
+                if self.reliable:
+                    data = self.reliable.popleft()
+                else:
+                    data, self.latest = self.latest, None
+                    self.dropped = 0
+                self.sending_since = time.monotonic()
+            try:
+                self.conn.sendall(data)
+            except OSError:
+                self.close()
+                return
+            finally:
+                self.sending_since = None
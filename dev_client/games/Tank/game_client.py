@@ -3,8 +3,14 @@ import argparse
 import threading
 import json
 import sys
+import time
 import pygame
 
+from protocol import (StateDecoder, split_frames, encode_input, FRAME_KEY,
+                      INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_SHOOT)
+from prediction import SnapshotBuffer, Predictor
+from spatial_grid import StaticGrid
+
 # --- 顏色定義 ---
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -18,6 +24,9 @@ YELLOW = (200, 200, 50)
 WIDTH, HEIGHT = 800, 600
 PLAYER_SIZE = 30
 BULLET_SIZE = 5
+SPEED = 3          # 舊版 server 的 INIT 沒有帶 speed 時使用
+TICK_RATE = 60
+TEXT_CACHE_SIZE = 256
 
 class GameClient:
     def __init__(self, host, port):
@@ -26,7 +35,15 @@ class GameClient:
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.my_id = None
         self.running = True
-        self.game_data = {'players': {}, 'bullets': [], 'walls': []}
+        self.walls = []
+        self.decoder = StateDecoder()
+        # 接收執行緒 -> 繪圖迴圈的信箱：只放最新的一份，繪圖端直接讀取參考 (不需要鎖)
+        self.init_packet = None
+        self.inbox = None           # (tick, players, bullets, 到達時間)
+        self.last_snapshot = None   # 繪圖端上次處理過的 inbox
+        # 收到 INIT 後 (於繪圖迴圈) 建立：snapshot 插值與自己坦克的預測 (見 prediction.py)
+        self.snapshots = None
+        self.predictor = None
         
         # Pygame 初始化
         pygame.init()
@@ -35,6 +52,13 @@ class GameClient:
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont("Arial", 16)
 
+        # 繪圖快取：牆壁預先畫在背景上，文字依內容快取，每個畫面只更新有變動的區域
+        self.background = None
+        self.background_walls = None
+        self.info_cache = {}        # {(hp, score): Surface}
+        self.status_cache = (None, None)
+        self.dirty = []             # 上一個畫面畫過的區域
+
     def connect(self):
         try:
             self.sock.connect((self.host, self.port))
@@ -48,55 +72,139 @@ class GameClient:
             return False
 
     def receive_data(self):
-        buffer = ""
+        # 第一行是 JSON 的 INIT，之後是二進位 frame (見 protocol.py)
+        # 解碼都在這個執行緒做完，繪圖迴圈只拿最新的結果
+        buffer = bytearray()
+        got_init = False
         while self.running:
             try:
-                data = self.sock.recv(4096).decode()
+                data = self.sock.recv(65536)
                 if not data:
                     print("Disconnected from server")
                     self.running = False
                     break
                 
                 buffer += data
-                while "\n" in buffer:
-                    msg, buffer = buffer.split("\n", 1)
-                    try:
-                        packet = json.loads(msg)
-                        if packet['type'] == 'INIT':
-                            self.my_id = packet['id']
-                            print(f"My ID: {self.my_id}")
-                        elif packet['type'] == 'UPDATE':
-                            self.game_data = packet['data']
-                    except json.JSONDecodeError:
-                        pass
+                if not got_init:
+                    end = buffer.find(b"\n")
+                    if end < 0: continue
+                    packet = json.loads(buffer[:end])
+                    del buffer[:end + 1]
+                    if packet['type'] == 'INIT':
+                        self.init_packet = packet
+                    got_init = True
+
+                frames = split_frames(buffer)
+                # 同一批裡最後一個 keyframe 之前的 frame 都已被取代，不必解碼
+                start = 0
+                for i in range(len(frames) - 1, -1, -1):
+                    if frames[i][0] == FRAME_KEY:
+                        start = i
+                        break
+                updated = False
+                for kind, tick, body in frames[start:]:
+                    updated = self.decoder.apply(kind, tick, body) or updated
+                # 一批只發布一次 (delta 仍需逐一套用，但中間狀態不必複製)
+                if updated:
+                    self.publish()
             except Exception as e:
                 print(f"Network error: {e}")
                 self.running = False
                 break
 
-    def send_command(self, cmd, direction=None):
-        if not self.running: return
-        payload = {'cmd': cmd}
-        if direction:
-            payload['dir'] = direction
+    def publish(self):
+        """把 decoder 目前的狀態複製成一份新的 snapshot，整個替換信箱 (單一參考指定是 atomic 的)"""
+        dec = self.decoder
+        players = {pid: dict(p) for pid, p in dec.players.items()}
+        bullets = [(b['x'], b['y'], b['dx'], b['dy']) for b in dec.bullets.values()]
+        self.inbox = (dec.tick, players, bullets, time.monotonic())
+
+    def setup(self, packet):
+        self.walls = packet.get('walls', [])
+        speed = packet.get('speed', SPEED)
+        tick_rate = packet.get('tick_rate', TICK_RATE)
+        wall_grid = StaticGrid([(w['x'], w['y'], w['x'] + w['w'], w['y'] + w['h']) for w in self.walls])
+        self.snapshots = SnapshotBuffer(tick_rate, packet.get('send_rate', tick_rate), speed)
+        self.predictor = Predictor(wall_grid.hit, speed, PLAYER_SIZE)
+        self.my_id = packet['id']
+        print(f"My ID: {self.my_id}")
+
+    def poll_snapshot(self):
+        """繪圖迴圈呼叫：取出信箱裡最新的 snapshot，存入插值緩衝並校正自己坦克的預測位置"""
+        if self.predictor is None:
+            if self.init_packet is None: return
+            self.setup(self.init_packet)
+        snap = self.inbox
+        if snap is None or snap is self.last_snapshot: return
+        self.last_snapshot = snap
+        tick, players, bullets, arrived = snap
+        self.snapshots.push(tick, players, bullets, arrived)
+        me = players.get(self.my_id)
+        if me is not None:
+            self.predictor.reconcile(me['x'], me['y'], me['dir'], me['ack'])
+
+    def send_input(self, mask):
+        """每個畫面送一次按鍵狀態 (4 bytes，見 protocol.py)，同時在本地先套用"""
+        if not self.running or self.predictor is None: return
+        seq = self.predictor.input(mask)
         try:
-            self.sock.sendall((json.dumps(payload) + "\n").encode())
+            self.sock.sendall(encode_input(seq, mask))
         except:
             self.running = False
 
+    def render_state(self):
+        """其他坦克用插值後的位置，自己的坦克用預測位置"""
+        if self.snapshots is None: return {}, []
+        players, bullets = self.snapshots.sample(time.monotonic())
+        me = players.get(self.my_id)
+        if me is not None and self.predictor.state is not None:
+            me = players[self.my_id] = dict(me)
+            me['x'], me['y'], me['dir'] = self.predictor.state
+        return players, bullets
+
+    def build_background(self):
+        """靜態的牆壁只畫一次"""
+        background = pygame.Surface((WIDTH, HEIGHT)).convert()
+        background.fill(BLACK)
+        for w in self.walls:
+            pygame.draw.rect(background, GRAY, (w['x'], w['y'], w['w'], w['h']))
+        self.background_walls = self.walls
+        return background
+
+    def info_surface(self, hp, score):
+        surf = self.info_cache.get((hp, score))
+        if surf is None:
+            if len(self.info_cache) >= TEXT_CACHE_SIZE: self.info_cache.clear()
+            surf = self.info_cache[(hp, score)] = self.font.render(f"HP:{hp} S:{score}", True, WHITE)
+        return surf
+
+    def status_surface(self, status):
+        text, surf = self.status_cache
+        if text != status:
+            surf = self.font.render(status, True, WHITE)
+            self.status_cache = (status, surf)
+        return surf
+
     def draw(self):
-        self.screen.fill(BLACK)
-        
-        # 畫牆壁
-        for w in self.game_data.get('walls', []):
-            pygame.draw.rect(self.screen, GRAY, (w['x'], w['y'], w['w'], w['h']))
-            
+        players, bullets = self.render_state()
+        screen = self.screen
+
+        # 牆壁在背景上；INIT 帶來新的牆壁時重畫整個畫面
+        full = self.background is None or self.background_walls is not self.walls
+        if full:
+            self.background = self.build_background()
+            screen.blit(self.background, (0, 0))
+        else:
+            # 用背景蓋掉上一個畫面畫的東西
+            for rect in self.dirty:
+                screen.blit(self.background, rect, rect)
+        drawn = []
+
         # 畫坦克
-        players = self.game_data.get('players', {})
         for pid, p in players.items():
             color = GREEN if pid == self.my_id else RED
             rect = (p['x'], p['y'], PLAYER_SIZE, PLAYER_SIZE)
-            pygame.draw.rect(self.screen, color, rect)
+            drawn.append(pygame.draw.rect(screen, color, rect))
             
             # 畫砲管指示方向
             center_x = p['x'] + PLAYER_SIZE // 2
@@ -106,16 +214,14 @@ class GameClient:
             elif p['dir'] == 'DOWN': end_y += 20
             elif p['dir'] == 'LEFT': end_x -= 20
             elif p['dir'] == 'RIGHT': end_x += 20
-            pygame.draw.line(self.screen, WHITE, (center_x, center_y), (end_x, end_y), 3)
+            drawn.append(pygame.draw.line(screen, WHITE, (center_x, center_y), (end_x, end_y), 3))
 
             # 畫血量與分數
-            info_text = f"HP:{p['hp']} S:{p['score']}"
-            text_surf = self.font.render(info_text, True, WHITE)
-            self.screen.blit(text_surf, (p['x'], p['y'] - 20))
+            drawn.append(screen.blit(self.info_surface(p['hp'], p['score']), (p['x'], p['y'] - 20)))
 
         # 畫子彈
-        for b in self.game_data.get('bullets', []):
-            pygame.draw.rect(self.screen, YELLOW, (b['x'], b['y'], BULLET_SIZE, BULLET_SIZE))
+        for b in bullets:
+            drawn.append(pygame.draw.rect(screen, YELLOW, (b['x'], b['y'], BULLET_SIZE, BULLET_SIZE)))
 
         # UI 資訊
         if self.my_id:
@@ -123,33 +229,41 @@ class GameClient:
         else:
             status = "Connecting..."
         
-        status_surf = self.font.render(status, True, WHITE)
-        self.screen.blit(status_surf, (10, 10))
+        drawn.append(screen.blit(self.status_surface(status), (10, 10)))
 
-        pygame.display.flip()
+        # 只更新這個畫面與上一個畫面畫過的區域
+        if full:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty + drawn)
+        self.dirty = drawn
 
     def run(self):
         if not self.connect():
             return
 
         while self.running:
+            # 每個畫面只處理一次接收執行緒發布的最新狀態
+            self.poll_snapshot()
+
+            mask = 0
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_SPACE:
-                        self.send_command('SHOOT')
+                        mask |= INPUT_SHOOT
 
             # 持續按鍵移動
             keys = pygame.key.get_pressed()
-            if keys[pygame.K_UP] or keys[pygame.K_w]:
-                self.send_command('MOVE', 'UP')
-            elif keys[pygame.K_DOWN] or keys[pygame.K_s]:
-                self.send_command('MOVE', 'DOWN')
-            elif keys[pygame.K_LEFT] or keys[pygame.K_a]:
-                self.send_command('MOVE', 'LEFT')
-            elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-                self.send_command('MOVE', 'RIGHT')
+            if keys[pygame.K_UP] or keys[pygame.K_w]: mask |= INPUT_UP
+            if keys[pygame.K_DOWN] or keys[pygame.K_s]: mask |= INPUT_DOWN
+            if keys[pygame.K_LEFT] or keys[pygame.K_a]: mask |= INPUT_LEFT
+            if keys[pygame.K_RIGHT] or keys[pygame.K_d]: mask |= INPUT_RIGHT
+
+            # 沒按任何鍵就不送 (server 每 tick 套用一個輸入)
+            if mask:
+                self.send_input(mask)
 
             self.draw()
             self.clock.tick(60)
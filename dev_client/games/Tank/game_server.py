@@ -5,6 +5,14 @@ import json
 import time
 import random
 import uuid
+from collections import deque
+
+from protocol import StateEncoder, split_inputs, INPUT_SHOOT
+from prediction import move_tank
+from spatial_grid import StaticGrid
+from bullets import make_bullets
+from tick_scheduler import TickScheduler
+from client_writer import ClientWriter
 
 # --- 遊戲設定 ---
 WIDTH, HEIGHT = 800, 600
@@ -13,6 +21,10 @@ BULLET_SIZE = 5
 SPEED = 3
 BULLET_SPEED = 7
 RELOAD_TIME = 0.5  # 秒
+TICK_RATE = 60     # 每秒 tick 數
+SEND_RATE = 20     # 每秒送出幾次狀態 (client 端插值補足 60 FPS，見 prediction.py)
+STATS_INTERVAL = 10.0  # 每隔幾秒印一次 tick 統計
+MAX_QUEUED_INPUTS = 8  # 每位玩家最多排隊的輸入數 (client 送得比 tick 快時丟掉最舊的)
 
 # 全域旗標，用來控制伺服器是否繼續運行
 server_running = True
@@ -21,9 +33,16 @@ server_running = True
 class GameState:
     def __init__(self):
         self.players = {}  # {player_id: {x, y, dir, color, score, hp}}
-        self.bullets = []  # [{x, y, dx, dy, owner_id}]
+        self.inputs = {}   # {player_id: deque[(序號, bitmask)]}，每 tick 各取一個套用
         self.walls = self.generate_symmetric_map()
+        # broad phase：牆壁格網只建一次 (坦克移動與沒有 numpy 時的子彈判定使用)
+        self.wall_grid = StaticGrid([(w['x'], w['y'], w['x'] + w['w'], w['y'] + w['h']) for w in self.walls])
+        # 子彈 (見 bullets.py)：有 numpy 時用向量化的 structure-of-arrays
+        self.bullets = make_bullets(self.walls, self.wall_grid, WIDTH, HEIGHT, BULLET_SIZE, PLAYER_SIZE)
         self.lock = threading.Lock()
+        self.tick = 0
+        self.next_bullet_id = 0
+        self.encoder = StateEncoder()
 
     def generate_symmetric_map(self):
         """生成簡單的中心對稱地圖 (X軸與Y軸對稱)"""
@@ -63,12 +82,8 @@ class GameState:
 
     def check_collision(self, rect):
         """檢查一個矩形是否與任何牆壁相撞"""
-        rx, ry, rw, rh = rect['x'], rect['y'], rect['w'], rect['h']
-        for w in self.walls:
-            if (rx < w['x'] + w['w'] and rx + rw > w['x'] and
-                ry < w['y'] + w['h'] and ry + rh > w['y']):
-                return True
-        return False
+        rx, ry = rect['x'], rect['y']
+        return self.wall_grid.hit(rx, ry, rx + rect['w'], ry + rect['h'])
 
     def get_safe_spawn_pos(self):
         """尋找一個不與牆壁重疊的安全生成點"""
@@ -91,155 +106,154 @@ class GameState:
                 'dir': 'UP',
                 'hp': 3,
                 'score': 0,
+                'ack': 0,  # 最後套用的輸入序號
                 'last_shot': 0
             }
+            self.inputs[player_id] = deque(maxlen=MAX_QUEUED_INPUTS)
 
     def remove_player(self, player_id):
         with self.lock:
             if player_id in self.players:
                 del self.players[player_id]
+            self.inputs.pop(player_id, None)
 
-    def check_player_hit(self, bullet_rect, owner_id):
-        """檢查子彈是否擊中玩家"""
-        bx, by, bw, bh = bullet_rect['x'], bullet_rect['y'], bullet_rect['w'], bullet_rect['h']
-        hit_pid = None
-        
-        for pid, p in self.players.items():
-            if pid == owner_id: continue # 不打自己
-            if (bx < p['x'] + PLAYER_SIZE and bx + bw > p['x'] and
-                by < p['y'] + PLAYER_SIZE and by + bh > p['y']):
-                p['hp'] -= 1
-                if p['hp'] <= 0:
-                    # 重生邏輯：使用安全生成函數
-                    p['hp'] = 3
-                    new_x, new_y = self.get_safe_spawn_pos()
-                    p['x'] = new_x
-                    p['y'] = new_y
-                hit_pid = pid
-                break
-        return hit_pid
+    def bullet_hit(self, hit_pid, owner_id):
+        """子彈擊中玩家：扣血、加分；回傳該玩家是否重生 (位置改變)"""
+        if owner_id in self.players:
+            self.players[owner_id]['score'] += 1
+        p = self.players[hit_pid]
+        p['hp'] -= 1
+        if p['hp'] > 0: return False
+        # 重生邏輯：使用安全生成函數
+        p['hp'] = 3
+        p['x'], p['y'] = self.get_safe_spawn_pos()
+        return True
 
     def update(self):
+        # 整個 tick 只拿一次鎖：先套用排隊的輸入，再推進子彈
         with self.lock:
-            # 更新子彈
-            for b in self.bullets[:]:
-                b['x'] += b['dx']
-                b['y'] += b['dy']
-                
-                b_rect = {'x': b['x'], 'y': b['y'], 'w': BULLET_SIZE, 'h': BULLET_SIZE}
-                
-                # 子彈撞牆
-                if self.check_collision(b_rect) or \
-                   b['x'] < 0 or b['x'] > WIDTH or b['y'] < 0 or b['y'] > HEIGHT:
-                    self.bullets.remove(b)
-                    continue
-                
-                # 子彈撞人
-                hit_pid = self.check_player_hit(b_rect, b['owner_id'])
-                if hit_pid:
-                    self.bullets.remove(b)
-                    # 增加分數
-                    if b['owner_id'] in self.players:
-                        self.players[b['owner_id']]['score'] += 1
+            self.tick += 1
+            for pid, queue in self.inputs.items():
+                if queue:
+                    seq, mask = queue.popleft()
+                    self.apply_input(pid, mask, seq)
+            self.bullets.step(self)
 
-    def handle_input(self, player_id, data):
-        with self.lock:
-            if player_id not in self.players: return
-            p = self.players[player_id]
-            cmd = data.get('cmd')
-            
-            new_x, new_y = p['x'], p['y']
-            
-            if cmd == 'MOVE':
-                direction = data.get('dir')
-                p['dir'] = direction
-                if direction == 'UP': new_y -= SPEED
-                elif direction == 'DOWN': new_y += SPEED
-                elif direction == 'LEFT': new_x -= SPEED
-                elif direction == 'RIGHT': new_x += SPEED
-                
-                # 碰撞檢測
-                if not self.check_collision({'x': new_x, 'y': new_y, 'w': PLAYER_SIZE, 'h': PLAYER_SIZE}):
-                    p['x'], p['y'] = new_x, new_y
+    def queue_input(self, player_id, seq, mask):
+        """接收執行緒呼叫：只放進佇列 (deque.append 本身是 thread-safe)，不拿鎖"""
+        queue = self.inputs.get(player_id)
+        if queue is not None:
+            queue.append((seq, mask))
 
-            elif cmd == 'SHOOT':
-                now = time.time()
-                if now - p['last_shot'] > RELOAD_TIME:
-                    p['last_shot'] = now
-                    dx, dy = 0, 0
-                    if p['dir'] == 'UP': dy = -BULLET_SPEED
-                    elif p['dir'] == 'DOWN': dy = BULLET_SPEED
-                    elif p['dir'] == 'LEFT': dx = -BULLET_SPEED
-                    elif p['dir'] == 'RIGHT': dx = BULLET_SPEED
-                    
-                    # 子彈從坦克中心發射
-                    self.bullets.append({
-                        'x': p['x'] + PLAYER_SIZE//2 - BULLET_SIZE//2,
-                        'y': p['y'] + PLAYER_SIZE//2 - BULLET_SIZE//2,
-                        'dx': dx, 'dy': dy,
-                        'owner_id': player_id
-                    })
+    def apply_input(self, player_id, mask, seq=None):
+        """套用一個畫面的按鍵 bitmask (呼叫端需持有 lock)；seq 會回報給 client 做預測校正"""
+        if player_id not in self.players: return
+        p = self.players[player_id]
+        if seq is not None:
+            p['ack'] = seq
 
-    def get_snapshot(self):
+        # 移動與碰撞檢測 (與 client 預測共用同一個函式)
+        p['x'], p['y'], p['dir'] = move_tank(p['x'], p['y'], p['dir'], mask,
+                                             self.wall_grid.hit, SPEED, PLAYER_SIZE)
+
+        if mask & INPUT_SHOOT:
+            now = time.time()
+            if now - p['last_shot'] > RELOAD_TIME:
+                p['last_shot'] = now
+                dx, dy = 0, 0
+                if p['dir'] == 'UP': dy = -BULLET_SPEED
+                elif p['dir'] == 'DOWN': dy = BULLET_SPEED
+                elif p['dir'] == 'LEFT': dx = -BULLET_SPEED
+                elif p['dir'] == 'RIGHT': dx = BULLET_SPEED
+                
+                # 子彈從坦克中心發射
+                self.bullets.add(self.next_bullet_id,
+                                 p['x'] + PLAYER_SIZE//2 - BULLET_SIZE//2,
+                                 p['y'] + PLAYER_SIZE//2 - BULLET_SIZE//2,
+                                 dx, dy, player_id)
+                self.next_bullet_id = (self.next_bullet_id + 1) & 0xFFFF
+
+    def encode_frame(self):
+        """編碼目前 tick 的狀態 (牆壁已在 INIT 送過，不再重送)"""
         with self.lock:
-            return {
-                'players': self.players,
-                'bullets': self.bullets,
-                'walls': self.walls
-            }
+            return self.encoder.encode(self.tick, self.players, self.bullets.records())
+
+    def encode_keyframe(self):
+        """同一個 tick 的完整狀態 (只有廣播執行緒會呼叫，與 encode_frame 依序執行)"""
+        return self.encoder.encode_key()
 
 game_state = GameState()
 
 # 更新 handle_client 以接收 clients 列表，以便在斷線時移除
-def handle_client(conn, addr, clients):
+def handle_client(conn, addr, clients, writer, rates):
     player_id = str(uuid.uuid4())[:8]
     print(f"[GameServer] Player {player_id} connected from {addr}")
     game_state.add_player(player_id)
     
-    # 傳送 ID 給客戶端
+    # 傳送 ID 與靜態的牆壁給客戶端，之後的狀態都是二進位 frame (見 protocol.py)
+    # writer 一開始就需要 keyframe，廣播時會單獨補給這個 client
     try:
-        conn.sendall((json.dumps({"type": "INIT", "id": player_id}) + "\n").encode())
+        init = {"type": "INIT", "id": player_id, "walls": game_state.walls, "speed": SPEED, **rates}
+        writer.start((json.dumps(init) + "\n").encode())
 
-        buffer = ""
+        # 輸入只放進佇列，由廣播執行緒每 tick 套用 (不在這裡搶 game_state.lock)
+        buffer = bytearray()
         while True:
-            data = conn.recv(1024).decode()
+            data = conn.recv(1024)
             if not data: break
             
             buffer += data
-            while "\n" in buffer:
-                msg, buffer = buffer.split("\n", 1)
-                try:
-                    cmd_data = json.loads(msg)
-                    game_state.handle_input(player_id, cmd_data)
-                except json.JSONDecodeError:
-                    pass
+            for seq, mask in split_inputs(buffer):
+                game_state.queue_input(player_id, seq, mask)
     except Exception as e:
         print(f"Error with client {player_id}: {e}")
     finally:
         print(f"[GameServer] Player {player_id} disconnected")
         game_state.remove_player(player_id)
         # 從連線列表中移除自己
-        if conn in clients:
-            clients.remove(conn)
+        if writer in clients:
+            clients.remove(writer)
+        writer.close()
         conn.close()
 
-def broadcast_state(clients):
-    global server_running
-    while server_running:
-        time.sleep(0.016) # ~60 FPS
-        game_state.update()
-        snapshot = game_state.get_snapshot()
-        msg = (json.dumps({"type": "UPDATE", "data": snapshot}) + "\n").encode()
+def send_interval(tick_rate, send_rate):
+    """每幾個 tick 送一次狀態"""
+    return max(1, round(tick_rate / send_rate))
+
+def broadcast_state(clients, tick_rate=TICK_RATE, send_rate=SEND_RATE):
+    # 模擬每 tick 都跑，狀態每 send_every 個 tick 才送一次
+    send_every = send_interval(tick_rate, send_rate)
+
+    def tick(stats):
+        with stats.measure("update"):
+            game_state.update()
+        if game_state.tick % send_every: return
+        with stats.measure("serialize"):
+            msg = game_state.encode_frame()
         
-        # 複製一份列表進行遍歷，避免迭代時被修改
-        for c in clients[:]:
-            try:
-                c.sendall(msg)
-            except:
-                if c in clients:
-                    clients.remove(c)
+        with stats.measure("send"):
+            # 只放進各 client 的信箱，實際送出由 ClientWriter 執行緒負責
+            keyframe = None
+            now = time.monotonic()
+            # 複製一份列表進行遍歷，避免迭代時被修改
+            for w in clients[:]:
+                if w.closed: continue
+                if w.stalled(now):
+                    # 卡住太久的 client 直接斷線，handle_client 會負責清理
+                    print(f"[GameServer] Client stalled (dropped {w.dropped} frames), disconnecting")
+                    w.close()
+                    continue
+                if w.needs_key:
+                    if keyframe is None: keyframe = game_state.encode_keyframe()
+                    w.offer(keyframe, True)
+                else:
+                    w.offer(msg, False)
+
+    # 固定步長：以 monotonic clock 排程，工作量變大也不會讓 tick rate 漂移
+    scheduler = TickScheduler(rate=tick_rate, log_interval=STATS_INTERVAL, name="GameServer Tick")
+    scheduler.run(tick, lambda: server_running)
 
-def run_game_server(host, port):
+def run_game_server(host, port, tick_rate=TICK_RATE, send_rate=SEND_RATE):
     global server_running
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.bind((host, port))
@@ -249,21 +263,25 @@ def run_game_server(host, port):
     server.settimeout(1.0)
     
     print(f"[GameServer] Running on {host}:{port}")
+    # numpy 是選用套件 (見 requirements.txt)，沒有安裝時用純 Python 版本
+    print(f"[GameServer] Bullet simulation: {type(game_state.bullets).__name__}")
     
     clients = []
     ever_connected = False # 紀錄是否曾經有玩家連接過
     
     # 啟動廣播執行緒
-    threading.Thread(target=broadcast_state, args=(clients,), daemon=True).start()
+    threading.Thread(target=broadcast_state, args=(clients, tick_rate, send_rate), daemon=True).start()
+    rates = {"tick_rate": tick_rate, "send_rate": tick_rate / send_interval(tick_rate, send_rate)}
 
     try:
         while server_running:
             try:
                 conn, addr = server.accept()
-                clients.append(conn)
+                writer = ClientWriter(conn, send_rate=rates["send_rate"])
+                clients.append(writer)
                 ever_connected = True # 有人連進來了，標記為 True
                 # 將 clients 列表傳給執行緒，讓它在結束時能將自己移除
-                threading.Thread(target=handle_client, args=(conn, addr, clients), daemon=True).start()
+                threading.Thread(target=handle_client, args=(conn, addr, clients, writer, rates), daemon=True).start()
             except socket.timeout:
                 # 沒人連線，繼續迴圈檢查其他條件
                 pass
@@ -284,5 +302,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--host', type=str, default='127.0.0.1')
     parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE)
+    parser.add_argument('--send-rate', type=int, default=SEND_RATE)
     args = parser.parse_args()
-    run_game_server(args.host, args.port)
\ No newline at end of file
+    run_game_server(args.host, args.port, args.tick_rate, args.send_rate)
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Client 端的平滑顯示：snapshot 插值與自己坦克的預測 / 校正
+
+server 只以 send rate (預設 20 Hz) 送出狀態，client 仍以 60 FPS 繪圖：
+SnapshotBuffer：保留最近的 snapshot，以「估計的 server tick - 延遲」為顯示時間，
+                在前後兩個 snapshot 之間對其他坦克做線性插值；子彈是等速直線，直接依 tick 推算。
+Predictor     ：自己的輸入先在本地套用 (不用等 server 往返)，收到帶 ack 的狀態後
+                以 server 位置為準，重播還沒被確認的輸入。
+
+move_tank 是 server 與 client 共用的移動規則，兩邊算出的位置才會完全一致。
+"""
+from collections import deque
+
+from protocol import INPUT_DIRS, SEQ_MASK
+
+DIR_STEPS = {'UP': (0, -1), 'DOWN': (0, 1), 'LEFT': (-1, 0), 'RIGHT': (1, 0)}
+
+INTERP_SNAPSHOTS = 2     # 顯示時間落後最新 snapshot 幾個送出間隔
+CLOCK_SMOOTHING = 0.05   # 較晚到的 snapshot 把時鐘往回拉的比例
+MAX_PENDING = 120        # 最多保留幾個未確認的輸入
+
+def move_tank(x, y, direction, mask, wall_hit, speed, size):
+    """套用一個畫面的按鍵：回傳新的 (x, y, dir)；撞牆時不移動但仍轉向"""
+    for bit, d in INPUT_DIRS:
+        if mask & bit:
+            sx, sy = DIR_STEPS[d]
+            nx, ny = x + sx * speed, y + sy * speed
+            if not wall_hit(nx, ny, nx + size, ny + size):
+                x, y = nx, ny
+            return x, y, d
+    return x, y, direction
+
+def seq_reached(seq, ack):
+    """seq 是否已被 ack 確認 (16-bit 序號會繞回)"""
+    return ((ack - seq) & SEQ_MASK) < 0x8000
+
+class SnapshotBuffer:
+    def __init__(self, tick_rate, send_rate, max_step, size=32):
+        self.tick_rate = tick_rate
+        self.delay = INTERP_SNAPSHOTS * tick_rate / send_rate  # 以 tick 為單位
+        self.max_step = max_step    # 每 tick 最大移動量，超過就視為重生而不插值
+        self.snapshots = deque(maxlen=size)  # [(tick, players, bullets)]
+        self.offset = None          # 估計的 server tick - 本地時間 * tick_rate
+
+    def push(self, tick, players, bullets, now):
+        """players: {player_id: dict}，bullets: [(x, y, dx, dy)] (皆為該 tick 的副本)"""
+        snaps = self.snapshots
+        if snaps and tick <= snaps[-1][0]:
+            if tick < snaps[-1][0]: return
+            snaps.pop()  # 同一個 tick 的 keyframe 取代原本的 frame
+        snaps.append((tick, players, bullets))
+        # 以最早到的 snapshot 對時；晚到的只慢慢往回修正，避免畫面來回跳
+        est = tick - now * self.tick_rate
+        if self.offset is None or est > self.offset:
+            self.offset = est
+        else:
+            self.offset += (est - self.offset) * CLOCK_SMOOTHING
+
+    def sample(self, now):
+        """回傳顯示時間的 (players, bullets)"""
+        snaps = self.snapshots
+        if not snaps: return {}, []
+        t = now * self.tick_rate + self.offset - self.delay
+
+        older = newer = snaps[0]
+        for snap in snaps:
+            newer = snap
+            if snap[0] >= t: break
+            older = snap
+        t = max(t, snaps[0][0])
+
+        # 子彈以較新的 snapshot 為準往前 / 往後推算 (出界的幾乎不可見，不另外處理)
+        dt = t - newer[0]
+        bullets = [{'x': x + dx * dt, 'y': y + dy * dt} for x, y, dx, dy in newer[2]]
+
+        if older is newer or newer[0] <= older[0]:
+            return newer[1], bullets
+        span = newer[0] - older[0]
+        a = min(max((t - older[0]) / span, 0.0), 1.0)
+        players = {}
+        for pid, p1 in newer[1].items():
+            p0 = older[1].get(pid)
+            if p0 is None or abs(p1['x'] - p0['x']) + abs(p1['y'] - p0['y']) > self.max_step * span:
+                players[pid] = p1
+                continue
+            p = dict(p0 if a < 0.5 else p1)
+            p['x'] = p0['x'] + (p1['x'] - p0['x']) * a
+            p['y'] = p0['y'] + (p1['y'] - p0['y']) * a
+            players[pid] = p
+        return players, bullets
+
+class Predictor:
+    def __init__(self, wall_hit, speed, size):
+        self.wall_hit = wall_hit
+        self.speed, self.size = speed, size
+        self.seq = 0
+        self.pending = deque(maxlen=MAX_PENDING)  # [(seq, mask)] 尚未被 server 確認
+        self.state = None   # 預測的 (x, y, dir)；收到第一個 snapshot 前為 None
+
+    def input(self, mask):
+        """記錄並在本地套用一個輸入，回傳要送給 server 的序號"""
+        self.seq = (self.seq + 1) & SEQ_MASK
+        self.pending.append((self.seq, mask))
+        if self.state is not None:
+            self.state = move_tank(*self.state, mask, self.wall_hit, self.speed, self.size)
+        return self.seq
+
+    def reconcile(self, x, y, direction, ack):
+        """以 server 的狀態為準，重播 ack 之後的輸入"""
+        pending = self.pending
+        while pending and seq_reached(pending[0][0], ack):
+            pending.popleft()
+        state = (x, y, direction)
+        for _, mask in pending:
+            state = move_tank(*state, mask, self.wall_hit, self.speed, self.size)
+        self.state = state
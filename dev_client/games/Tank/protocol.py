@@ -0,0 +1,250 @@
+"""
+Tank 狀態同步協定 (server 與 client 共用)
+
+連線後 server 先送一行 JSON 的 INIT (玩家 ID、牆壁等靜態資料)，
+之後都是二進位 frame：
+    header: 長度(4) + 種類(1) + tick(4)
+    KEY   : 完整的玩家與子彈列表
+    DELTA : 只有變動的玩家、離開的玩家、新子彈、消失的子彈
+子彈是等速直線移動，client 依 tick 差自行推進，因此 DELTA 只需送出生成與消失。
+
+Client -> server 的輸入每個畫面一則 4 bytes：0x01 + 序號 + 按鍵 bitmask (見 INPUT_*)。
+server 在每位玩家的資料裡帶回最後套用的輸入序號 (ack)，client 據此做預測校正 (見 prediction.py)。
+舊版的 JSON 行 ({"cmd": "MOVE", "dir": ...} / {"cmd": "SHOOT"}) 仍可解析。
+"""
+import json
+import struct
+
+FRAME_HEADER = struct.Struct('>IBI')     # body 長度, 種類, tick
+PLAYER = struct.Struct('>B8shhBBHH')     # slot, id, x, y, dir, hp, score, ack
+BULLET = struct.Struct('>HhhbbB')        # bullet id, x, y, dx, dy, owner slot
+COUNT8 = struct.Struct('>B')
+COUNT16 = struct.Struct('>H')
+
+FRAME_KEY = 1
+FRAME_DELTA = 2
+
+# 每隔多少 tick 送一次完整狀態，讓漏掉或解錯的 client 能重新同步
+KEYFRAME_INTERVAL = 60
+
+DIRS = ('UP', 'DOWN', 'LEFT', 'RIGHT')
+DIR_CODES = {d: i for i, d in enumerate(DIRS)}
+MAX_SLOTS = 256
+
+# --- client 輸入 ---
+MSG_INPUT = 0x01
+INPUT = struct.Struct('>BHB')            # 訊息種類, 序號, bitmask
+INPUT_UP, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_SHOOT = 1, 2, 4, 8, 16
+# 同時按多個方向時的優先順序 (與舊版 client 的 if/elif 相同)
+INPUT_DIRS = ((INPUT_UP, 'UP'), (INPUT_DOWN, 'DOWN'), (INPUT_LEFT, 'LEFT'), (INPUT_RIGHT, 'RIGHT'))
+DIR_INPUTS = {d: bit for bit, d in INPUT_DIRS}
+
+SEQ_MASK = 0xFFFF
+
+def encode_input(seq, mask):
+    return INPUT.pack(MSG_INPUT, seq & SEQ_MASK, mask)
+
+def input_from_command(data):
+    """把舊版 JSON 指令轉成 bitmask (無法辨識時回傳 0)"""
+    cmd = data.get('cmd')
+    if cmd == 'MOVE': return DIR_INPUTS.get(data.get('dir'), 0)
+    if cmd == 'SHOOT': return INPUT_SHOOT
+    return 0
+
+def split_inputs(buf):
+    """
+    從 bytearray 取出所有完整的輸入訊息，回傳 [(序號, bitmask)] 並移除已處理的部分。
+    舊版 JSON 指令沒有序號，以 None 表示。
+    """
+    masks = []
+    pos = 0
+    while pos < len(buf):
+        if buf[pos] == MSG_INPUT:
+            if len(buf) - pos < INPUT.size: break
+            _, seq, mask = INPUT.unpack_from(buf, pos)
+            masks.append((seq, mask))
+            pos += INPUT.size
+            continue
+        # 舊版 JSON 行
+        end = buf.find(b"\n", pos)
+        if end < 0: break
+        try:
+            mask = input_from_command(json.loads(buf[pos:end]))
+            if mask: masks.append((None, mask))
+        except (ValueError, AttributeError):
+            pass
+        pos = end + 1
+    del buf[:pos]
+    return masks
+
+class StateEncoder:
+    """Server 端：把 GameState 編成 KEY / DELTA frame (所有 client 共用同一份 bytes)"""
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.slots = {}          # {player_id: slot}
+        self.prefix = {}         # {player_id: (slot, id bytes)}
+        self.free_slots = list(range(MAX_SLOTS - 1, -1, -1))
+        self.last_players = {}   # {player_id: ((x, y, dir, hp, score, ack), packed bytes)}
+        self.last_bullets = set()
+        self.last_records = []   # 最近一次 encode 的子彈
+        self.last_tick = None
+        self.force_key = True
+        self.last_key_tick = None
+
+    def request_keyframe(self):
+        """下一個共用 frame 改送完整狀態"""
+        self.force_key = True
+
+    def _key_body(self, current, bullets):
+        parts = [COUNT8.pack(len(current))]
+        parts.extend(packed for _, packed in current.values())
+        parts.append(COUNT16.pack(len(bullets)))
+        parts.extend(self._pack_bullet(b) for b in bullets)
+        return b''.join(parts)
+
+    def encode_key(self):
+        """
+        最近一次 encode 那個 tick 的 keyframe，不影響共用的 delta 串流。
+        給剛加入或掉了 frame 的 client 使用：收到它之後，下一個共用 delta 就能直接套用。
+        """
+        body = self._key_body(self.last_players, self.last_records)
+        return FRAME_HEADER.pack(len(body), FRAME_KEY, self.last_tick) + body
+
+    def _pack_player(self, pid, state):
+        prefix = self.prefix.get(pid)
+        if prefix is None:
+            slot = self.slots[pid] = self.free_slots.pop()
+            prefix = self.prefix[pid] = (slot, pid.encode()[:8])
+        x, y, d, hp, score, ack = state
+        if not (0 <= hp <= 255 and 0 <= score <= 0xFFFF):
+            hp, score = max(0, min(hp, 255)), max(0, min(score, 0xFFFF))
+        return PLAYER.pack(prefix[0], prefix[1], int(x), int(y), DIR_CODES.get(d, 0), hp, score, ack & SEQ_MASK)
+
+    def _pack_bullet(self, rec):
+        bid, x, y, dx, dy, owner_id = rec
+        return BULLET.pack(bid, int(x), int(y), dx, dy, self.slots.get(owner_id, 0))
+
+    def encode(self, tick, players, bullets):
+        """players: {player_id: dict}，bullets: [(id, x, y, dx, dy, owner_id)]；回傳一個完整 frame"""
+        last = self.last_players
+        current = {}
+        changed = []
+        for pid, p in players.items():
+            state = (p['x'], p['y'], p['dir'], p['hp'], p['score'], p.get('ack', 0))
+            prev = last.get(pid)
+            if prev is not None and prev[0] == state:
+                current[pid] = prev
+            else:
+                current[pid] = (state, self._pack_player(pid, state))
+                changed.append(current[pid][1])
+        left = [pid for pid in last if pid not in current]
+
+        is_key = (self.force_key or self.last_key_tick is None
+                  or tick - self.last_key_tick >= self.keyframe_interval)
+        parts = []
+        if is_key:
+            parts.append(self._key_body(current, bullets))
+            bullet_ids = {b[0] for b in bullets}
+            self.force_key = False
+            self.last_key_tick = tick
+        else:
+            parts.append(COUNT8.pack(len(changed)))
+            parts.extend(changed)
+            parts.append(COUNT8.pack(len(left)))
+            parts.extend(COUNT8.pack(self.slots[pid]) for pid in left)
+            last_bullets = self.last_bullets
+            bullet_ids = set()
+            new_bullets = []
+            for b in bullets:
+                bid = b[0]
+                bullet_ids.add(bid)
+                if bid not in last_bullets: new_bullets.append(self._pack_bullet(b))
+            parts.append(COUNT16.pack(len(new_bullets)))
+            parts.extend(new_bullets)
+            gone = last_bullets - bullet_ids
+            parts.append(COUNT16.pack(len(gone)))
+            parts.extend(COUNT16.pack(bid) for bid in gone)
+
+        for pid in left:
+            self.prefix.pop(pid, None)
+            self.free_slots.append(self.slots.pop(pid))
+        self.last_players = current
+        self.last_bullets = bullet_ids
+        self.last_records = bullets
+        self.last_tick = tick
+        body = b''.join(parts)
+        return FRAME_HEADER.pack(len(body), FRAME_KEY if is_key else FRAME_DELTA, tick) + body
+
+class StateDecoder:
+    """Client 端：套用 frame，維護與 server 相同格式的 players / bullets"""
+    def __init__(self):
+        self.players = {}   # {player_id: {x, y, dir, hp, score, ack}}
+        self.slots = {}     # {slot: player_id}
+        self.bullets = {}   # {bullet id: {x, y, dx, dy, owner_id}}
+        self.tick = None
+
+    def _read_players(self, body, pos, count):
+        for _ in range(count):
+            slot, raw_id, x, y, d, hp, score, ack = PLAYER.unpack_from(body, pos)
+            pos += PLAYER.size
+            pid = raw_id.rstrip(b'\0').decode()
+            old = self.slots.get(slot)
+            if old is not None and old != pid: self.players.pop(old, None)
+            self.slots[slot] = pid
+            self.players[pid] = {'x': x, 'y': y, 'dir': DIRS[d], 'hp': hp, 'score': score, 'ack': ack}
+        return pos
+
+    def _read_bullets(self, body, pos, count):
+        for _ in range(count):
+            bid, x, y, dx, dy, owner = BULLET.unpack_from(body, pos)
+            pos += BULLET.size
+            self.bullets[bid] = {'x': x, 'y': y, 'dx': dx, 'dy': dy, 'owner_id': self.slots.get(owner)}
+        return pos
+
+    def apply(self, kind, tick, body):
+        """套用一個 frame 的 body；還沒收到 keyframe 前的 delta 會被忽略。回傳是否有更新"""
+        if kind == FRAME_KEY:
+            self.players, self.slots, self.bullets = {}, {}, {}
+            pos = self._read_players(body, 1, body[0])
+            (n_bullets,) = COUNT16.unpack_from(body, pos)
+            self._read_bullets(body, pos + 2, n_bullets)
+            self.tick = tick
+            return True
+        if kind != FRAME_DELTA or self.tick is None: return False
+
+        # 先把既有子彈推進到這個 tick，再套用生成 / 消失
+        steps = tick - self.tick
+        if steps > 0:
+            for b in self.bullets.values():
+                b['x'] += b['dx'] * steps
+                b['y'] += b['dy'] * steps
+        self.tick = tick
+
+        pos = self._read_players(body, 1, body[0])
+        n_left = body[pos]
+        for slot in body[pos + 1:pos + 1 + n_left]:
+            pid = self.slots.pop(slot, None)
+            if pid is not None: self.players.pop(pid, None)
+        pos += 1 + n_left
+        (n_new,) = COUNT16.unpack_from(body, pos)
+        pos = self._read_bullets(body, pos + 2, n_new)
+        (n_gone,) = COUNT16.unpack_from(body, pos)
+        pos += 2
+        for _ in range(n_gone):
+            (bid,) = COUNT16.unpack_from(body, pos)
+            pos += 2
+            self.bullets.pop(bid, None)
+        return True
+
+def split_frames(buf):
+    """從 bytearray 取出所有完整的 frame，回傳 [(kind, tick, body)] 並移除已處理的部分"""
+    frames = []
+    pos = 0
+    while len(buf) - pos >= FRAME_HEADER.size:
+        size, kind, tick = FRAME_HEADER.unpack_from(buf, pos)
+        end = pos + FRAME_HEADER.size + size
+        if len(buf) < end: break
+        frames.append((kind, tick, bytes(buf[pos + FRAME_HEADER.size:end])))
+        pos = end
+    del buf[:pos]
+    return frames
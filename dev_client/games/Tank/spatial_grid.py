@@ -0,0 +1,96 @@
+"""
+均勻格網 (uniform grid) broad phase
+
+牆壁在建地圖時放進 StaticGrid 一次；玩家每 tick 重建 DynamicGrid，
+碰撞檢查只需看矩形所在的幾個格子，而不是掃過所有牆壁 / 玩家。
+矩形一律用 (x1, y1, x2, y2)，x2 = x + w、y2 = y + h。
+"""
+
+def _cell_range(x1, y1, x2, y2, cell):
+    # 右/下邊界剛好落在格線上時會多看一格，只影響候選數量，不影響結果
+    return int(x1 // cell), int(y1 // cell), int(x2 // cell), int(y2 // cell)
+
+class StaticGrid:
+    """不會移動的矩形 (牆壁)"""
+    def __init__(self, rects, cell=50):
+        self.cell = cell
+        self.cells = {}  # {(cx, cy): [rect]}
+        for rect in rects:
+            cx1, cy1, cx2, cy2 = _cell_range(*rect, cell)
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    self.cells.setdefault((cx, cy), []).append(rect)
+
+    def hit(self, x1, y1, x2, y2):
+        """(x1, y1, x2, y2) 是否與任何矩形重疊"""
+        cells = self.cells
+        cell = self.cell
+        cx1, cy1, cx2, cy2 = int(x1 // cell), int(y1 // cell), int(x2 // cell), int(y2 // cell)
+        if cx1 == cx2 and cy1 == cy2:
+            # 小物件 (子彈) 通常只落在一格
+            for r in cells.get((cx1, cy1), ()):
+                if x1 < r[2] and x2 > r[0] and y1 < r[3] and y2 > r[1]:
+                    return True
+            return False
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                for r in cells.get((cx, cy), ()):
+                    if x1 < r[2] and x2 > r[0] and y1 < r[3] and y2 > r[1]:
+                        return True
+        return False
+
+class DynamicGrid:
+    """會移動的物件 (玩家)；查詢結果依插入順序排序，與逐一掃描 dict 的結果相同"""
+    def __init__(self, cell=60):
+        self.cell = cell
+        self.cells = {}   # {(cx, cy): {key: order}}
+        self.where = {}   # {key: (rect, order, [cell keys])}
+        self.order = 0
+
+    def clear(self):
+        self.cells.clear()
+        self.where.clear()
+        self.order = 0
+
+    def insert(self, key, rect, order=None):
+        if order is None:
+            order = self.order
+            self.order += 1
+        cx1, cy1, cx2, cy2 = _cell_range(*rect, self.cell)
+        keys = [(cx, cy) for cx in range(cx1, cx2 + 1) for cy in range(cy1, cy2 + 1)]
+        for ck in keys:
+            self.cells.setdefault(ck, {})[key] = order
+        self.where[key] = (rect, order, keys)
+
+    def remove(self, key):
+        entry = self.where.pop(key, None)
+        if entry is None: return None
+        for ck in entry[2]:
+            bucket = self.cells[ck]
+            del bucket[key]
+            if not bucket: del self.cells[ck]
+        return entry[1]
+
+    def move(self, key, rect):
+        """更新位置但保留原本的順序"""
+        order = self.remove(key)
+        self.insert(key, rect, order)
+
+    def first_hit(self, x1, y1, x2, y2, exclude=None):
+        """回傳與矩形重疊、插入順序最前面的 key，沒有則回傳 None"""
+        best_key, best_order = None, None
+        where = self.where
+        cells = self.cells
+        cell = self.cell
+        cx1, cy1, cx2, cy2 = int(x1 // cell), int(y1 // cell), int(x2 // cell), int(y2 // cell)
+        if cx1 == cx2 and cy1 == cy2 and (cx1, cy1) not in cells: return None
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                bucket = cells.get((cx, cy))
+                if not bucket: continue
+                for key, order in bucket.items():
+                    if key == exclude or (best_order is not None and order >= best_order): continue
+                    r = where[key][0]
+                    if x1 < r[2] and x2 > r[0] and y1 < r[3] and y2 > r[1]:
+                        best_key, best_order = key, order
+        return best_key
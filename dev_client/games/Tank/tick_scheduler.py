@@ -0,0 +1,94 @@
+"""
+固定步長 (fixed timestep) 的 tick 排程器
+
+以 time.monotonic() 排定每個 tick 的理論時間，不受每 tick 工作量影響而漂移；
+落後時連續補跑 (最多 max_catchup 個)，落後太多就放棄積欠的 tick 並重新對時。
+每 tick 各階段的耗時、遲到與跳過的 tick 數會定期印成一行 log，方便估算一台主機能開幾個房間。
+"""
+import time
+from contextlib import contextmanager
+
+class TickStats:
+    """統計一段期間內的 tick 資料 (log 後歸零)"""
+    def __init__(self):
+        self.reset(time.monotonic())
+
+    def reset(self, now):
+        self.started = now
+        self.ticks = 0
+        self.late = 0       # 開始時間已超過原定時間一整個 tick
+        self.skipped = 0    # 落後太多而直接放棄的 tick
+        self.phases = {}    # {name: [總秒數, 最大秒數]}
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self.phases.get(name)
+            if entry is None:
+                self.phases[name] = [elapsed, elapsed]
+            else:
+                entry[0] += elapsed
+                if elapsed > entry[1]: entry[1] = elapsed
+
+    def snapshot(self, now=None):
+        """目前統計的 dict 版本 (各階段為平均/最大毫秒)"""
+        now = time.monotonic() if now is None else now
+        span = max(now - self.started, 1e-9)
+        ticks = max(self.ticks, 1)
+        return {
+            "rate": self.ticks / span, "ticks": self.ticks,
+            "late": self.late, "skipped": self.skipped,
+            "phases": {name: (total / ticks * 1000, peak * 1000) for name, (total, peak) in self.phases.items()},
+        }
+
+    def format(self, name, now=None):
+        snap = self.snapshot(now)
+        phases = " | ".join(f"{k} {avg:.2f}/{peak:.2f} ms" for k, (avg, peak) in snap["phases"].items())
+        return (f"[{name}] {snap['rate']:.1f} Hz | {phases} (avg/max) | "
+                f"late {snap['late']} | skipped {snap['skipped']}")
+
+class TickScheduler:
+    def __init__(self, rate=60, max_catchup=5, log_interval=10.0, name="Tick"):
+        self.rate = rate
+        self.dt = 1.0 / rate
+        self.max_catchup = max_catchup
+        self.log_interval = log_interval
+        self.name = name
+        self.stats = TickStats()
+        self.last_stats = None  # 上一個 log 區間的 snapshot
+
+    def run(self, step, should_run):
+        """
+        依固定頻率呼叫 step(stats)，直到 should_run() 回傳 False。
+        step 內可用 `with stats.measure("update"):` 記錄各階段耗時。
+        """
+        stats = self.stats
+        next_tick = time.monotonic()
+        stats.reset(next_tick)
+        while should_run():
+            now = time.monotonic()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+                continue
+
+            behind = int((now - next_tick) / self.dt)
+            if behind > self.max_catchup:
+                # 積欠太多 (例如主機被暫停)，放棄補跑，從現在重新對時
+                stats.skipped += behind
+                next_tick = now
+                behind = 0
+            if behind > 0:
+                stats.late += 1
+
+            step(stats)
+            stats.ticks += 1
+            next_tick += self.dt
+
+            if self.log_interval and now - stats.started >= self.log_interval:
+                self.last_stats = stats.snapshot(now)
+                print(stats.format(self.name, now))
+                stats.reset(now)
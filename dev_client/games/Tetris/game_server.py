@@ -1,83 +1,123 @@
-import socket
 import argparse
-import threading
 import random
+import os
 import sys
 
+try:
+    from relay_core import RelayServer
+except ImportError:
+    # 在開發目錄直接執行：relay_core.py 是上傳時才由 developer_client 從 common/relay.py 打包進來的
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+    from common.relay import RelayServer
+from tetris_referee import Referee, InvalidEvent, parse_event, parse_attack, save_replay
+
 # 全域變數
-clients = []
 GLOBAL_SEED = random.randint(0, 1000000)  # 伺服器啟動時生成的唯一種子
+VALIDATE = True     # False (--no-validate) 時維持舊行為：直接轉發 client 回報的 ATTACK
+REPLAY_DIR = None   # 設定後，玩家離線時把 replay 寫到這個資料夾
+
+class TetrisRoom:
+    """
+    一場對戰的邏輯，由 relay_core 在單一執行緒呼叫 (訊息以換行分隔，不需要鎖)。
+    每位玩家一個 Referee，用種子重播該玩家的操作；server 只依它算出的攻擊送垃圾行，
+    client 回報的 ATTACK / GAMEOVER 只拿來比對。validate=False 才會照舊轉發 ATTACK (給舊版 client 用)。
+    """
+    def __init__(self, seed, validate=True, replay_dir=None):
+        self.seed = seed
+        self.validate = validate
+        self.replay_dir = replay_dir
+        self.players = {}  # Connection -> Referee
+
+    def on_connect(self, conn):
+        print(f"[GameServer] Player {conn.addr} connected.")
+        # 連線後立即發送種子碼，確保方塊序列一致 (排在任何 GARBAGE 之前)
+        conn.send(f"SEED:{self.seed}")
+        self.players[conn] = Referee(self.seed)
+
+    def on_message(self, conn, msg):
+        ref = self.players[conn]
+        msg = msg.strip()
 
-def broadcast(message, sender_socket=None):
-    """將訊息廣播給所有其他客戶端"""
-    for client in clients:
-        if client != sender_socket:
+        # 操作 (格式: IN:毫秒:代碼)
+        if msg.startswith("IN:"):
+            self.handle_input(conn, ref, msg)
+
+        # 處理攻擊指令 (格式: ATTACK:行數)
+        elif msg.startswith("ATTACK"):
             try:
-                client.sendall(message)
-            except:
-                clients.remove(client)
-
-def handle_client(client_socket, addr):
-    print(f"[GameServer] Player {addr} connected.")
-    
-    # 1. 連線後立即發送種子碼，確保方塊序列一致
-    try:
-        seed_msg = f"SEED:{GLOBAL_SEED}\n"
-        client_socket.sendall(seed_msg.encode())
-    except Exception as e:
-        print(f"[GameServer] Error sending seed to {addr}: {e}")
-        return
+                lines = parse_attack(msg)
+            except InvalidEvent as e:
+                print(f"[GameServer] Player {conn.addr} sent invalid attack ({e}), ignored.")
+                return
+            self.handle_attack(conn, ref, lines)
+
+        # 處理玩家輸掉
+        elif msg == "GAMEOVER":
+            print(f"[GameServer] Player {conn.addr} Game Over.")
+            if self.validate and not ref.claim_game_over():
+                print(f"[GameServer] Player {conn.addr} reported game over but the referee board is still alive.")
+            # 可以在此處通知其他人有人輸了 (選做)
 
-    while True:
+    def on_disconnect(self, conn):
+        print(f"[GameServer] Player {conn.addr} disconnected.")
+        ref = self.players.pop(conn, None)
+        if ref is not None:
+            self.finish_player(conn.addr, ref)
+
+    def send_garbage(self, lines, sender):
+        """送垃圾行給其他玩家，並記下每位玩家應該套用的行數"""
+        for conn, ref in self.players.items():
+            if conn is not sender:
+                ref.owe(lines)
+                conn.send(f"GARBAGE:{lines}")
+
+    def handle_input(self, conn, ref, msg):
+        """IN:<t>:<code>：在 server 端重播，鎖定時由 server 算出的攻擊決定送出的垃圾行"""
         try:
-            data = client_socket.recv(1024)
-            if not data:
-                break
-            
-            msg = data.decode().strip()
-            
-            # 處理攻擊指令 (格式: ATTACK:行數)
-            if msg.startswith("ATTACK:"):
-                lines = msg.split(":")[1]
-                print(f"[GameServer] Player {addr} sent {lines} garbage lines!")
-                # 轉發給其他玩家
-                broadcast(f"GARBAGE:{lines}\n".encode(), sender_socket=client_socket)
-            
-            # 處理玩家輸掉
-            elif msg == "GAMEOVER":
-                print(f"[GameServer] Player {addr} Game Over.")
-                # 可以在此處通知其他人有人輸了 (選做)
-
-        except ConnectionResetError:
-            break
-        except Exception as e:
-            print(f"[GameServer] Error handling client {addr}: {e}")
-            break
-
-    print(f"[GameServer] Player {addr} disconnected.")
-    if client_socket in clients:
-        clients.remove(client_socket)
-    client_socket.close()
+            t, code = parse_event(msg)
+            was_over = ref.game_over
+            attack = ref.apply(t, code)
+        except InvalidEvent as e:
+            print(f"[GameServer] Player {conn.addr} sent invalid input ({e}), ignored.")
+            return
+        if attack > 0 and self.validate:
+            print(f"[GameServer] Player {conn.addr} sent {attack} garbage lines!")
+            self.send_garbage(attack, conn)
+        if ref.game_over and not was_over:
+            print(f"[GameServer] Player {conn.addr} topped out (score {ref.game.score}).")
+
+    def handle_attack(self, conn, ref, lines):
+        """client 回報的 ATTACK：驗證模式下不轉發，只和 server 算出的攻擊比對"""
+        if not self.validate:
+            print(f"[GameServer] Player {conn.addr} sent {lines} garbage lines!")
+            self.send_garbage(lines, conn)
+        elif not ref.claim_attack(lines):
+            print(f"[GameServer] Player {conn.addr} claimed {ref.claimed_attack} attack lines in total, "
+                  f"referee computed {ref.attack_sent}; claim ignored.")
+
+    def finish_player(self, addr, ref):
+        if not ref.events: return
+        if ref.mismatches or ref.invalid:
+            print(f"[GameServer] Player {addr}: {ref.mismatches} mismatches, {ref.invalid} invalid inputs.")
+        if self.replay_dir:
+            os.makedirs(self.replay_dir, exist_ok=True)
+            path = os.path.join(self.replay_dir, f"tetris_{self.seed}.jsonl")
+            save_replay(path, ref.record(), player=f"{addr[0]}:{addr[1]}",
+                        score=ref.game.score, attack=ref.attack_sent, game_over=ref.game_over)
+            print(f"[GameServer] Replay of {addr} saved to {path}")
 
 def run_game_server(host, port):
     print(f"[GameServer] Starting Tetris Battle Server on {host}:{port}...")
     print(f"[GameServer] Generated Global Seed: {GLOBAL_SEED}")
-    
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
+    if not VALIDATE:
+        print("[GameServer] Input validation disabled, relaying client ATTACK messages.")
+
+    server = RelayServer()
     try:
-        server.bind((host, port))
-        server.listen(5)
+        server.listen(host, port, TetrisRoom(GLOBAL_SEED, VALIDATE, REPLAY_DIR))
         print(f"[GameServer] Listening for players...")
-        
-        while True:
-            client, addr = server.accept()
-            clients.append(client)
-            thread = threading.Thread(target=handle_client, args=(client, addr))
-            thread.daemon = True
-            thread.start()
-            
+        server.serve_forever()
+
     except KeyboardInterrupt:
         print("\n[GameServer] Stopping server...")
     except Exception as e:
@@ -89,6 +129,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Start Tetris Game Server')
     parser.add_argument('--host', type=str, default='127.0.0.1', help='Host IP')
     parser.add_argument('--port', type=int, default=9000, help='Host Port')
+    parser.add_argument('--no-validate', action='store_true', help='Relay client ATTACK messages without replaying inputs')
+    parser.add_argument('--replay-dir', type=str, default=None, help='Directory for match replays')
     args = parser.parse_args()
-    
-    run_game_server(args.host, args.port)
\ No newline at end of file
+
+    VALIDATE = not args.no_validate
+    REPLAY_DIR = args.replay_dir
+    run_game_server(args.host, args.port)
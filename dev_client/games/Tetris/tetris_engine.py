@@ -0,0 +1,248 @@
+"""
+Tetris 遊戲邏輯 (不依賴 pygame，client 與 server 共用)
+
+盤面用 bitboard 表示：每一列一個 int，第 x 個 bit 代表第 x 欄有方塊。
+每種方塊的四個旋轉方向 (每列 bitmask、佔用格子、外框) 與 SRS 式的踢牆位移在 import 時就算好，因此
+碰撞 = 每列一次 AND、鎖定 = 每列一次 OR、消行 = 找出等於 FULL_ROW 的列，旋轉不需要配置任何物件。
+
+方塊序列 (7-bag) 與垃圾行使用同一個 rng，呼叫順序與改版前的 TetrisGame 完全相同，
+同一個種子與同一串操作會得到一樣的盤面。
+"""
+import random
+
+GRID_WIDTH = 10
+GRID_HEIGHT = 20
+FULL_ROW = (1 << GRID_WIDTH) - 1
+
+# 方塊形狀定義 (I, J, L, O, S, T, Z)
+SHAPES = [
+    [[1, 1, 1, 1]], # I
+    [[1, 0, 0], [1, 1, 1]], # J
+    [[0, 0, 1], [1, 1, 1]], # L
+    [[1, 1], [1, 1]], # O
+    [[0, 1, 1], [1, 1, 0]], # S
+    [[0, 1, 0], [1, 1, 1]], # T
+    [[1, 1, 0], [0, 1, 1]]  # Z
+]
+
+# 盤面格子的顏色代碼：0 = 空、1~7 = SHAPES[code - 1]、GARBAGE = 垃圾行 (由 client 對應到實際顏色)
+GARBAGE = len(SHAPES) + 1
+
+# 消除行數 -> 送給對手的垃圾行數
+ATTACK_TABLE = {2: 1, 3: 2, 4: 4}
+
+# SRS 的順時針踢牆位移 (0->R, R->2, 2->L, L->0)，已換成畫面座標 (y 向下)
+SRS_KICKS = (
+    ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),
+    ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),
+    ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),
+    ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),
+)
+SRS_KICKS_I = (
+    ((0, 0), (-2, 0), (1, 0), (-2, 1), (1, -2)),
+    ((0, 0), (-1, 0), (2, 0), (-1, -2), (2, 1)),
+    ((0, 0), (2, 0), (-1, 0), (2, -1), (-1, 2)),
+    ((0, 0), (1, 0), (-2, 0), (1, 2), (-2, -1)),
+)
+NO_KICKS = (((0, 0),),) * 4
+
+class Rotation:
+    """某個方塊的一個旋轉方向"""
+    __slots__ = ('shape', 'masks', 'cells', 'width', 'height', 'at')
+
+    def __init__(self, shape):
+        self.shape = shape  # 巢狀 list
+        self.masks = tuple(sum(1 << x for x, cell in enumerate(row) if cell) for row in shape)
+        # 佔用格子相對於左上角的位移 (鎖定上色、繪圖只需走這 4 格)
+        self.cells = tuple((x, y) for y, row in enumerate(shape) for x, cell in enumerate(row) if cell)
+        # 外框 (左上角即方塊位置)
+        self.width = len(shape[0])
+        self.height = len(shape)
+        # at[x]：方塊放在第 x 欄時每列的 bitmask (省去每次位移)
+        self.at = [tuple(mask << x for mask in self.masks) for x in range(GRID_WIDTH - self.width + 1)]
+
+def _rotate(shape):
+    """順時針旋轉 (矩陣轉置 + 反轉列)"""
+    return [list(row) for row in zip(*shape[::-1])]
+
+def _build_rotations(shape):
+    rotations = []
+    for _ in range(4):
+        rotations.append(Rotation(shape))
+        shape = _rotate(shape)
+    return rotations
+
+# ROTATIONS[方塊編號][旋轉方向]
+ROTATIONS = [_build_rotations(shape) for shape in SHAPES]
+def _build_kicks(piece_id):
+    """
+    旋轉時依序嘗試的 (dx, dy)，第一個不碰撞的位置生效。
+    第一個永遠是 (0, 0)：原本就轉得過去時結果與沒有踢牆相同。
+    這裡的旋轉是以外框左上角為基準，SRS 的位移則以方塊中心為軸，
+    所以先加上讓外框中心不動的位移再套 SRS 表。
+    """
+    if piece_id == 3: return NO_KICKS  # O 旋轉後形狀不變
+    table = SRS_KICKS_I if piece_id == 0 else SRS_KICKS
+    rotations = ROTATIONS[piece_id]
+    kicks = []
+    for r in range(4):
+        old, new = rotations[r], rotations[(r + 1) % 4]
+        px, py = (old.width - new.width) // 2, (old.height - new.height) // 2
+        offsets = [(0, 0)]
+        for kx, ky in table[r]:
+            offset = (px + kx, py + ky)
+            if offset not in offsets: offsets.append(offset)
+        kicks.append(tuple(offsets))
+    return tuple(kicks)
+
+# KICKS[方塊編號][旋轉前的方向]
+KICKS = [_build_kicks(i) for i in range(len(SHAPES))]
+
+def attack_lines(cleared):
+    return ATTACK_TABLE.get(cleared, 0)
+
+class TetrisGame:
+    def __init__(self, track_colors=True, kicks=True):
+        # kicks=False 時旋轉不踢牆 (與改版前的規則相同)
+        self.kicks = KICKS if kicks else [NO_KICKS] * len(SHAPES)
+        self.rows = [0] * GRID_HEIGHT
+        # 繪圖用的顏色代碼盤面；server 端只需要 bitboard，可關掉以節省時間
+        self.grid = [[0] * GRID_WIDTH for _ in range(GRID_HEIGHT)] if track_colors else None
+        self.piece_id = None
+        self.rotation = 0
+        self.current_x = 0
+        self.current_y = 0
+        self.bag = []
+        self.score = 0
+        self.game_over = False
+        self.rng = random.Random() # 獨立的隨機產生器實例
+
+    @property
+    def current_piece(self):
+        if self.piece_id is None: return None
+        return ROTATIONS[self.piece_id][self.rotation].shape
+
+    @property
+    def current_cells(self):
+        """目前方塊佔用格子的相對位移"""
+        if self.piece_id is None: return ()
+        return ROTATIONS[self.piece_id][self.rotation].cells
+
+    @property
+    def current_color(self):
+        return None if self.piece_id is None else self.piece_id + 1
+
+    def init_rng(self, seed):
+        self.rng.seed(seed)
+        self.new_piece()
+
+    def get_7_bag_piece(self):
+        if not self.bag:
+            self.bag = list(range(len(SHAPES)))
+            self.rng.shuffle(self.bag) # 使用同步的 RNG 洗牌
+        return self.bag.pop()
+
+    def new_piece(self):
+        self.piece_id = self.get_7_bag_piece()
+        self.rotation = 0
+        rot = ROTATIONS[self.piece_id][0]
+        self.current_x = GRID_WIDTH // 2 - rot.width // 2
+        self.current_y = 0
+
+        if self.collides(rot, self.current_x, self.current_y):
+            self.game_over = True
+
+    def collides(self, rot, x, y):
+        # 方塊的外框每一欄、第一列與最後一列都有格子，所以邊界只需比較外框；
+        # 踢牆也不能讓方塊超出頂端
+        if x < 0 or y < 0 or x + rot.width > GRID_WIDTH or y + rot.height > GRID_HEIGHT:
+            return True
+        rows = self.rows
+        for i, mask in enumerate(rot.at[x]):
+            if rows[y + i] & mask:
+                return True
+        return False
+
+    def move(self, dx, dy=0):
+        """嘗試平移目前的方塊，回傳是否成功"""
+        rot = ROTATIONS[self.piece_id][self.rotation]
+        if self.collides(rot, self.current_x + dx, self.current_y + dy):
+            return False
+        self.current_x += dx
+        self.current_y += dy
+        return True
+
+    def rotate_piece(self):
+        """順時針旋轉，原位置擋住時依序嘗試踢牆位移"""
+        new_rotation = (self.rotation + 1) % 4
+        rot = ROTATIONS[self.piece_id][new_rotation]
+        x, y = self.current_x, self.current_y
+        for dx, dy in self.kicks[self.piece_id][self.rotation]:
+            if not self.collides(rot, x + dx, y + dy):
+                self.rotation = new_rotation
+                self.current_x, self.current_y = x + dx, y + dy
+                return True
+        return False
+
+    def hard_drop(self):
+        """移到底部並立即鎖定，回傳消除的行數"""
+        rot = ROTATIONS[self.piece_id][self.rotation]
+        masks = rot.at[self.current_x]
+        rows = self.rows
+        y = self.current_y
+        limit = GRID_HEIGHT - rot.height
+        while y < limit:
+            below = y + 1
+            if any(rows[below + i] & mask for i, mask in enumerate(masks)):
+                break
+            y = below
+        self.current_y = y
+        return self.lock_piece()
+
+    def fall(self):
+        """自然下落一格；觸底時鎖定並回傳消除的行數，否則回傳 None"""
+        if self.move(0, 1):
+            return None
+        return self.lock_piece()
+
+    def lock_piece(self):
+        rot = ROTATIONS[self.piece_id][self.rotation]
+        x, y = self.current_x, self.current_y
+        rows = self.rows
+        for i, mask in enumerate(rot.at[x]):
+            rows[y + i] |= mask
+        if self.grid is not None:
+            color = self.piece_id + 1
+            grid = self.grid
+            for cx, cy in rot.cells:
+                grid[y + cy][x + cx] = color
+
+        cleared_lines = self.clear_lines()
+        self.new_piece()
+        return cleared_lines
+
+    def clear_lines(self):
+        rows = self.rows
+        if FULL_ROW not in rows:
+            return 0
+        keep = [y for y, row in enumerate(rows) if row != FULL_ROW]
+        cleared = GRID_HEIGHT - len(keep)
+        self.rows = [0] * cleared + [rows[y] for y in keep]
+        if self.grid is not None:
+            self.grid = [[0] * GRID_WIDTH for _ in range(cleared)] + [self.grid[y] for y in keep]
+        self.score += 100 * cleared
+        return cleared
+
+    def add_garbage(self, lines):
+        # 接收攻擊：底部增加垃圾行 (每格各抽一次亂數決定是否為缺口)，頂部移除
+        rng = self.rng
+        for _ in range(lines):
+            mask = 0
+            for i in range(GRID_WIDTH):
+                if i != rng.randint(0, GRID_WIDTH - 1):
+                    mask |= 1 << i
+            del self.rows[0]
+            self.rows.append(mask)
+            if self.grid is not None:
+                del self.grid[0]
+                self.grid.append([GARBAGE if mask >> i & 1 else 0 for i in range(GRID_WIDTH)])
@@ -0,0 +1,140 @@
+"""
+Server 端的 Tetris 裁判：用同一個種子與 7-bag，依序重播每位玩家送來的操作，
+由 server 算出消行與攻擊行數，不再相信 client 自己回報的 ATTACK / GAMEOVER。
+
+Client 每個畫面把套用過的操作送成 "IN:<t>:<code>"，t 為遊戲開始後的毫秒數：
+    L / R = 左右移動、D = 下移一格、U = 旋轉、H = hard drop、F = 自然下落一格、
+    G<n> = 套用 n 行垃圾 (server 送出的 GARBAGE)
+盤面只用 bitboard (不記顏色)，每個事件是幾個整數運算，一個行程可以同時裁判很多房間。
+
+Replay 只記種子與操作：{"seed": ..., "events": "t差:code,..."}，用 replay() 可還原出同一個盤面。
+"""
+import json
+
+from tetris_engine import TetrisGame, attack_lines
+
+# 操作代碼 -> 對應的 TetrisGame 呼叫；回傳鎖定時消除的行數，沒有鎖定則回傳 None
+ACTIONS = {
+    'L': lambda game: game.move(-1) and None,
+    'R': lambda game: game.move(1) and None,
+    'D': lambda game: game.move(0, 1) and None,
+    'U': lambda game: game.rotate_piece() and None,
+    'H': lambda game: game.hard_drop(),
+    'F': lambda game: game.fall(),
+}
+
+class InvalidEvent(ValueError):
+    pass
+
+def parse_event(msg):
+    """ "IN:<t>:<code>" -> (t, code)"""
+    try:
+        _, t, code = msg.split(":", 2)
+        t = int(t)
+    except ValueError:
+        raise InvalidEvent(f"malformed input: {msg!r}")
+    if code not in ACTIONS and not (code[:1] == 'G' and code[1:].isdigit()):
+        raise InvalidEvent(f"unknown input code: {code!r}")
+    return t, code
+
+def parse_attack(msg):
+    """ "ATTACK:<行數>" -> 行數"""
+    try:
+        _, lines = msg.split(":", 1)
+        lines = int(lines)
+    except ValueError:
+        raise InvalidEvent(f"malformed attack: {msg!r}")
+    if lines < 0:
+        raise InvalidEvent(f"negative attack: {msg!r}")
+    return lines
+
+class Referee:
+    """一位玩家的權威模擬"""
+    def __init__(self, seed):
+        self.seed = seed
+        self.game = TetrisGame(track_colors=False)
+        self.game.init_rng(seed)
+        self.events = []    # [(t, code)]，供 replay
+        self.last_t = 0
+        self.owed = 0       # server 已送出、client 還沒套用的垃圾行
+        self.attack_sent = 0
+        # 與 client 自己回報的結果比對
+        self.claimed_attack = 0
+        self.mismatches = 0
+        self.invalid = 0
+
+    @property
+    def game_over(self):
+        return self.game.game_over
+
+    def owe(self, lines):
+        """server 送出 GARBAGE 給這位玩家時呼叫"""
+        self.owed += lines
+
+    def reject(self, reason):
+        self.invalid += 1
+        raise InvalidEvent(reason)
+
+    def apply(self, t, code):
+        """套用一個操作，回傳這個操作造成的攻擊行數；不合法的操作丟出 InvalidEvent"""
+        if t < self.last_t:
+            self.reject(f"time went backwards: {t} < {self.last_t}")
+        game = self.game
+        if game.game_over:
+            return 0  # 輸了之後的操作 (例如還在路上的垃圾行) 不影響結果
+        if code[0] == 'G':
+            lines = int(code[1:])
+            if lines > self.owed:
+                self.reject(f"applied {lines} garbage lines but only {self.owed} were sent")
+            self.owed -= lines
+            game.add_garbage(lines)
+            cleared = None
+        else:
+            cleared = ACTIONS[code](game)
+        self.last_t = t
+        self.events.append((t, code))
+        if not cleared: return 0
+        attack = attack_lines(cleared)
+        self.attack_sent += attack
+        return attack
+
+    def claim_attack(self, lines):
+        """client 回報送出 lines 行攻擊；累計值與 server 算出的不同時回傳 False"""
+        self.claimed_attack += lines
+        if self.claimed_attack == self.attack_sent: return True
+        self.mismatches += 1
+        return False
+
+    def claim_game_over(self):
+        if self.game.game_over: return True
+        self.mismatches += 1
+        return False
+
+    def record(self):
+        return make_record(self.seed, self.events)
+
+def make_record(seed, events):
+    """精簡的 replay：種子 + 以時間差編碼的操作字串"""
+    parts = []
+    prev = 0
+    for t, code in events:
+        parts.append(f"{t - prev}:{code}")
+        prev = t
+    return {"seed": seed, "events": ",".join(parts)}
+
+def replay(record):
+    """由 record() 的結果重建 Referee (盤面、分數、攻擊行數都會相同)"""
+    ref = Referee(record["seed"])
+    t = 0
+    for item in filter(None, record["events"].split(",")):
+        dt, code = item.split(":", 1)
+        t += int(dt)
+        if code[0] == 'G':
+            ref.owe(int(code[1:]))
+        ref.apply(t, code)
+    return ref
+
+def save_replay(path, record, **extra):
+    """把一筆 replay 附加到 JSON lines 檔案"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({**extra, **record}) + "\n")
@@ -42,7 +42,7 @@ def run_game_client(host, port):
                         if user_input.lower() == 'quit':
                             s.close()
                             return
-                        s.sendall(user_input.encode())
+                        s.sendall(f"{user_input}{DELIMITER}".encode())
                     
                     elif msg_type == "OVER":
                         print("\n=== GAME OVER ===")
@@ -1,6 +1,13 @@
-import socket
 import argparse
-import threading
+import os
+import sys
+
+try:
+    from relay_core import RelayServer
+except ImportError:
+    # 在開發目錄直接執行：relay_core.py 是上傳時才由 developer_client 從 common/relay.py 打包進來的
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+    from common.relay import RelayServer
 
 # 遊戲設定
 BOARD_SIZE = 10
@@ -10,6 +17,10 @@ WHITE = 'O'
 DELIMITER = "<EOF>"
 
 class GomokuGame:
+    """
+    一局五子棋，同時也是 relay_core 的 handler (on_connect / on_message / on_disconnect)：
+    所有事件都在同一條執行緒依序處理，不需要每位玩家一條執行緒。
+    """
     def __init__(self):
         self.board = [[EMPTY for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
         self.turn = BLACK
@@ -18,19 +29,56 @@ class GomokuGame:
         self.game_over = False
 
     def broadcast(self, message, prefix="VIEW"):
-        """發送訊息給所有玩家，並加上分隔符號"""
-        for s in self.sockets:
-            try:
-                s.sendall(f"{prefix}:{message}{DELIMITER}".encode())
-            except:
-                pass
-
-    def send_to(self, socket, message, prefix="VIEW"):
-        """發送訊息給特定玩家，並加上分隔符號"""
-        try:
-            socket.sendall(f"{prefix}:{message}{DELIMITER}".encode())
-        except:
-            pass
+        """發送訊息給所有玩家 (relay_core 會加上分隔符號)"""
+        for conn in self.sockets:
+            conn.send(f"{prefix}:{message}")
+
+    def send_to(self, conn, message, prefix="VIEW"):
+        """發送訊息給特定玩家 (relay_core 會加上分隔符號)"""
+        conn.send(f"{prefix}:{message}")
+
+    def on_connect(self, conn):
+        if len(self.players) >= 2:
+            self.send_to(conn, "Room is full.\n")
+            conn.close(flush=True)
+            return
+        print(f"[GameServer] Player connected: {conn.addr}")
+        self.sockets.append(conn)
+        if not self.players:
+            self.players[conn] = BLACK
+            self.send_to(conn, "Connected. You are BLACK (X). Waiting for opponent...\n")
+        else:
+            self.players[conn] = WHITE
+            self.send_to(conn, "Connected. You are WHITE (O).\n")
+            print("[GameServer] Game Start!")
+            update_game_state(self)
+
+    def on_message(self, conn, msg):
+        # 還沒湊齊兩人或已分出勝負時不接受落子
+        if conn not in self.players or len(self.sockets) < 2 or self.game_over:
+            return
+        if self.handle_move(conn, msg.strip()):
+            # 如果移動成功，更新全場狀態（換人、顯示棋盤）
+            update_game_state(self)
+            if self.game_over:
+                for player in self.sockets:
+                    player.close(flush=True)
+        else:
+            # 如果移動失敗（格式錯誤、已被佔用等），且是該玩家的回合
+            # Server 必須補發一個 INPUT 指令，讓 Client 解鎖鍵盤再次輸入
+            if self.players[conn] == self.turn:
+                self.send_to(conn, "Try again:", prefix="INPUT")
+
+    def on_disconnect(self, conn):
+        if conn not in self.players: return
+        print(f"Player {conn.addr} disconnected.")
+        self.sockets.remove(conn)
+        if len(self.players) < 2:
+            # 開局前離開：空出位置給下一位玩家
+            del self.players[conn]
+        elif not self.sockets:
+            # 開局後兩位玩家都離開 (對局結束)，server 跟著結束
+            conn.server.stop()
 
     def get_board_str(self):
         header = "   " + " ".join([str(i) for i in range(BOARD_SIZE)]) + "\n"
@@ -86,33 +134,6 @@ class GomokuGame:
         self.turn = WHITE if self.turn == BLACK else BLACK
         return True
 
-def handle_client(conn, addr, game):
-    print(f"[GameServer] Player connected: {addr}")
-    try:
-        while not game.game_over:
-            data = conn.recv(1024)
-            if not data: break
-            
-            # 可能會有黏包，這裡簡單處理（假設最後一個是最新指令），
-            # 配合 Client 的 Buffer 機制，Server 這裡讀取到的通常是單次指令
-            # 但若要嚴謹 Server 讀取也需要 buffer，不過 Server 目前只讀取短字串所以較少出錯
-            msg = data.decode().strip()
-            
-            # === 修正重點 ===
-            if game.handle_move(conn, msg):
-                # 如果移動成功，更新全場狀態（換人、顯示棋盤）
-                update_game_state(game)
-            else:
-                # 如果移動失敗（格式錯誤、已被佔用等），且是該玩家的回合
-                # Server 必須補發一個 INPUT 指令，讓 Client 解鎖鍵盤再次輸入
-                if game.players[conn] == game.turn:
-                    game.send_to(conn, "Try again:", prefix="INPUT")
-            
-    except ConnectionResetError:
-        print(f"Player {addr} disconnected.")
-    finally:
-        conn.close()
-
 def update_game_state(game):
     if game.game_over: return
 
@@ -134,35 +155,14 @@ def update_game_state(game):
 
 def run_game_server(host, port):
     print(f"[GameServer] Starting Gomoku on {host}:{port}...")
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((host, port))
-    server.listen(2)
-    
-    game = GomokuGame()
+    server = RelayServer()
+    server.listen(host, port, GomokuGame(), delimiter=DELIMITER, backlog=2)
     print("[GameServer] Waiting for players...")
 
-    conn1, addr1 = server.accept()
-    game.sockets.append(conn1)
-    game.players[conn1] = BLACK
-    conn1.sendall(f"VIEW:Connected. You are BLACK (X). Waiting for opponent...\n{DELIMITER}".encode())
-
-    conn2, addr2 = server.accept()
-    game.sockets.append(conn2)
-    game.players[conn2] = WHITE
-    conn2.sendall(f"VIEW:Connected. You are WHITE (O).\n{DELIMITER}".encode())
-
-    print("[GameServer] Game Start!")
-    
-    t1 = threading.Thread(target=handle_client, args=(conn1, addr1, game))
-    t2 = threading.Thread(target=handle_client, args=(conn2, addr2, game))
-    t1.start()
-    t2.start()
-
-    update_game_state(game)
-
-    t1.join()
-    t2.join()
-    server.close()
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Start Gomoku Server')
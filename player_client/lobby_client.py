@@ -10,7 +10,7 @@ import stat
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..')) 
 
-from common.util import send_json, recv_json, load_system_config, recv_file
+from common.util import send_json, recv_json, load_system_config, recv_file, recv_chunks, resume_offset, TRANSFER_CHUNK_SIZE, build_file_manifest, BufferedSocket, set_protocol, supported_codecs, PROTOCOL_V1, PROTOCOL_V2
 
 # ================= 全域變數 =================
 config = load_system_config()
@@ -19,10 +19,15 @@ SERVER_PORT = config.get("LOBBY_PORT", 8888)
 
 client_socket = None
 user_name = ""
+user_password = ""
 curr_page = "Home"
 current_room_id = None
 is_host = False
 download_base_path = os.path.join(os.path.dirname(__file__), "downloads")
+# 下載中斷時保留已驗證的部分 ({game_id}_{sha256}.part)，下次下載同一檔案時續傳
+partial_base_path = os.path.join(download_base_path, ".partial")
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+MAX_DOWNLOAD_RETRIES = 3
 
 # ================= 輔助 =================
 def clear_screen():
@@ -37,7 +42,7 @@ def get_input(prompt):
 def connect_server():
     global client_socket
     try:
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client_socket = BufferedSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
         client_socket.connect((SERVER_IP, SERVER_PORT))
         return True
     except Exception as e:
@@ -62,10 +67,63 @@ def set_read_only(path):
             file_path = os.path.join(root, file)
             os.chmod(file_path, stat.S_IREAD | stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
 
+def set_writable(path):
+    for root, dirs, files in os.walk(path):
+        for f in files: os.chmod(os.path.join(root, f), stat.S_IWRITE | stat.S_IREAD)
+
+def apply_delta(save_dir, delta_zip, deleted):
+    """增量更新：覆寫有變動的檔案，刪除新版已不存在的檔案"""
+    base = os.path.abspath(save_dir)
+    set_writable(save_dir)
+    try:
+        with zipfile.ZipFile(delta_zip, 'r') as zf: zf.extractall(save_dir)
+        for rel in deleted:
+            target = os.path.abspath(os.path.join(base, *rel.split('/')))
+            # 只允許刪除遊戲資料夾內的檔案
+            if os.path.commonpath([base, target]) != base: continue
+            if os.path.isfile(target): os.remove(target)
+    finally:
+        set_read_only(save_dir)
+
+def login(u, p):
+    """送出登入並協商協定，回傳 Server 回應"""
+    global user_name, user_password
+    send_json(client_socket, {"cmd": "auth_login", "username": u, "password": p,
+                              "protocol": PROTOCOL_V2, "codecs": supported_codecs()})
+    resp = recv_json(client_socket)
+    if resp and resp.get("status") == "ok":
+        # 舊版 Server 不會回傳 protocol，維持 v1
+        set_protocol(client_socket, resp.get("protocol", PROTOCOL_V1), resp.get("codec", "json"))
+        user_name, user_password = u, p
+    return resp
+
+def reconnect():
+    """重新連線並以目前帳號登入 (Server 會以新連線取代還沒釋放的舊登入)"""
+    try: client_socket.close()
+    except Exception: pass
+    if not connect_server(): return False
+    resp = login(user_name, user_password)
+    return bool(resp and resp.get("status") == "ok")
+
+def drop_session():
+    """連線已無法使用：關閉 socket，回到登入頁重新連線"""
+    global curr_page
+    try: client_socket.close()
+    except Exception: pass
+    curr_page = "Login"
+
+def Relogin():
+    global curr_page
+    clear_screen()
+    print("與 Server 的連線已中斷，正在重新連線...")
+    while not connect_server():
+        get_input("按 Enter 重試...")
+    LoginPage()
+    curr_page = "Home"
+
 # ================= 登入頁面 =================
 
 def LoginPage():
-    global user_name
     while True:
         clear_screen()
         print("=== 歡迎來到 Game Center (Player) ===")
@@ -79,10 +137,8 @@ def LoginPage():
         if choice == '1':
             u = get_input("帳號: ")
             p = get_input("密碼: ")
-            send_json(client_socket, {"cmd": "auth_login", "username": u, "password": p})
-            resp = recv_json(client_socket)
+            resp = login(u, p)
             if resp and resp.get("status") == "ok":
-                user_name = u
                 print(f"登入成功！歡迎 {user_name}")
                 time.sleep(1)
                 return
@@ -190,6 +246,50 @@ def process_rate(detail):
     else: print(f"❌ 評分失敗: {resp.get('reason') if resp else 'Unknown'}")
     input("按 Enter 繼續...")
 
+def find_partial(partial_dir, game_id):
+    """找出該遊戲未完成的下載，回傳 (sha256, path) 或 None"""
+    if not os.path.isdir(partial_dir): return None
+    prefix = f"{game_id}_"
+    for name in os.listdir(partial_dir):
+        if name.startswith(prefix) and name.endswith(".part"):
+            return name[len(prefix):-len(".part")], os.path.join(partial_dir, name)
+    return None
+
+def recv_download(resp, game_id, temp_zip):
+    """依 Server 回應接收檔案到 temp_zip；分塊傳輸中斷時保留進度"""
+    transfer = resp.get("transfer")
+    if not transfer:
+        return recv_file(client_socket, temp_zip)
+    partial_dir = os.path.join(partial_base_path, user_name)
+    os.makedirs(partial_dir, exist_ok=True)
+    sha = transfer["sha256"]
+    part_path = os.path.join(partial_dir, f"{game_id}_{sha}.part")
+    # 內容不同 (例如 Server 已更新版本) 的舊進度無法續傳，直接清掉
+    prefix = f"{game_id}_"
+    for name in os.listdir(partial_dir):
+        if name.startswith(prefix) and name.endswith(".part") and name != os.path.basename(part_path):
+            os.remove(os.path.join(partial_dir, name))
+    if transfer.get("offset"):
+        print(f"從 {transfer['offset']} / {transfer['size']} bytes 處續傳...")
+    chunk_size = min(int(transfer.get("chunk_size", TRANSFER_CHUNK_SIZE)), MAX_CHUNK_SIZE)
+    if not recv_chunks(client_socket, part_path, transfer["offset"], transfer["size"], sha, chunk_size):
+        if os.path.exists(part_path): print("已保留下載進度，下次下載會自動續傳")
+        return False
+    os.replace(part_path, temp_zip)
+    return True
+
+def request_download(req, game_id, temp_zip):
+    """送出下載請求並接收檔案，回傳 (Server 回應, 是否收完)；連線中斷時回應為 None"""
+    partial = find_partial(os.path.join(partial_base_path, user_name), game_id)
+    if partial:
+        req["resume"] = {"sha256": partial[0], "offset": resume_offset(partial[1])}
+    else:
+        req.pop("resume", None)
+    send_json(client_socket, req)
+    resp = recv_json(client_socket)
+    if not resp or resp.get("status") != "ok": return resp, False
+    return resp, recv_download(resp, game_id, temp_zip)
+
 def process_download(detail):
     game_id = detail['id']
     game_name = detail['name']
@@ -204,18 +304,52 @@ def process_download(detail):
     folder_name = f"{game_id}_{game_name}"
     save_dir = os.path.join(download_base_path, user_name, folder_name)
     print(f"正在請求下載 {game_name} ...")
-    send_json(client_socket, {"cmd": "download_game", "game_id": game_id})
-    resp = recv_json(client_socket)
-    if not resp or resp.get("status") != "ok":
-        print(f"下載請求失敗: {resp.get('reason') if resp else 'Unknown'}")
+    req = {"cmd": "download_game", "game_id": game_id}
+    if local_ver and os.path.isdir(save_dir):
+        # 本地已有舊版：附上檔案 hash 清單，只下載有變動的檔案
+        req.update(mode="delta", manifest=build_file_manifest(save_dir))
+    req["chunked"] = True
+    temp_zip = "temp_game.zip"
+    resp, ok = request_download(req, game_id, temp_zip)
+    retries = 0
+    # 傳輸中斷時 socket 上可能還留著沒讀完的區塊，不能再拿來送指令：
+    # 重新連線登入，再從已保留的進度續傳
+    while not ok and (resp is None or resp.get("status") == "ok"):
+        if retries >= MAX_DOWNLOAD_RETRIES:
+            print("下載多次中斷，已保留進度 (下次下載會自動續傳)，請重新登入")
+            drop_session()
+            input("按 Enter 繼續...")
+            return
+        retries += 1
+        print(f"下載中斷，重新連線續傳中 ({retries}/{MAX_DOWNLOAD_RETRIES})...")
+        time.sleep(1)
+        if not reconnect():
+            print("無法重新連線至 Server，請重新登入")
+            drop_session()
+            input("按 Enter 繼續...")
+            return
+        resp, ok = request_download(req, game_id, temp_zip)
+    if resp is not None and resp.get("status") != "ok":
+        print(f"下載請求失敗: {resp.get('reason')}")
         time.sleep(2)
         return
-    temp_zip = "temp_game.zip"
-    if recv_file(client_socket, temp_zip):
+    if not ok:
+        print("檔案傳輸中斷")
+        if os.path.exists(temp_zip): os.remove(temp_zip)
+        input("按 Enter 繼續...")
+        return
+    if resp.get("mode") == "delta":
+        print(f"增量更新：{resp.get('changed', 0)} 個檔案變動，{len(resp.get('delete', []))} 個檔案移除")
+        try:
+            apply_delta(save_dir, temp_zip, resp.get("delete", []))
+            print(f"✅ 更新完成 (唯讀)！位置: {save_dir}")
+        except Exception as e: print(f"增量更新失敗: {e}")
+        finally:
+            if os.path.exists(temp_zip): os.remove(temp_zip)
+    else:
         print("檔案接收成功，正在安裝...")
         if os.path.exists(save_dir):
-            for root, dirs, files in os.walk(save_dir):
-                for f in files: os.chmod(os.path.join(root, f), stat.S_IWRITE)
+            set_writable(save_dir)
             import shutil
             shutil.rmtree(save_dir)
         os.makedirs(save_dir, exist_ok=True)
@@ -226,7 +360,6 @@ def process_download(detail):
         except Exception as e: print(f"解壓縮/設定權限失敗: {e}")
         finally: 
             if os.path.exists(temp_zip): os.remove(temp_zip)
-    else: print("檔案傳輸中斷")
     input("按 Enter 繼續...")
 
 def RoomList():
@@ -338,12 +471,14 @@ def room_loop():
     while True:
         try:
             try:
-                chunk = client_socket.recv(4096).decode('utf-8')
-                if chunk and '\n' in chunk:
-                    msgs = chunk.strip().split('\n')
-                    for m in msgs:
-                        try: handle_room_message(json.loads(m))
-                        except: pass
+                # 不完整的訊息會留在緩衝區，下次 timeout 後接著讀
+                msg = client_socket.read_json()
+                if msg is None:
+                    print("與伺服器的連線已中斷")
+                    curr_page = "Home"
+                    break
+                try: handle_room_message(msg)
+                except: pass
             except socket.timeout: pass
             except Exception as e:
                 print(f"連線異常: {e}")
@@ -437,6 +572,7 @@ def start():
                 elif curr_page == "GameList": GameList()
                 elif curr_page == "RoomList": RoomList()
                 elif curr_page == "CreateRoom": CreateRoom()
+                elif curr_page == "Login": Relogin()
             except Exception as e:
                 if str(e) == "GameFinished":
                     curr_page = "Home"
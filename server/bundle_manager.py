@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import zipfile
+import tempfile
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from common.util import file_sha256
+from server.db_manager import get_connection, bump_catalog_version
+
+# 預先打包好的下載檔，檔名為 {game_id}_{version}_{sha256 前 16 碼}.zip
+# 旁邊的 .manifest.json 記錄該版本每個檔案的 sha256，供增量更新比對
+STORAGE_DIR = os.path.join(os.path.dirname(__file__), 'storage')
+BUNDLE_DIR = os.path.join(STORAGE_DIR, '_bundles')
+
+# 只給 Server 使用、不隨遊戲發佈的檔案
+SERVER_ONLY_FILES = {"server_config.json"}
+# 固定 zip 內的時間戳，讓相同內容打包出相同的 hash
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+_manifest_cache = {}  # {bundle_name: {rel_path: sha256}}
+_sha_cache = {}       # {bundle_name: 整檔 sha256}，分塊下載時給 Client 驗證用
+
+def iter_bundle_files(game_dir):
+    """依固定順序列出要發佈給玩家的檔案 (abs_path, rel_path)"""
+    for root, dirs, files in os.walk(game_dir):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for file in sorted(files):
+            if file in SERVER_ONLY_FILES or file.endswith(".pyc"): continue
+            abs_file = os.path.join(root, file)
+            yield abs_file, os.path.relpath(abs_file, game_dir).replace(os.sep, '/')
+
+def manifest_path(bundle_name):
+    return os.path.join(BUNDLE_DIR, bundle_name[:-len(".zip")] + ".manifest.json")
+
+def _write_zip(raw, files):
+    """把 (abs_path, rel_path) 依序寫入 zip，回傳 {rel_path: sha256}"""
+    manifest = {}
+    with zipfile.ZipFile(raw, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for abs_file, rel_path in files:
+            info = zipfile.ZipInfo(rel_path, date_time=ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            h = hashlib.sha256()
+            with open(abs_file, 'rb') as src, zf.open(info, 'w') as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk: break
+                    h.update(chunk)
+                    dst.write(chunk)
+            manifest[rel_path] = h.hexdigest()
+    return manifest
+
+def build_bundle(game_dir, game_id, version, remove_old=True):
+    """
+    打包遊戲資料夾並以內容 hash 命名，回傳 bundle 檔名 (相對於 BUNDLE_DIR)。
+    remove_old=False 時保留舊版 bundle，由呼叫端在資料庫改指向新 bundle 之後再刪除。
+    """
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f"{game_id}_", suffix=".tmp", dir=BUNDLE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            manifest = _write_zip(raw, iter_bundle_files(game_dir))
+        digest = file_sha256(temp_path)
+        safe_version = re.sub(r'[^0-9A-Za-z.\-]', '_', str(version))
+        bundle_name = f"{game_id}_{safe_version}_{digest[:16]}.zip"
+        with open(manifest_path(bundle_name), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, os.path.join(BUNDLE_DIR, bundle_name))
+    finally:
+        if os.path.exists(temp_path): os.remove(temp_path)
+    _manifest_cache[bundle_name] = manifest
+    _sha_cache[bundle_name] = digest
+    if remove_old:
+        remove_old_bundles(game_id, keep=bundle_name)
+    print(f"[Bundle] Game {game_id} v{version} -> {bundle_name}")
+    return bundle_name
+
+def remove_old_bundles(game_id, keep):
+    """刪除同一遊戲的舊版 bundle (正在下載的舊檔在 POSIX 上仍可讀完)"""
+    if not os.path.isdir(BUNDLE_DIR): return
+    keep_names = {keep, os.path.basename(manifest_path(keep))}
+    for name in os.listdir(BUNDLE_DIR):
+        if not name.startswith(f"{game_id}_") or name in keep_names: continue
+        if not (name.endswith(".zip") or name.endswith(".manifest.json")): continue
+        _manifest_cache.pop(name, None)
+        _sha_cache.pop(name, None)
+        try: os.remove(os.path.join(BUNDLE_DIR, name))
+        except OSError: pass
+
+def remove_bundle(bundle_name):
+    """刪除一個 bundle 與它的 manifest (上架失敗時清掉剛建好的新檔)"""
+    _manifest_cache.pop(bundle_name, None)
+    _sha_cache.pop(bundle_name, None)
+    for path in (os.path.join(BUNDLE_DIR, bundle_name), manifest_path(bundle_name)):
+        try: os.remove(path)
+        except OSError: pass
+
+def bundle_sha256(bundle_path):
+    """bundle 整檔的 sha256 (內容不會變，算過一次就快取)"""
+    bundle_name = os.path.basename(bundle_path)
+    digest = _sha_cache.get(bundle_name)
+    if digest is None:
+        digest = _sha_cache[bundle_name] = file_sha256(bundle_path)
+    return digest
+
+def load_manifest(bundle_path, game_dir):
+    """取得 bundle 對應的檔案 hash 清單；舊 bundle 沒有 manifest 時由遊戲資料夾補算"""
+    bundle_name = os.path.basename(bundle_path)
+    manifest = _manifest_cache.get(bundle_name)
+    if manifest is not None: return manifest
+    path = manifest_path(bundle_name)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {rel: file_sha256(abs_file) for abs_file, rel in iter_bundle_files(game_dir)}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+    _manifest_cache[bundle_name] = manifest
+    return manifest
+
+def diff_manifest(server_manifest, client_manifest):
+    """回傳 (需要傳送的檔案, 需要刪除的檔案)"""
+    changed = sorted(rel for rel, digest in server_manifest.items() if client_manifest.get(rel) != digest)
+    deleted = sorted(rel for rel in client_manifest if rel not in server_manifest)
+    return changed, deleted
+
+def build_delta(game_dir, rel_paths):
+    """只打包變動的檔案到暫存 zip，回傳路徑 (呼叫端負責刪除)"""
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix="delta_", suffix=".tmp", dir=BUNDLE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            _write_zip(raw, [(os.path.join(game_dir, *rel.split('/')), rel) for rel in rel_paths])
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def _lock_for(game_id):
+    with _build_locks_guard:
+        return _build_locks.setdefault(game_id, threading.Lock())
+
+def ensure_bundle(game_info):
+    """
+    取得遊戲目前版本的 bundle 完整路徑。
+    舊資料 (上架時尚未預先打包) 會在第一次下載時補建並寫回資料庫，之後直接重用。
+    """
+    bundle_name = game_info.get('bundle_path')
+    if bundle_name and os.path.exists(os.path.join(BUNDLE_DIR, bundle_name)):
+        return os.path.join(BUNDLE_DIR, bundle_name)
+
+    game_id = game_info['game_id']
+    with _lock_for(game_id):
+        # 等鎖期間可能已被其他執行緒建好
+        db = get_connection()
+        c = db.cursor()
+        c.execute("SELECT bundle_path, version, file_path FROM games WHERE game_id=?", (game_id,))
+        row = c.fetchone()
+        db.close()
+        if not row: return None
+        bundle_name, version, folder_name = row
+        if bundle_name and os.path.exists(os.path.join(BUNDLE_DIR, bundle_name)):
+            return os.path.join(BUNDLE_DIR, bundle_name)
+
+        game_dir = os.path.join(STORAGE_DIR, folder_name)
+        if not folder_name or not os.path.isdir(game_dir): return None
+        bundle_name = build_bundle(game_dir, game_id, version)
+        db = get_connection()
+        c = db.cursor()
+        c.execute("UPDATE games SET bundle_path=? WHERE game_id=? AND version=?", (bundle_name, game_id, version))
+        bump_catalog_version(c)
+        db.commit()
+        db.close()
+        return os.path.join(BUNDLE_DIR, bundle_name)
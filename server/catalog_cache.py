@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from common.util import encode_message
+from server.db_manager import get_connection, get_catalog_version
+
+# 兩次檢查 catalog_version 之間的最短間隔 (秒)；上架/下架後最多延遲這麼久才會看到
+CHECK_INTERVAL = 0.5
+
+GAME_COLUMNS = "game_id, name, version, description, game_type, min_players, max_players, file_path, status, dev_id, bundle_path"
+
+def _row_to_info(row):
+    return {
+        "game_id": row[0], "name": row[1], "version": row[2],
+        "description": row[3], "type": row[4], "min_players": row[5],
+        "max_players": row[6], "file_path": row[7], "status": row[8],
+        "dev_id": row[9], "bundle_path": row[10]
+    }
+
+class CatalogCache:
+    """
+    Lobby 端的遊戲目錄快取。
+    games 只在 dev_server 上架/下架 (或補建 bundle) 時變動，這些操作會把
+    catalog_version +1；這裡只比對版本號，有變動才整批重新讀取 games，
+    list_games 的回應也依 (protocol, codec) 預先編碼好直接送出。
+    """
+    def __init__(self, check_interval=CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+        self.games = {}     # {game_id: info}
+        self.listing = []   # list_games 的 games 欄位
+        self.encoded = {}   # {(protocol, codec): bytes}
+
+    def invalidate(self):
+        """本 process 自己改了 games 時呼叫，下次存取立即重新檢查"""
+        with self.lock:
+            self.checked_at = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.version is not None and now - self.checked_at < self.check_interval: return
+            self.checked_at = now
+            version = get_catalog_version()
+            if version == self.version: return
+            db = get_connection()
+            c = db.cursor()
+            c.execute(f"SELECT {GAME_COLUMNS} FROM games ORDER BY game_id")
+            rows = c.fetchall()
+            db.close()
+            self.games = {row[0]: _row_to_info(row) for row in rows}
+            self.listing = [{"id": g["game_id"], "name": g["name"], "version": g["version"],
+                             "info": g["description"], "min": g["min_players"], "max": g["max_players"]}
+                            for g in self.games.values() if g["status"] == 'active']
+            self.encoded = {}
+            self.version = version
+            print(f"[Catalog] Loaded {len(self.games)} games (version {version})")
+
+    def get(self, game_id):
+        """回傳遊戲資料的副本，找不到時回傳 None"""
+        self._refresh()
+        try:
+            info = self.games.get(int(game_id))
+        except (TypeError, ValueError):
+            return None
+        return dict(info) if info else None
+
+    def list_games_message(self, protocol, codec):
+        """已編碼好的 list_games 回應 (可直接 sendall)"""
+        self._refresh()
+        with self.lock:
+            key = (protocol, codec)
+            payload = self.encoded.get(key)
+            if payload is None:
+                payload = self.encoded[key] = encode_message({"status": "ok", "games": self.listing}, protocol, codec)
+            return payload
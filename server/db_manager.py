@@ -1,13 +1,63 @@
 import sqlite3
 import os
 import sys
+import threading
 
 # 資料庫檔案路徑
 DB_PATH = os.path.join(os.path.dirname(__file__), 'db', 'game_store.db')
 
+BUSY_TIMEOUT = 5.0          # 秒；寫入衝突時等待鎖而不是立即失敗
+STATEMENT_CACHE_SIZE = 256  # 每條連線快取的 prepared statement 數量
+
+_local = threading.local()
+
+class PooledConnection:
+    """
+    執行緒專屬的 SQLite 連線。
+    close() 不會真的關閉，只會回滾未提交的交易，讓同一執行緒下次直接重用
+    (省去開檔、解析 schema 與重新 prepare statement 的成本)。
+    """
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+def _open_connection(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE)
+    # WAL：讀寫互不阻塞，lobby_server 與 dev_server 兩個 process 可同時存取
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+    return conn
+
 def get_connection():
-    """取得資料庫連線"""
-    return sqlite3.connect(DB_PATH)
+    """取得目前執行緒的資料庫連線 (每個執行緒只開一次，之後重複使用)"""
+    pooled = getattr(_local, 'conn', None)
+    if pooled is None or _local.path != DB_PATH:
+        close_connection()
+        pooled = PooledConnection(_open_connection(DB_PATH))
+        _local.conn = pooled
+        _local.path = DB_PATH
+    return pooled
+
+def close_connection():
+    """真正關閉目前執行緒的快取連線"""
+    pooled = getattr(_local, 'conn', None)
+    if pooled is not None:
+        pooled._conn.close()
+        _local.conn = None
 
 def init_db():
     """初始化資料庫：建立所需表格"""
@@ -29,7 +79,8 @@ def init_db():
         server_exe TEXT,
         client_exe TEXT,
         file_path TEXT,
-        status TEXT DEFAULT 'active'
+        status TEXT DEFAULT 'active',
+        bundle_path TEXT
     )''')
     
     # 建立 Reviews Table
@@ -62,11 +113,60 @@ def init_db():
         username TEXT PRIMARY KEY,
         password TEXT NOT NULL
     )''')
+
+    # 遊戲目錄版本：dev_server 上架/下架時在同一個交易內 +1，
+    # lobby_server 的目錄快取看到版本變動才重新讀取 games
+    c.execute('''CREATE TABLE IF NOT EXISTS catalog_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )''')
+    c.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)")
+
+    migrate_db(c)
     
     conn.commit()
     conn.close()
     print("[DB] Database initialized successfully.")
 
+def _ensure_column(c, table, column, decl):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        print(f"[DB] Migrated: {table}.{column} added")
+
+def _table_exists(c, table):
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return c.fetchone() is not None
+
+def migrate_db(c):
+    """舊版資料庫升級 (重複執行不會有副作用)"""
+    # 預先打包好的下載檔 (見 server/bundle_manager.py)
+    _ensure_column(c, 'games', 'bundle_path', 'TEXT')
+
+    # 評論與遊玩紀錄都以 game_id 查詢；評論另外依時間取最新幾筆
+    c.execute("CREATE INDEX IF NOT EXISTS idx_reviews_game_time ON reviews (game_id, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_play_history_game_player ON play_history (game_id, player_id)")
+
+    # 每款遊戲的評分統計，評分時與 reviews 在同一個交易內更新 (見 add_review_stats)
+    if not _table_exists(c, 'game_stats'):
+        c.execute('''CREATE TABLE game_stats (
+            game_id INTEGER PRIMARY KEY,
+            score_sum INTEGER NOT NULL DEFAULT 0,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            s1 INTEGER NOT NULL DEFAULT 0,
+            s2 INTEGER NOT NULL DEFAULT 0,
+            s3 INTEGER NOT NULL DEFAULT 0,
+            s4 INTEGER NOT NULL DEFAULT 0,
+            s5 INTEGER NOT NULL DEFAULT 0
+        )''')
+        # 舊資料庫：由既有評論補算
+        c.execute('''INSERT INTO game_stats (game_id, score_sum, review_count, s1, s2, s3, s4, s5)
+                     SELECT game_id, SUM(score), COUNT(*),
+                            SUM(score = 1), SUM(score = 2), SUM(score = 3), SUM(score = 4), SUM(score = 5)
+                     FROM reviews WHERE game_id IS NOT NULL GROUP BY game_id''')
+        if c.rowcount > 0:
+            print(f"[DB] Migrated: game_stats backfilled for {c.rowcount} games")
+
 def reset_db():
     """重置資料庫"""
     print("[DB] Resetting database... (ALL DATA WILL BE LOST)")
@@ -78,6 +178,8 @@ def reset_db():
         c.execute("DROP TABLE IF EXISTS play_history")
         c.execute("DROP TABLE IF EXISTS developers")
         c.execute("DROP TABLE IF EXISTS players")
+        c.execute("DROP TABLE IF EXISTS catalog_version")
+        c.execute("DROP TABLE IF EXISTS game_stats")
         conn.commit()
         print("[DB] All tables dropped.")
     except Exception as e:
@@ -86,6 +188,29 @@ def reset_db():
         conn.close()
     init_db()
 
+# --- Catalog Version ---
+
+def bump_catalog_version(c):
+    """games 有變動時呼叫 (與變動放在同一個交易，由呼叫端 commit)"""
+    c.execute("UPDATE catalog_version SET version = version + 1 WHERE id=1")
+
+def get_catalog_version():
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT version FROM catalog_version WHERE id=1")
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+# --- Review Stats ---
+
+def add_review_stats(c, game_id, score):
+    """新增一筆評分到 game_stats (score 必須是 1-5 的整數，由呼叫端 commit)"""
+    column = f"s{score}"
+    c.execute("INSERT OR IGNORE INTO game_stats (game_id) VALUES (?)", (game_id,))
+    c.execute(f"UPDATE game_stats SET score_sum = score_sum + ?, review_count = review_count + 1, "
+              f"{column} = {column} + 1 WHERE game_id=?", (score, game_id))
+
 # --- Auth Helpers ---
 
 def register_user(role, username, password):
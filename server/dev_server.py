@@ -3,18 +3,22 @@ import threading
 import json
 import os
 import shutil
+import tempfile
 import zipfile
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..')) 
 
-from common.util import safe_socket_op, load_system_config, send_json, recv_json, recv_file, compare_versions
-from server.db_manager import get_connection, init_db, verify_user, register_user
+from common.util import safe_socket_op, load_system_config, send_json, recv_json, recv_file, compare_versions, BufferedSocket, choose_protocol, set_protocol, resume_offset, recv_chunks, TRANSFER_CHUNK_SIZE
+from server.db_manager import get_connection, init_db, verify_user, register_user, bump_catalog_version
+from server.bundle_manager import build_bundle, remove_old_bundles, remove_bundle
 
 # 設定
 config = load_system_config()
 HOST = config.get("HOST", "127.0.0.1")
 PORT = config.get("DEV_PORT", 8889) 
 STORAGE_DIR = os.path.join(os.path.dirname(__file__), 'storage')
+# 可續傳上傳的暫存區，檔名含整檔 sha256，同一份檔案重傳時從已驗證的位置接續
+PARTIAL_DIR = os.path.join(STORAGE_DIR, '_partial')
 
 ONLINE_DEVS = {} # { username: conn }
 
@@ -23,12 +27,18 @@ def handle_auth_login(conn, data):
     password = data.get("password")
     
     if verify_user('dev', username, password):
-        if username in ONLINE_DEVS:
-            send_json(conn, {"status": "error", "reason": "帳號已在其他裝置登入"})
-            return None
+        old = ONLINE_DEVS.get(username)
         ONLINE_DEVS[username] = conn
-        print(f"[Auth] Developer '{username}' logged in.")
-        send_json(conn, {"status": "ok", "username": username})
+        if old is not None and old is not conn:
+            # 同一帳號重新登入 (例如上傳中斷後重連)：中斷舊連線，讓它的執行緒結束並由新連線取代
+            print(f"[Auth] Developer '{username}' logged in again, closing the previous session.")
+            try: old.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+        protocol, codec = choose_protocol(data)
+        print(f"[Auth] Developer '{username}' logged in. (protocol v{protocol}/{codec})")
+        # 回覆仍使用 v1，送出後才切換協定
+        send_json(conn, {"status": "ok", "username": username, "protocol": protocol, "codec": codec})
+        set_protocol(conn, protocol, codec)
         return username
     else:
         send_json(conn, {"status": "error", "reason": "帳號或密碼錯誤"})
@@ -63,6 +73,34 @@ def handle_list_my_games(conn, dev_id):
     send_json(conn, {"status": "ok", "games": games})
     db.close()
 
+def recv_upload_chunks(conn, dev_id, transfer, temp_zip_path):
+    """可續傳上傳：回覆續傳位置後接收分塊，驗證完成的檔案移到 temp_zip_path"""
+    try:
+        total_size = int(transfer["size"])
+        expected_sha = str(transfer["sha256"]).lower()
+        if total_size < 0 or len(expected_sha) != 64 or any(ch not in "0123456789abcdef" for ch in expected_sha):
+            raise ValueError(transfer)
+    except (KeyError, TypeError, ValueError):
+        send_json(conn, {"status": "error", "reason": "Invalid transfer info"})
+        return False
+
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    part_path = os.path.join(PARTIAL_DIR, f"upload_{dev_id}_{expected_sha[:16]}.part")
+    offset = min(resume_offset(part_path), total_size)
+    if offset:
+        print(f"[Upload] Resuming {dev_id}'s upload at {offset}/{total_size} bytes")
+    send_json(conn, {"status": "ready", "offset": offset, "chunk_size": TRANSFER_CHUNK_SIZE})
+
+    if not recv_chunks(conn, part_path, offset, total_size, expected_sha):
+        send_json(conn, {"status": "error", "reason": "File transfer failed",
+                         "resumable": os.path.exists(part_path)})
+        # 中斷後串流位置已不可靠，直接結束連線，由 Client 重連續傳
+        try: conn.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+        return False
+    os.replace(part_path, temp_zip_path)
+    return True
+
 def handle_upload_game(conn, dev_id, data):
     game_conf = data.get("config")
     is_update = data.get("is_update", False)
@@ -86,54 +124,92 @@ def handle_upload_game(conn, dev_id, data):
     temp_zip_path = os.path.join(STORAGE_DIR, f"temp_{dev_id}.zip")
     os.makedirs(STORAGE_DIR, exist_ok=True)
     
-    if not recv_file(conn, temp_zip_path):
+    transfer = data.get("transfer")
+    if transfer:
+        if not recv_upload_chunks(conn, dev_id, transfer, temp_zip_path): return
+    elif not recv_file(conn, temp_zip_path):
         send_json(conn, {"status": "error", "reason": "File transfer failed"})
         return
 
     db = get_connection()
     c = db.cursor()
+    game_id = None
+    new_game = False
+    staging_dir = backup_dir = target_dir = bundle_name = None
+    swapped = committed = False
     try:
-        final_game_folder_name = ""
         if is_update and game_id_to_update:
             # Check version again
-            c.execute("SELECT version FROM games WHERE game_id=?", (game_id_to_update,))
+            c.execute("SELECT version FROM games WHERE game_id=? AND dev_id=?", (game_id_to_update, dev_id))
             row = c.fetchone()
-            if row and compare_versions(new_version, row[0]) <= 0:
+            if not row:
+                raise ValueError("Game not found or permission denied")
+            if compare_versions(new_version, row[0]) <= 0:
                  raise ValueError(f"版本號必須大於當前版本")
-
-            c.execute('''UPDATE games SET version=?, description=?, server_exe=?, client_exe=?, 
-                         game_type=?, min_players=?, max_players=?, status='active' 
-                         WHERE game_id=? AND dev_id=?''',
-                      (new_version, game_conf['description'], 
-                       game_conf['server_entry'], game_conf['client_entry'], 
-                       game_conf['game_type'], game_conf['min_players'], game_conf['max_players'],
-                       game_id_to_update, dev_id))
             game_id = game_id_to_update
-            final_game_folder_name = f"{game_id}_{game_conf['game_name']}"
         else:
-            c.execute('''INSERT INTO games (dev_id, name, description, version, game_type, min_players, max_players, server_exe, client_exe, file_path) 
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            # 先取得 game_id (資料夾與 bundle 以它命名)；'uploading' 不會出現在大廳列表，也不更新目錄版本
+            c.execute('''INSERT INTO games (dev_id, name, description, version, game_type, min_players, max_players, server_exe, client_exe, file_path, status) 
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'uploading')''',
                       (dev_id, game_conf['game_name'], game_conf['description'], new_version,
                        game_conf['game_type'], game_conf['min_players'], game_conf['max_players'],
                        game_conf['server_entry'], game_conf['client_entry'], ""))
             game_id = c.lastrowid
-            final_game_folder_name = f"{game_id}_{game_conf['game_name']}"
-            c.execute("UPDATE games SET file_path=? WHERE game_id=?", (final_game_folder_name, game_id))
-
-        db.commit()
+            new_game = True
+            db.commit()
+        final_game_folder_name = f"{game_id}_{game_conf['game_name']}"
         target_dir = os.path.join(STORAGE_DIR, final_game_folder_name)
-        if os.path.exists(target_dir): shutil.rmtree(target_dir)
-        os.makedirs(target_dir, exist_ok=True)
+
+        # 解壓與打包都在暫存資料夾完成，正式資料夾與資料庫在這段期間仍是舊版
+        staging_dir = tempfile.mkdtemp(prefix="_staging_", dir=STORAGE_DIR)
         with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
-            zip_ref.extractall(target_dir)
+            zip_ref.extractall(staging_dir)
+        # 上架時就打包好玩家下載用的 bundle，下載時不必每次重新壓縮
+        bundle_name = build_bundle(staging_dir, game_id, new_version, remove_old=False)
+
+        # 換上新資料夾後立刻更新資料庫 (版本、資料夾、bundle 一起 commit，目錄版本只加一次)
+        if os.path.exists(target_dir):
+            backup_dir = tempfile.mkdtemp(prefix="_old_", dir=STORAGE_DIR)
+            os.rmdir(backup_dir)
+            os.replace(target_dir, backup_dir)
+        os.replace(staging_dir, target_dir)
+        staging_dir = None
+        swapped = True
+        c.execute('''UPDATE games SET version=?, description=?, server_exe=?, client_exe=?, 
+                     game_type=?, min_players=?, max_players=?, status='active', file_path=?, bundle_path=? 
+                     WHERE game_id=? AND dev_id=?''',
+                  (new_version, game_conf['description'], 
+                   game_conf['server_entry'], game_conf['client_entry'], 
+                   game_conf['game_type'], game_conf['min_players'], game_conf['max_players'],
+                   final_game_folder_name, bundle_name, game_id, dev_id))
+        bump_catalog_version(c)
+        db.commit()
+        committed = True
+
+        remove_old_bundles(game_id, keep=bundle_name)
         print(f"[Upload] Game {game_id} updated to v{new_version}")
         send_json(conn, {"status": "ok", "game_id": game_id})
     except Exception as e:
         print(f"[Upload Error] {e}")
+        if not committed:
+            # 還原：資料庫維持舊版，放回舊資料夾，刪掉這次建好的 bundle
+            db.rollback()
+            if swapped:
+                shutil.rmtree(target_dir, ignore_errors=True)
+                if backup_dir:
+                    os.replace(backup_dir, target_dir)
+                    backup_dir = None
+            if bundle_name:
+                remove_bundle(bundle_name)
+            if new_game:
+                c.execute("DELETE FROM games WHERE game_id=? AND status='uploading'", (game_id,))
+                db.commit()
         send_json(conn, {"status": "error", "reason": str(e)})
     finally:
         db.close()
         if os.path.exists(temp_zip_path): os.remove(temp_zip_path)
+        if staging_dir: shutil.rmtree(staging_dir, ignore_errors=True)
+        if backup_dir: shutil.rmtree(backup_dir, ignore_errors=True)
 
 def handle_remove_game(conn, dev_id, data):
     game_id = data.get("game_id")
@@ -141,6 +217,7 @@ def handle_remove_game(conn, dev_id, data):
     c = db.cursor()
     c.execute("UPDATE games SET status='inactive' WHERE game_id=? AND dev_id=?", (game_id, dev_id))
     if c.rowcount > 0:
+        bump_catalog_version(c)
         send_json(conn, {"status": "ok"})
     else:
         send_json(conn, {"status": "error", "reason": "Game not found or permission denied"})
@@ -150,6 +227,7 @@ def handle_remove_game(conn, dev_id, data):
 @safe_socket_op
 def handle_client(conn, addr):
     print(f"[DevServer] Connection from {addr}")
+    conn = BufferedSocket(conn)
     current_user = None
     
     try:
@@ -179,7 +257,8 @@ def handle_client(conn, addr):
                 send_json(conn, {"status": "error", "reason": "Unknown command"})
 
     finally:
-        if current_user and current_user in ONLINE_DEVS:
+        # 已被同帳號的新連線取代時不要移除新的登入
+        if current_user and ONLINE_DEVS.get(current_user) is conn:
             del ONLINE_DEVS[current_user]
         conn.close()
 
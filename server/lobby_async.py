@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import json
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from common.util import PROTOCOL_V1, PROTOCOL_V2, FRAME_HEADER, MAX_FRAME_SIZE, decode_frame
+
+# 單行 JSON 請求的長度上限 (asyncio StreamReader 預設只有 64 KB)
+MAX_LINE_SIZE = 1024 * 1024
+# worker 執行緒等待對方收完資料的最長時間，避免卡死的連線佔住執行緒池
+SEND_TIMEOUT = 10
+
+class AsyncConnection:
+    """
+    asyncio stream 的轉接物件，提供與 socket 相同的 sendall/close，
+    讓 lobby_server 既有的 handler 不需修改即可在執行緒池中執行。
+    """
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.loop_thread = threading.get_ident()
+        self.closed = False
+        self.wire_protocol = PROTOCOL_V1
+        self.wire_codec = "json"
+
+    def sendall(self, data):
+        if self.closed:
+            raise BrokenPipeError("connection closed")
+        if threading.get_ident() == self.loop_thread:
+            self.writer.write(data)
+            return
+        # 從 worker 執行緒寫入：交給 event loop，並等待 drain 做流量控制
+        future = asyncio.run_coroutine_threadsafe(self._write(data), self.loop)
+        future.result(timeout=SEND_TIMEOUT)
+
+    async def _write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def sendfile(self, file, offset=0, count=None):
+        """交給 loop.sendfile，在支援的平台上直接由 kernel 傳送檔案內容"""
+        if self.closed:
+            raise BrokenPipeError("connection closed")
+        future = asyncio.run_coroutine_threadsafe(self._sendfile(file, offset, count), self.loop)
+        # 大檔傳送時間不固定，這裡不設 timeout；對方斷線時 transport 會拋出錯誤
+        return future.result()
+
+    async def _sendfile(self, file, offset, count):
+        await self.writer.drain()
+        return await self.loop.sendfile(self.writer.transport, file, offset, count)
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+async def read_request(reader, conn):
+    """依連線目前的協定讀取一則請求，連線關閉時回傳 None"""
+    if conn.wire_protocol == PROTOCOL_V2:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        size, ftype = FRAME_HEADER.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise ValueError(f"frame 過大: {size} bytes")
+        payload = await reader.readexactly(size)
+        return decode_frame(ftype, payload)
+    line = await reader.readline()
+    if not line: return None
+    return json.loads(line)
+
+async def handle_connection(reader, writer, executor, dispatch, on_disconnect, clients):
+    loop = asyncio.get_running_loop()
+    addr = writer.get_extra_info('peername')
+    print(f"[Connect] {addr} connected")
+    conn = AsyncConnection(loop, writer)
+    clients[addr] = conn
+    current_user = None
+
+    try:
+        while True:
+            try:
+                req = await read_request(reader, conn)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except (ValueError, asyncio.LimitOverrunError) as e:
+                # json.JSONDecodeError 也是 ValueError
+                print(f"[Recv Error] {e}")
+                break
+            if not req: break
+            # 同一條連線的請求依序處理；DB 與阻塞操作交給執行緒池
+            try:
+                current_user = await loop.run_in_executor(executor, dispatch, conn, req, addr, current_user)
+            except Exception as e:
+                print(f"[Error] 未預期錯誤: {e}")
+                break
+    finally:
+        print(f"[Disconnect] {addr} (User: {current_user})")
+        try:
+            await loop.run_in_executor(executor, on_disconnect, conn, current_user)
+        except Exception as e:
+            print(f"[Error] 斷線清理失敗: {e}")
+        conn.close()
+        clients.pop(addr, None)
+
+def raise_fd_limit():
+    """盡量調高可開啟的檔案數，讓大量閒置連線不會撞到預設的 1024 上限"""
+    try:
+        import resource
+    except ImportError:
+        return  # Windows
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
+async def serve(host, port, dispatch, on_disconnect, backlog, workers, clients):
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lobby-worker")
+
+    def on_client(reader, writer):
+        return handle_connection(reader, writer, executor, dispatch, on_disconnect, clients)
+
+    server = await asyncio.start_server(on_client, host, port, backlog=backlog,
+                                        limit=MAX_LINE_SIZE, reuse_address=True)
+    print(f"=== Lobby Server (asyncio) Running on {host}:{port} (backlog={backlog}, workers={workers}) ===")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False)
+
+def start_async_server(host, port, dispatch, on_disconnect, backlog=128, workers=16, clients=None):
+    """
+    以單一 event loop 服務所有 Lobby 連線。
+    dispatch(conn, req, addr, current_user) 與 on_disconnect(conn, current_user)
+    由 lobby_server 傳入，兩種引擎共用同一套指令處理邏輯。
+    """
+    raise_fd_limit()
+    try:
+        asyncio.run(serve(host, port, dispatch, on_disconnect, backlog, workers,
+                          clients if clients is not None else {}))
+    except KeyboardInterrupt:
+        print("Server stopping...")
+    except Exception as e:
+        print(f"Server Error: {e}")
@@ -6,17 +6,23 @@ import sys
 import os
 import subprocess
 import shutil
+import argparse
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..')) 
 
-from common.util import safe_socket_op, load_system_config, send_json, recv_json, send_file, compare_versions
-from server.db_manager import get_connection, verify_user, register_user
+from common.util import safe_socket_op, load_system_config, send_json, recv_json, send_file, compare_versions, BufferedSocket, choose_protocol, set_protocol, PROTOCOL_V1, file_sha256, send_chunks, TRANSFER_CHUNK_SIZE
+from server.db_manager import get_connection, init_db, verify_user, register_user, add_review_stats
+from server.catalog_cache import CatalogCache
+from server.bundle_manager import ensure_bundle, bundle_sha256, load_manifest, diff_manifest, build_delta
 
 # ================= 設定區 =================
 config = load_system_config()
 HOST = config.get("HOST", "127.0.0.1")
 PORT = config.get("LOBBY_PORT", 8888)
 STORAGE_DIR = os.path.join(os.path.dirname(__file__), 'storage')
+ENGINE = config.get("LOBBY_ENGINE", "thread")
+BACKLOG = config.get("LOBBY_BACKLOG", 128)
+DB_WORKERS = config.get("LOBBY_DB_WORKERS", 16)
 
 # ================= 全域變數 =================
 CLIENTS = {}   
@@ -27,6 +33,7 @@ ONLINE_PLAYERS = {}
 FREE_PORTS = list(range(9000, 9100))
 USED_PORTS = set()
 LOCK = threading.RLock()
+CATALOG = CatalogCache()  # games 的記憶體快取，dev_server 上架/下架時自動失效
 
 def get_free_port():
     with LOCK:
@@ -44,19 +51,7 @@ def release_port(port):
 
 # ================= 資料庫輔助 =================
 def get_game_info(game_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT game_id, name, version, description, game_type, min_players, max_players, file_path, status, dev_id FROM games WHERE game_id=?", (game_id,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        return {
-            "game_id": row[0], "name": row[1], "version": row[2], 
-            "description": row[3], "type": row[4], "min_players": row[5], 
-            "max_players": row[6], "file_path": row[7], "status": row[8],
-            "dev_id": row[9]
-        }
-    return None
+    return CATALOG.get(game_id)
 
 def get_game_file_path(game_id):
     info = get_game_info(game_id)
@@ -86,12 +81,17 @@ def handle_auth_login(conn, data):
     password = data.get("password")
     if verify_user('player', username, password):
         with LOCK:
-            if username in ONLINE_PLAYERS:
-                send_json(conn, {"status": "error", "reason": "帳號已在其他裝置登入"})
-                return None
+            old = ONLINE_PLAYERS.get(username)
             ONLINE_PLAYERS[username] = conn
-        print(f"[Auth] Player '{username}' logged in.")
-        send_json(conn, {"status": "ok", "username": username})
+        if old is not None and old is not conn:
+            # 同一帳號重新登入 (例如斷線後重連)：舊連線的執行緒可能還卡在 recv/send，中斷它並由新連線取代
+            print(f"[Auth] Player '{username}' logged in again, closing the previous session.")
+            close_session(old)
+        protocol, codec = choose_protocol(data)
+        print(f"[Auth] Player '{username}' logged in. (protocol v{protocol}/{codec})")
+        # 回覆仍使用 v1，送出後才切換協定
+        send_json(conn, {"status": "ok", "username": username, "protocol": protocol, "codec": codec})
+        set_protocol(conn, protocol, codec)
         return username
     else:
         send_json(conn, {"status": "error", "reason": "帳號或密碼錯誤"})
@@ -113,18 +113,11 @@ def handle_auth_register(conn, data):
 # ================= 遊戲邏輯 =================
 
 def handle_list_games(conn):
-    db = get_connection()
-    c = db.cursor()
-    c.execute("SELECT game_id, name, version, description, min_players, max_players FROM games WHERE status='active'")
-    rows = c.fetchall()
-    db.close()
-    games = []
-    for r in rows:
-        games.append({
-            "id": r[0], "name": r[1], "version": r[2], 
-            "info": r[3], "min": r[4], "max": r[5]
-        })
-    send_json(conn, {"status": "ok", "games": games})
+    payload = CATALOG.list_games_message(getattr(conn, 'wire_protocol', PROTOCOL_V1), getattr(conn, 'wire_codec', "json"))
+    try:
+        conn.sendall(payload)
+    except Exception as e:
+        print(f"[Send Error] {e}")
 
 def handle_get_game_detail(conn, data):
     game_id = data.get("game_id")
@@ -134,10 +127,10 @@ def handle_get_game_detail(conn, data):
         return
     db = get_connection()
     c = db.cursor()
-    c.execute("SELECT AVG(score), COUNT(*) FROM reviews WHERE game_id=?", (game_id,))
-    row = c.fetchone()
-    avg_score = row[0] if row[0] is not None else 0.0
-    review_count = row[1]
+    c.execute("SELECT score_sum, review_count, s1, s2, s3, s4, s5 FROM game_stats WHERE game_id=?", (game_id,))
+    row = c.fetchone() or (0, 0, 0, 0, 0, 0, 0)
+    score_sum, review_count = row[0], row[1]
+    avg_score = score_sum / review_count if review_count else 0.0
     c.execute("SELECT player_id, score, comment, timestamp FROM reviews WHERE game_id=? ORDER BY timestamp DESC LIMIT 5", (game_id,))
     rows = c.fetchall()
     comments = []
@@ -148,7 +141,8 @@ def handle_get_game_detail(conn, data):
         "id": info['game_id'], "name": info['name'], "version": info['version'],
         "description": info['description'], "dev_id": info['dev_id'], "type": info['type'],
         "min_players": info['min_players'], "max_players": info['max_players'],
-        "avg_score": round(avg_score, 1), "review_count": review_count, "comments": comments
+        "avg_score": round(avg_score, 1), "review_count": review_count,
+        "score_histogram": list(row[2:]), "comments": comments
     }
     send_json(conn, {"status": "ok", "detail": detail})
 
@@ -157,18 +151,20 @@ def handle_rate_game(conn, data):
     player_name = data.get("player_name")
     score = data.get("score")
     comment = data.get("comment", "")
-    if not (1 <= score <= 5):
+    if score not in (1, 2, 3, 4, 5):
         send_json(conn, {"status": "error", "reason": "分數必須在 1-5 之間"})
         return
+    score = int(score)
     db = get_connection()
     c = db.cursor()
-    c.execute("SELECT COUNT(*) FROM play_history WHERE game_id=? AND player_id=?", (game_id, player_name))
-    if c.fetchone()[0] == 0:
+    c.execute("SELECT 1 FROM play_history WHERE game_id=? AND player_id=? LIMIT 1", (game_id, player_name))
+    if c.fetchone() is None:
         db.close()
         send_json(conn, {"status": "error", "reason": "未玩過此遊戲，無法評分！"})
         return
     try:
         c.execute("INSERT INTO reviews (game_id, player_id, score, comment) VALUES (?, ?, ?, ?)", (game_id, player_name, score, comment))
+        add_review_stats(c, game_id, score)
         db.commit()
         send_json(conn, {"status": "ok"})
     except Exception as e:
@@ -178,27 +174,67 @@ def handle_rate_game(conn, data):
 
 def handle_download_game(conn, data):
     game_id = data.get("game_id")
-    game_path = get_game_file_path(game_id)
-    if not game_path or not os.path.exists(game_path):
+    info = get_game_info(game_id)
+    try:
+        bundle = ensure_bundle(info) if info else None
+    except Exception as e:
+        print(f"[Download Error] {e}")
+        bundle = None
+    if not bundle:
         send_json(conn, {"status": "error", "reason": "Game files not found on server"})
         return
-    print(f"[Download] Preparing download for Game {game_id}...")
-    import zipfile
-    temp_zip = f"temp_download_{game_id}.zip"
+    if os.path.basename(bundle) != info.get('bundle_path'):
+        CATALOG.invalidate()  # 剛補建 bundle，讓快取重新讀取 bundle_path
+    client_manifest = data.get("manifest")
+    if data.get("mode") == "delta" and isinstance(client_manifest, dict):
+        handle_delta_download(conn, data, info, bundle, client_manifest)
+        return
+    print(f"[Download] Sending {os.path.basename(bundle)} for Game {game_id}...")
+    send_download(conn, data, {"status": "ok", "game_id": game_id, "mode": "full"}, bundle, bundle_sha256(bundle))
+
+def send_download(conn, data, resp, file_path, file_sha=None):
+    """
+    回覆 resp 後傳送檔案。
+    Client 要求 chunked 時改用分塊傳輸並附上 size/sha256；
+    帶來的 resume.sha256 與這次檔案相同時，從 Client 已收到的 offset 續傳。
+    """
+    if not data.get("chunked"):
+        send_json(conn, resp)
+        send_file(conn, file_path)
+        return
+    total_size = os.path.getsize(file_path)
+    file_sha = file_sha or file_sha256(file_path)
+    resume = data.get("resume")
+    offset = 0
+    if isinstance(resume, dict) and resume.get("sha256") == file_sha:
+        try:
+            offset = min(max(int(resume.get("offset", 0)), 0), total_size)
+        except (TypeError, ValueError):
+            offset = 0
+        offset -= offset % TRANSFER_CHUNK_SIZE
+        if offset: print(f"[Download] Resuming at {offset}/{total_size} bytes")
+    resp["transfer"] = {"size": total_size, "sha256": file_sha, "offset": offset,
+                        "chunk_size": TRANSFER_CHUNK_SIZE}
+    send_json(conn, resp)
+    send_chunks(conn, file_path, offset)
+
+def handle_delta_download(conn, data, info, bundle, client_manifest):
+    """增量更新：只傳送與 Client 本地 manifest 不同的檔案，並附上需刪除的檔案清單"""
+    game_id = info['game_id']
+    game_dir = os.path.join(STORAGE_DIR, info['file_path'])
+    delta_zip = None
     try:
-        with zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(game_path):
-                for file in files:
-                    if file == "server_config.json" or file.endswith(".pyc"): continue
-                    abs_file = os.path.join(root, file)
-                    rel_path = os.path.relpath(abs_file, game_path)
-                    zf.write(abs_file, rel_path)
-        send_json(conn, {"status": "ok", "game_id": game_id})
-        send_file(conn, temp_zip)
+        server_manifest = load_manifest(bundle, game_dir)
+        changed, deleted = diff_manifest(server_manifest, client_manifest)
+        delta_zip = build_delta(game_dir, changed)
+        print(f"[Download] Delta for Game {game_id}: {len(changed)} changed, {len(deleted)} deleted")
+        # delta zip 內容固定 (固定時間戳)，同一份本地 manifest 會得到相同 sha256，一樣可以續傳
+        send_download(conn, data, {"status": "ok", "game_id": game_id, "mode": "delta",
+                                   "version": info['version'], "changed": len(changed), "delete": deleted}, delta_zip)
     except Exception as e:
         send_json(conn, {"status": "error", "reason": str(e)})
     finally:
-        if os.path.exists(temp_zip): os.remove(temp_zip)
+        if delta_zip and os.path.exists(delta_zip): os.remove(delta_zip)
 
 def handle_create_room(conn, data, addr, current_user):
     game_id = data.get("game_id")
@@ -354,9 +390,54 @@ def handle_list_rooms(conn):
                 })
     send_json(conn, {"status": "ok", "rooms": rooms_list})
 
+def dispatch_request(conn, req, addr, current_user):
+    """處理單一請求，回傳 (可能因登入而改變的) 目前使用者"""
+    cmd = req.get("cmd")
+
+    if not current_user:
+        if cmd == "auth_login":
+            return handle_auth_login(conn, req)
+        elif cmd == "auth_register":
+            handle_auth_register(conn, req)
+        else:
+            send_json(conn, {"status": "error", "reason": "Please login first"})
+        return None
+
+    if cmd == "list_games": handle_list_games(conn)
+    elif cmd == "get_game_detail": handle_get_game_detail(conn, req)
+    elif cmd == "rate_game": handle_rate_game(conn, req)
+    elif cmd == "download_game": handle_download_game(conn, req)
+    elif cmd == "create_room": handle_create_room(conn, req, addr, current_user)
+    elif cmd == "list_rooms": handle_list_rooms(conn)
+    elif cmd == "join_room": handle_join_room(conn, req, current_user)
+    elif cmd == "start_game": handle_start_game(conn, req)
+    elif cmd == "leave_room": handle_leave_room(conn, req)
+    return current_user
+
+def close_session(conn):
+    """中斷另一條執行緒 (或 event loop) 正在服務的連線，讓它的 handler 自行結束並清理"""
+    try:
+        if hasattr(conn, 'shutdown'): conn.shutdown(socket.SHUT_RDWR)
+        else: conn.close()
+    except OSError: pass
+
+def handle_disconnect(conn, current_user):
+    """連線結束：登出並把玩家移出所在房間"""
+    with LOCK:
+        # 已被同帳號的新連線取代時不要移除新的登入
+        if current_user and ONLINE_PLAYERS.get(current_user) is conn:
+            del ONLINE_PLAYERS[current_user]
+        for rid in list(ROOMS.keys()):
+            room = ROOMS[rid]
+            in_room = any(p['conn'] == conn for p in room['players'])
+            if in_room:
+                room['players'] = [p for p in room['players'] if p['conn'] != conn]
+                cleanup_room_if_needed(rid)
+
 @safe_socket_op
 def handle_client(conn, addr):
     print(f"[Connect] {addr} connected")
+    conn = BufferedSocket(conn)
     CLIENTS[addr] = conn
     current_user = None
 
@@ -364,48 +445,20 @@ def handle_client(conn, addr):
         while True:
             req = recv_json(conn)
             if not req: break
-            
-            cmd = req.get("cmd")
-            
-            if not current_user:
-                if cmd == "auth_login":
-                    current_user = handle_auth_login(conn, req)
-                elif cmd == "auth_register":
-                    handle_auth_register(conn, req)
-                else:
-                    send_json(conn, {"status": "error", "reason": "Please login first"})
-                continue
-            
-            if cmd == "list_games": handle_list_games(conn)
-            elif cmd == "get_game_detail": handle_get_game_detail(conn, req)
-            elif cmd == "rate_game": handle_rate_game(conn, req)
-            elif cmd == "download_game": handle_download_game(conn, req)
-            elif cmd == "create_room": handle_create_room(conn, req, addr, current_user)
-            elif cmd == "list_rooms": handle_list_rooms(conn)
-            elif cmd == "join_room": handle_join_room(conn, req, current_user)
-            elif cmd == "start_game": handle_start_game(conn, req)
-            elif cmd == "leave_room": handle_leave_room(conn, req)
+            current_user = dispatch_request(conn, req, addr, current_user)
 
     finally:
         print(f"[Disconnect] {addr} (User: {current_user})")
-        with LOCK:
-            if current_user and current_user in ONLINE_PLAYERS:
-                del ONLINE_PLAYERS[current_user]
-            for rid in list(ROOMS.keys()):
-                room = ROOMS[rid]
-                in_room = any(p['conn'] == conn for p in room['players'])
-                if in_room:
-                    room['players'] = [p for p in room['players'] if p['conn'] != conn]
-                    cleanup_room_if_needed(rid)
+        handle_disconnect(conn, current_user)
         conn.close()
         if addr in CLIENTS: del CLIENTS[addr]
 
-def start_server():
+def start_server(backlog=BACKLOG):
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
         server.bind((HOST, PORT))
-        server.listen(10)
+        server.listen(backlog)
         print(f"=== Lobby Server Running on {HOST}:{PORT} ===")
         while True:
             conn, addr = server.accept()
@@ -418,4 +471,17 @@ def start_server():
         server.close()
 
 if __name__ == '__main__':
-    start_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Start Lobby Server')
+    parser.add_argument('--engine', choices=['thread', 'asyncio'], default=ENGINE,
+                        help='thread: 每條連線一個執行緒; asyncio: 單一 event loop')
+    parser.add_argument('--backlog', type=int, default=BACKLOG, help='listen backlog')
+    parser.add_argument('--workers', type=int, default=DB_WORKERS, help='asyncio 模式下 DB 執行緒池大小')
+    args = parser.parse_args()
+
+    init_db()
+    if args.engine == 'asyncio':
+        from server.lobby_async import start_async_server
+        start_async_server(HOST, PORT, dispatch_request, handle_disconnect,
+                           backlog=args.backlog, workers=args.workers, clients=CLIENTS)
+    else:
+        start_server(args.backlog)
\ No newline at end of file
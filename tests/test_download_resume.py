@@ -0,0 +1,193 @@
+"""
+下載續傳測試：玩家下載到一半時網路中斷 (中間的 proxy 直接關掉 client 端，
+server 端的連線留著不讀，舊的 handler 執行緒還卡在送檔)，lobby_client 要能重新連線、
+以同一帳號登入取代舊的連線，並從已保留的進度續傳完成安裝。
+執行方式 (於 Game_Store/ 下): python -m unittest tests.test_download_resume
+"""
+import builtins
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+import zipfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from common.util import send_json, recv_json, BufferedSocket, file_sha256, send_chunks, TRANSFER_CHUNK_SIZE
+import server.db_manager as db_manager
+import server.bundle_manager as bundle_manager
+from server import dev_server, lobby_server
+import player_client.lobby_client as lobby_client
+
+BLOB_SIZE = 6 * 1024 * 1024     # 大於 socket buffer，斷線時舊的 handler 一定還卡在送檔
+CUT_AFTER = 2 * TRANSFER_CHUNK_SIZE + 300000
+
+class DroppingProxy:
+    """轉送 client <-> server 的 TCP proxy；第一條連線往 client 送出 cut_after bytes 後模擬斷線"""
+    def __init__(self, target, cut_after, reconnectable=True):
+        self.target = target
+        self.reconnectable = reconnectable  # False：斷線後不再接受連線 (Server 無法連上)
+        self.cut_after = cut_after
+        self.connections = 0
+        self.stalled = []   # 模擬斷線後仍留著的 server 端連線 (不讀、不關)
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self.listener.accept()
+            if self.connections and not self.reconnectable:
+                client.close()
+                continue
+            upstream = socket.create_connection(self.target)
+            limit = self.cut_after if self.connections == 0 else None
+            self.connections += 1
+            threading.Thread(target=self._pump, args=(client, upstream, None), daemon=True).start()
+            threading.Thread(target=self._pump, args=(upstream, client, limit), daemon=True).start()
+
+    def _pump(self, src, dst, limit):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data: break
+                if limit is not None and len(data) >= limit:
+                    dst.sendall(data[:limit])
+                    # client 端斷線；server 端的連線留著但不再讀取，也不送 FIN (server 不會發現)
+                    self.stalled.append(src)
+                    dst.shutdown(socket.SHUT_RDWR)
+                    dst.close()
+                    return
+                if limit is not None: limit -= len(data)
+                dst.sendall(data)
+        except OSError:
+            pass
+        if dst in self.stalled: return
+        try: dst.shutdown(socket.SHUT_WR)
+        except OSError: pass
+
+def serve(handler):
+    listener = socket.create_server(('127.0.0.1', 0))
+    def accept():
+        while True:
+            conn, addr = listener.accept()
+            threading.Thread(target=handler, args=(conn, addr), daemon=True).start()
+    threading.Thread(target=accept, daemon=True).start()
+    return listener.getsockname()
+
+class DownloadResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saved = {}
+        storage = os.path.join(self.tmp, 'storage')
+        self.patch(db_manager, 'DB_PATH', os.path.join(self.tmp, 'game_store.db'))
+        self.patch(bundle_manager, 'STORAGE_DIR', storage)
+        self.patch(bundle_manager, 'BUNDLE_DIR', os.path.join(storage, '_bundles'))
+        self.patch(dev_server, 'STORAGE_DIR', storage)
+        self.patch(dev_server, 'PARTIAL_DIR', os.path.join(storage, '_partial'))
+        if hasattr(lobby_server, 'STORAGE_DIR'):
+            self.patch(lobby_server, 'STORAGE_DIR', storage)
+        self.patch(lobby_client, 'download_base_path', os.path.join(self.tmp, 'downloads'))
+        self.patch(lobby_client, 'partial_base_path', os.path.join(self.tmp, 'downloads', '.partial'))
+        self.patch(builtins, 'input', lambda *args: '')
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+        db_manager.init_db()
+        self.game_id = self.upload_game()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        for (obj, name), value in self.saved.items():
+            setattr(obj, name, value)
+        try: lobby_client.client_socket.close()
+        except Exception: pass
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def patch(self, obj, name, value):
+        self.saved.setdefault((obj, name), getattr(obj, name))
+        setattr(obj, name, value)
+
+    def upload_game(self):
+        """透過 dev_server 上架一個含大檔案的遊戲，回傳 game_id"""
+        self.blob = os.urandom(BLOB_SIZE)
+        zip_path = os.path.join(self.tmp, 'upload.zip')
+        config = {"game_name": "ResumeTest", "version": "1.0.0", "description": "", "game_type": "CLI",
+                  "min_players": 1, "max_players": 2, "server_entry": "game_server.py", "client_entry": "game_client.py"}
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr('config.json', json.dumps(config))
+            zf.writestr('game_server.py', 'print(1)\n')
+            zf.writestr('game_client.py', 'print(1)\n')
+            zf.writestr('blob.bin', self.blob)
+        sock = BufferedSocket(socket.create_connection(serve(dev_server.handle_client)))
+        send_json(sock, {"cmd": "auth_register", "username": "dev", "password": "pw"})
+        recv_json(sock)
+        send_json(sock, {"cmd": "auth_login", "username": "dev", "password": "pw"})
+        self.assertEqual(recv_json(sock).get("status"), "ok")
+        send_json(sock, {"cmd": "upload_game", "config": config, "is_update": False, "game_id": None,
+                         "transfer": {"size": os.path.getsize(zip_path), "sha256": file_sha256(zip_path)}})
+        ready = recv_json(sock)
+        self.assertTrue(send_chunks(sock, zip_path, ready.get("offset", 0)))
+        resp = recv_json(sock)
+        sock.close()
+        self.assertEqual(resp.get("status"), "ok")
+        return resp["game_id"]
+
+    def connect_through(self, proxy):
+        self.patch(lobby_client, 'SERVER_IP', '127.0.0.1')
+        self.patch(lobby_client, 'SERVER_PORT', proxy.port)
+        self.assertTrue(lobby_client.connect_server())
+        send_json(lobby_client.client_socket, {"cmd": "auth_register", "username": "p1", "password": "pw"})
+        recv_json(lobby_client.client_socket)
+        self.assertEqual(lobby_client.login("p1", "pw").get("status"), "ok")
+        send_json(lobby_client.client_socket, {"cmd": "get_game_detail", "game_id": self.game_id})
+        return recv_json(lobby_client.client_socket)["detail"]
+
+    def test_resume_after_connection_drop(self):
+        proxy = DroppingProxy(serve(lobby_server.handle_client), CUT_AFTER)
+        offsets = []
+        real_recv_chunks = lobby_client.recv_chunks
+        def recording_recv_chunks(sock, part_path, offset, *args):
+            offsets.append(offset)
+            return real_recv_chunks(sock, part_path, offset, *args)
+        self.patch(lobby_client, 'recv_chunks', recording_recv_chunks)
+
+        # 上一個版本留下的進度檔，續傳完成後要被清掉
+        partial_dir = os.path.join(lobby_client.partial_base_path, 'p1')
+        os.makedirs(partial_dir)
+        stale = [os.path.join(partial_dir, f"{self.game_id}_{c * 64}.part") for c in "ab"]
+        for path in stale:
+            with open(path, 'wb') as f: f.write(b"old")
+
+        lobby_client.process_download(self.connect_through(proxy))
+
+        self.assertEqual(proxy.connections, 2)
+        self.assertEqual(len(offsets), 2)
+        self.assertEqual(offsets[0], 0)
+        self.assertGreaterEqual(offsets[1], TRANSFER_CHUNK_SIZE)    # 從保留的進度續傳，不是重新下載
+        save_dir = os.path.join(lobby_client.download_base_path, 'p1', f"{self.game_id}_ResumeTest")
+        with open(os.path.join(save_dir, 'blob.bin'), 'rb') as f:
+            self.assertEqual(f.read(), self.blob)
+        self.assertEqual(os.listdir(partial_dir), [])
+        self.assertEqual(lobby_client.curr_page, "Home")
+        # 新的連線仍可正常使用
+        send_json(lobby_client.client_socket, {"cmd": "list_rooms"})
+        self.assertEqual(recv_json(lobby_client.client_socket).get("status"), "ok")
+
+    def test_back_to_login_when_reconnect_fails(self):
+        proxy = DroppingProxy(serve(lobby_server.handle_client), CUT_AFTER, reconnectable=False)
+        self.patch(lobby_client, 'curr_page', "GameList")
+        lobby_client.process_download(self.connect_through(proxy))
+
+        # 重新連線失敗：不回到還在用舊 socket 的選單，而是回登入頁；已收到的進度保留
+        self.assertEqual(proxy.connections, 1)
+        self.assertEqual(lobby_client.curr_page, "Login")
+        self.assertFalse(os.path.exists(os.path.join(lobby_client.download_base_path, 'p1', f"{self.game_id}_ResumeTest")))
+        partial = lobby_client.find_partial(os.path.join(lobby_client.partial_base_path, 'p1'), self.game_id)
+        self.assertGreaterEqual(lobby_client.resume_offset(partial[1]), TRANSFER_CHUNK_SIZE)
+
+if __name__ == '__main__':
+    unittest.main()